@@ -0,0 +1,59 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from core import analytics, profiling
+from core.security import require_admin
+from db.session import SessionLocal
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """Список сохранённых профилей (новые сверху)."""
+    return {
+        "success": True,
+        "data": {
+            "enabled": profiling.enabled,
+            "armed_events": profiling.armed_events(),
+            "profiles": profiling.list_profiles(),
+        },
+    }
+
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str):
+    """Профиль в формате collapsed stacks (flamegraph.pl, speedscope)."""
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
+
+
+@router.post("/profiles/events/{event}")
+async def arm_event_profiling(event: str, count: int = 10):
+    """Профилировать следующие count вызовов socket-события."""
+    if not profiling.enabled:
+        raise HTTPException(status_code=409, detail="Профилирование выключено (PROFILING_ENABLED)")
+    if not 1 <= count <= 1000:
+        raise HTTPException(status_code=400, detail="count должен быть от 1 до 1000")
+    profiling.arm_event(event, count)
+    return {"success": True, "data": {"event": event, "count": count}}
+
+
+def _rebuild_stats(world_id: int | None) -> int:
+    db = SessionLocal()
+    try:
+        return analytics.rebuild_world_stats(db, world_id)
+    finally:
+        db.close()
+
+
+@router.post("/analytics/rebuild")
+async def rebuild_analytics(world_id: int | None = None):
+    """Пересчитать статистику слов и предложений из answer_log (одного мира или всех)."""
+    # Полный проход по журналу — в отдельном потоке, чтобы не держать event loop
+    items = await asyncio.to_thread(_rebuild_stats, world_id)
+    return {"success": True, "data": {"world_id": world_id, "items": items}}
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from db.session import get_db
-from db.models import AdventureSession, User, World
+from db.models import AdventureSession, User
+from core import distractors, world_snapshot
+from core.redis_client import get_redis
 from core.security import get_current_user
 from api.utils.step_generator import generate_steps
 
@@ -20,11 +22,13 @@ async def create_adventure(
         user: User = Depends(get_current_user)
 ):
     """Создаёт новую игровую сессию по миру, которым владеет текущий пользователь."""
-    world = db.query(World).filter(World.id == request_data.world_id).first()
-    if not world:
+    snapshot = await world_snapshot.get_snapshot(await get_redis(), db, request_data.world_id)
+    if snapshot is None:
         raise HTTPException(status_code=404, detail="Мир не найден")
-    if world.author_id != user.id:
+    if snapshot.author_id != user.id:
         raise HTTPException(status_code=403, detail="Недостаточно прав для запуска сессии этого мира")
+    # Индекс неправильных вариантов строится вне event loop; generate_steps возьмёт его из кэша
+    await distractors.prepare(snapshot)
 
     try:
         session = AdventureSession.create(
@@ -33,14 +37,13 @@ async def create_adventure(
             host_id=user.id
         )
 
-        steps = generate_steps(session.join_code, db)
-        db.add_all(steps)
-        db.commit()
+        join_code = session.join_code
+        steps = generate_steps(join_code, db, snapshot)
 
         return {
             "success": True,
             "data": {
-                "join_code": session.join_code,
+                "join_code": join_code,
                 "steps_count": len(steps)
             }
         }
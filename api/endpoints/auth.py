@@ -1,10 +1,13 @@
 from datetime import timedelta
+import asyncio
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from ..models.auth import UserCreate, UserLogin
 from core.security import create_access_token, create_refresh_token, verify_password, get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES, \
     get_current_user
+from core import rate_limit
+from core.redis_client import get_redis
 from db.session import get_db
 from db.models import User
 
@@ -16,11 +19,11 @@ router = APIRouter()
 @router.post("/register")
 async def register(user_data: UserCreate, request: Request, db: Session = Depends(get_db)):
     """Регистрация пользователя с немедленной выдачей пары токенов."""
-    logger.info(f"Запрос на регистрацию пользователя с email: {user_data.email}")
+    logger.info("Запрос на регистрацию пользователя с email: %s", user_data.email)
 
     db_user = db.query(User).filter(User.email == user_data.email).first()
     if db_user:
-        logger.warning(f"Попытка повторной регистрации email: {user_data.email}")
+        logger.warning("Попытка повторной регистрации email: %s", user_data.email)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -44,7 +47,7 @@ async def register(user_data: UserCreate, request: Request, db: Session = Depend
         )
         refresh_token = create_refresh_token(data={"sub": db_user.email})
 
-        logger.info(f"Пользователь успешно зарегистрирован: {user_data.email}")
+        logger.info("Пользователь успешно зарегистрирован: %s", user_data.email)
         return {
             "success": True,
             "data": {
@@ -56,7 +59,7 @@ async def register(user_data: UserCreate, request: Request, db: Session = Depend
             }
         }
     except Exception as e:
-        logger.error(f"Ошибка при регистрации пользователя: {e}")
+        logger.error("Ошибка при регистрации пользователя: %s", e)
         db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -66,26 +69,41 @@ async def register(user_data: UserCreate, request: Request, db: Session = Depend
 @router.post("/login")
 async def login(user_data: UserLogin, request: Request, db: Session = Depends(get_db)):
     """Логин по email+пароль. Возвращает access и refresh токены."""
-    logger.info(f"Попытка входа пользователя с email: {user_data.email}")
-    client_ip = request.client.host
+    logger.info("Попытка входа пользователя с email: %s", user_data.email)
+    client_ip = request.client.host if request.client else None
+
+    # Перебор отсекается до запроса к базе и bcrypt: отказ стоит один вызов Redis
+    r = await get_redis()
+    throttle_keys = rate_limit.login_keys(user_data.email, client_ip)
+    retry_after = await rate_limit.login_retry_after(r, throttle_keys)
+    if retry_after:
+        logger.warning("Вход ограничен: %s с IP: %s, повтор через %d с", user_data.email, client_ip, retry_after)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(retry_after)},
+        )
 
     user = db.query(User).filter(User.email == user_data.email).first()
 
-    if not user or not verify_password(user_data.password, user.password_hash):
-        logger.warning(f"Неверные учетные данные: {user_data.email} с IP: {client_ip}")
+    # bcrypt — в пуле потоков: проверка пароля не должна останавливать event loop с играми
+    if not user or not await asyncio.to_thread(verify_password, user_data.password, user.password_hash):
+        logger.warning("Неверные учетные данные: %s с IP: %s", user_data.email, client_ip)
+        await rate_limit.record_login_failure(r, throttle_keys)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    await rate_limit.reset_login_failures(r, throttle_keys)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
     refresh_token = create_refresh_token(data={"sub": user.email})
 
-    logger.info(f"Успешный вход пользователя: {user_data.email} с IP: {client_ip}")
+    logger.info("Успешный вход пользователя: %s с IP: %s", user_data.email, client_ip)
     return {
         "success": True,
         "data": {
@@ -1,31 +1,37 @@
 from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from api.models.worlds import WorldPreview, WorldDetail, WorldCreate
 from db.session import get_db
 from db.models import World, Word, Sentence, User
 from core.security import get_current_user, get_current_user_optional
 from typing import List, Optional
+from core import analytics, world_snapshot
+from core.redis_client import get_redis
+from core.tokenizer import tokenize
 from core.file_storage import upload_base64
 from pydantic import BaseModel
-from sqlalchemy import and_
+from sqlalchemy import and_, delete, insert, select, update
 
 router = APIRouter()
 
+_CONTENT_BATCH = 1000
+
 class PostAnsw(BaseModel):
     stri : str
 
+# Маршруты чтения отдают ORJSONResponse напрямую: данные — проекции колонок
+# из базы, и повторная валидация через response_model им не нужна.
+# response_model остаётся для схемы OpenAPI.
+def _world_previews(rows) -> list[dict]:
+    return [{"id": row.id, "title": row.title, "image": row.image} for row in rows]
+
+
 @router.get("/", response_model=List[WorldPreview])
 async def get_all_worlds(db: Session = Depends(get_db)):
     """Список всех публичных мирков"""
-    public_worlds = db.query(World).filter(World.is_public == True).all()
-    return [
-        WorldPreview(
-            id=world.id,
-            title=world.title,
-            image=world.image
-        ) 
-        for world in public_worlds
-    ]
+    public_worlds = db.query(World.id, World.title, World.image).filter(World.is_public == True).all()
+    return ORJSONResponse(_world_previews(public_worlds))
 
 
 @router.get("/userWorlds", response_model=List[WorldPreview])
@@ -34,16 +40,8 @@ async def get_user_worlds(
         current_user: User = Depends(get_current_user)
 ):
     """Получить все мирки текущего пользователя"""
-    user_worlds = db.query(World).filter(World.author_id == current_user.id).all()
-
-    return [
-        WorldPreview(
-            id=world.id,
-            title=world.title,
-            image=world.image
-        )
-        for world in user_worlds
-    ]
+    user_worlds = db.query(World.id, World.title, World.image).filter(World.author_id == current_user.id).all()
+    return ORJSONResponse(_world_previews(user_worlds))
 
 
 @router.get("/{world_id}", response_model=WorldDetail)
@@ -51,45 +49,121 @@ async def get_world(world_id: int,
                     db: Session = Depends(get_db),
                     current_user: Optional[User] = Depends(get_current_user_optional)):
     """Получить конкретный мир по ID"""
-    world = db.query(World).filter(and_(
-        World.id == world_id,
-        World.is_public == True
-    )).first()
+    snapshot = await world_snapshot.get_snapshot(await get_redis(), db, world_id)
 
-    if not world:
+    if snapshot is None or not snapshot.is_public:
         raise HTTPException(status_code=404, detail="Мир не найден")
 
     words_list = [
         {
-            "id": word.id,
-            "word": word.word,
-            "translation": word.translation,
-            "world_id": word.world_id
+            "id": word_id,
+            "word": word,
+            "translation": translation,
+            "world_id": world_id
         }
-        for word in world.words
+        for word_id, word, translation in snapshot.words()
     ]
 
     sentences_list = [
         {
-            "id": sentence.id,
-            "sentence": sentence.sentence,
-            "world_id": sentence.world_id
+            "id": sentence_id,
+            "sentence": sentence,
+            "world_id": world_id
         }
-        for sentence in world.sentences
+        for sentence_id, sentence in snapshot.sentences()
     ]
 
-    is_owner = current_user is not None and world.author_id == current_user.id
-
-    return WorldDetail(
-        id=world.id,
-        title=world.title,
-        description=world.description,
-        words=words_list,
-        image=world.image,
-        sentences=sentences_list,
-        is_public=world.is_public,
-        is_owner=is_owner
-    )
+    is_owner = current_user is not None and snapshot.author_id == current_user.id
+
+    return ORJSONResponse({
+        "id": snapshot.world_id,
+        "title": snapshot.title,
+        "description": snapshot.description,
+        "words": words_list,
+        "image": snapshot.image,
+        "sentences": sentences_list,
+        "is_public": snapshot.is_public,
+        "is_owner": is_owner,
+    })
+
+
+def _content_rows(world_id: int, world_data: WorldCreate) -> tuple[list[dict], list[dict]]:
+    """Строки слов и предложений мира; предложения разбиваются на токены здесь, один раз при сохранении."""
+    words = [
+        {"word": word.word, "translation": word.translation, "world_id": world_id}
+        for word in world_data.words
+    ]
+    sentences = [
+        {"sentence": sentence.sentence, "tokens": tokenize(sentence.sentence), "world_id": world_id}
+        for sentence in world_data.sentences
+    ]
+    return words, sentences
+
+
+def _insert_content(db: Session, world_id: int, world_data: WorldCreate) -> None:
+    """Слова и предложения мира — пачками по _CONTENT_BATCH строк на INSERT."""
+    words, sentences = _content_rows(world_id, world_data)
+    for model, rows in ((Word, words), (Sentence, sentences)):
+        for start in range(0, len(rows), _CONTENT_BATCH):
+            db.execute(insert(model), rows[start:start + _CONTENT_BATCH])
+
+
+def _word_key(row) -> tuple[str, str]:
+    return " ".join(row["word"].split()).lower(), " ".join(row["translation"].split()).lower()
+
+
+def _sentence_key(row) -> tuple[str, ...]:
+    return tuple(row["tokens"] if row["tokens"] is not None else tokenize(row["sentence"]))
+
+
+def _diff_content(existing, rows: list[dict], key, fields: tuple[str, ...]):
+    """
+    Сопоставляет сохранённые строки (с id) с новыми по ключу key:
+    (id ушедших строк, изменения оставшихся по id, строки для INSERT).
+    """
+    by_key: dict = {}
+    for old in existing:
+        by_key.setdefault(key(old), []).append(old)
+    changed, new = [], []
+    for row in rows:
+        matches = by_key.get(key(row))
+        if not matches:
+            new.append(row)
+            continue
+        old = matches.pop(0)
+        if any(old[field] != row[field] for field in fields):
+            changed.append({"id": old["id"], **{field: row[field] for field in fields}})
+    gone = [old["id"] for matches in by_key.values() for old in matches]
+    return gone, changed, new
+
+
+def _replace_content(db: Session, world_id: int, world_data: WorldCreate) -> None:
+    """
+    Новое содержимое мира вместо старого. Слова и предложения, которые
+    остались (слова — с точностью до регистра и пробелов, предложения —
+    по токенам), сохраняют id: по нему хранятся статистика ответов
+    (core/analytics) и шаги идущих игр. Их текст обновляется на месте,
+    ушедшие строки удаляются, новые добавляются пачками.
+    """
+    words, sentences = _content_rows(world_id, world_data)
+    existing_words = db.execute(
+        select(Word.id, Word.word, Word.translation).where(Word.world_id == world_id).order_by(Word.id)
+    ).mappings().all()
+    existing_sentences = db.execute(
+        select(Sentence.id, Sentence.sentence, Sentence.tokens).where(Sentence.world_id == world_id).order_by(Sentence.id)
+    ).mappings().all()
+
+    for model, diff in (
+        (Word, _diff_content(existing_words, words, _word_key, ("word", "translation"))),
+        (Sentence, _diff_content(existing_sentences, sentences, _sentence_key, ("sentence", "tokens"))),
+    ):
+        gone, changed, new = diff
+        for start in range(0, len(gone), _CONTENT_BATCH):
+            db.execute(delete(model).where(model.id.in_(gone[start:start + _CONTENT_BATCH])))
+        if changed:
+            db.execute(update(model), changed)
+        for start in range(0, len(new), _CONTENT_BATCH):
+            db.execute(insert(model), new[start:start + _CONTENT_BATCH])
 
 
 @router.post("/", response_model=str)
@@ -114,19 +188,7 @@ async def create_world(
     db.commit()
     db.refresh(db_world)
 
-    for word in world_data.words:
-        db.add(Word(
-            word=word.word,
-            translation=word.translation,
-            world_id=db_world.id
-        ))
-
-    for sentence in world_data.sentences:
-        db.add(Sentence(
-            sentence=sentence.sentence,
-            world_id=db_world.id
-        ))
-
+    _insert_content(db, db_world.id, world_data)
     db.commit()
 
     return "Мир успешно создан!"
@@ -157,6 +219,7 @@ async def delete_world(
 
     db.delete(db_world)
     db.commit()
+    await world_snapshot.forget(await get_redis(), world_id)
 
     return "Мир успешно удален"
 
@@ -180,27 +243,15 @@ async def update_world(
     world.title = world_data.title
     world.description = world_data.description
     world.is_public = world_data.is_public
+    # Содержимое мира меняется — снимок мира и индексы устаревают
+    world.content_version = World.content_version + 1
 
     if world_data.image and world_data.image != "None":
         world.image = await upload_base64(world_data.image)
 
-    db.query(Word).filter(Word.world_id == world_id).delete()
-    db.query(Sentence).filter(Sentence.world_id == world_id).delete()
-
-    for word in world_data.words:
-        db.add(Word(
-            word=word.word,
-            translation=word.translation,
-            world_id=world.id
-        ))
-
-    for sentence in world_data.sentences:
-        db.add(Sentence(
-            sentence=sentence.sentence,
-            world_id=world.id
-        ))
-
+    _replace_content(db, world.id, world_data)
     db.commit()
+    await world_snapshot.publish_version(await get_redis(), world.id, world.content_version)
 
     return "Мир успешно обновлен"
 
@@ -237,7 +288,29 @@ async def update_world_visibility(
         )
 
     world.is_public = is_public
+    # Публичность входит в снимок мира, который читает GET /worlds/{id}
+    world.content_version = World.content_version + 1
     db.commit()
     db.refresh(world)
+    await world_snapshot.publish_version(await get_redis(), world.id, world.content_version)
+
+    return world
+
+@router.get("/{world_id}/analytics", summary="Статистика ответов по словам и предложениям")
+async def get_world_analytics(
+        world_id: int,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    """
+    Точность, среднее время ответа и сложность каждого слова и предложения
+    мира по всем играм; первыми идут те, что даются ученикам хуже всего.
+    Доступно только автору мира.
+    """
+    author_id = db.query(World.author_id).filter(World.id == world_id).scalar()
+    if author_id is None:
+        raise HTTPException(status_code=404, detail="Мир не найден")
+    if author_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
 
-    return world
\ No newline at end of file
+    return ORJSONResponse({"world_id": world_id, "items": analytics.get_world_stats(db, world_id)})
@@ -1,24 +1,46 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+import asyncio
 import logging
-
-from db.models import AdventureSession, AdventureStep, QuizOption
-from db.session import get_db
+import time
+import uuid
+
+from db.models import AdventureSession, AdventureStep, GameResult, QuizOption, QuizStep, Sentence, WordOrderStep
+from db.session import SessionLocal
+from . import paced_steps
+from .host_registry import HostSessionRegistry
+from .roster import lobby_room, roster
 from .server import sio
 from core.security import get_current_user_ws
 from core.redis_client import get_redis
+from core import rate_limit
 from core import room_store
+from core import results_log
+from core import world_snapshot
+from core.tokenizer import tokenize
+from core.config import settings
+from core.metrics import Counter, Gauge
 from ..utils.step_generator import generate_steps
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+host_sessions = HostSessionRegistry(settings.redis_room_ttl_seconds, settings.host_sessions_max_size)
+
+Gauge("sio_active_rooms", "Активные игровые комнаты с хостом в этом процессе", fn=lambda: len(host_sessions))
+Gauge("host_sessions_bytes", "Оценка памяти реестра хостов комнат", fn=host_sessions.memory_bytes)
+
+
+def _host_session_removed(code: str, sid: str, reason: str) -> None:
+    if reason == "evicted":
+        # Хост ещё может быть подключён, но таблицу лидеров и итоги он больше не получит
+        logger.warning("Реестр хостов переполнен (HOST_SESSIONS_MAX_SIZE), вытеснена комната %s", code)
+
 
-handler = logging.StreamHandler()
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+host_sessions.on_evict(_host_session_removed)
 
-host_sessions = {}
+HOST_GRACE = Counter("host_grace_total", "Отключения хостов с отсрочкой закрытия комнаты по исходу", ["result"])
+STUDENT_RESUMES = Counter("student_resumes_total", "Переподключения учеников по resume_token", ["result"])
+ANSWERS_REJECTED = Counter("sio_answers_rejected_total", "Ответы check_answer, которые не засчитаны, по причине", ["reason"])
+_pending_removals: set[asyncio.Task] = set()
 
 
 def calculate_score(is_correct: bool, time_spent: float, base_points=100) -> int:
@@ -31,23 +53,252 @@ def calculate_score(is_correct: bool, time_spent: float, base_points=100) -> int
 
 
 async def _maybe_finish_game(room_code: str):
+    """
+    Закрывает комнату: один вызов Redis отдаёт итоговые места всех игроков
+    и удаляет её ключи, затем итоги рассылаются ученикам и хосту разом.
+    """
     r = await get_redis()
-    should_emit = await room_store.finish_once(r, room_code)
-    if not should_emit:
+    finished = await room_store.finalize_room(r, room_code)
+    if finished is None:
         return
 
-    host_sid = host_sessions.get(room_code)
+    ranking = finished["ranking"]
+    total_players = len(ranking)
+    emits = [
+        sio.emit(
+            "game_finished",
+            {
+                "score": entry["score"],
+                "place": entry["place"],
+                "total_players": total_players,
+                "final": True,
+            },
+            to=entry["sid"],
+        )
+        for entry in ranking
+        if entry["sid"]
+    ]
+    # Комната закрыта: запись хоста больше не нужна
+    host_sid = host_sessions.pop(room_code, "finished")
     if host_sid:
-        top3 = await room_store.get_top3(r, room_code)
-        leaderboard_list = await room_store.get_leaderboard(r, room_code)
-        await sio.emit(
+        top3 = [
+            {"place": entry["place"], "username": entry["username"], "score": entry["score"]}
+            for entry in ranking[:3]
+        ]
+        emits.append(sio.emit(
             "game_finished",
-            {"top3": top3, "total_players": len(leaderboard_list)},
+            {"top3": top3, "total_players": total_players},
             to=host_sid,
-        )
+        ))
+    await asyncio.gather(*emits)
+    # Ключи комнаты уже удалены: итоги остаются только в стриме на запись в БД
+    await results_log.record_game(r, room_code, finished)
+
+
+async def teardown_room(room: str) -> None:
+    """Закрывает комнату ушедшего хоста: ученикам — host_disconnected, сессию — из базы, ключи — из Redis."""
+    await sio.emit("host_disconnected", {"message": "Хост покинул игру"}, room=room)
+    try:
+        await _run_db(_delete_session, room)
+        logger.info("Session %s deleted", room)
+    except Exception as e:
+        logger.error("DB cleanup error: %s", e)
+    host_sessions.pop(room)
+    r = await get_redis()
+    await room_store.cleanup_room(r, room)
 
-    await room_store.cleanup_room(r, room_code)
 
+async def _remove_player_after_grace(room: str, player_id: str, sid: str) -> None:
+    await asyncio.sleep(settings.student_resume_grace_seconds)
+    r = await get_redis()
+    # Не удалит игрока, который уже переподключился (у него другой sid) или прошёл все шаги
+    if not await room_store.remove_player(r, room, player_id, sid):
+        return
+    logger.info("Выход из комнаты %s", room)
+    await roster.left(room, player_id)
+    if await room_store.are_all_finished(r, room):
+        await _maybe_finish_game(room)
+
+
+def _schedule_removal(room: str, player_id: str, sid: str) -> None:
+    task = asyncio.get_running_loop().create_task(_remove_player_after_grace(room, player_id, sid))
+    # Ссылка держится до завершения: иначе задачу может собрать GC
+    _pending_removals.add(task)
+    task.add_done_callback(_pending_removals.discard)
+
+
+async def _resume_student(r, sid: str, room_code: str, resume_token: str) -> bool:
+    """
+    Переподключение ученика: новый sid привязывается к прежнему игроку одним
+    вызовом Redis, без повторного входа и без запросов к базе. Работает
+    и в начатой игре. False — токен не подошёл, ученик входит заново.
+    """
+    player_id, _, resume_secret = resume_token.partition(".")
+    state = await room_store.resume_player(r, room_code, player_id, resume_secret, sid)
+    if state is None:
+        STUDENT_RESUMES.labels("rejected").inc()
+        return False
+    STUDENT_RESUMES.labels("resumed").inc()
+
+    session_data = await sio.get_session(sid)
+    await sio.save_session(sid, {
+        "role": "student",
+        "ip": session_data.get("ip"),
+        "room_code": room_code,
+        "player_id": player_id,
+        "game": state["game"],
+        "progress": {"current_step": 0}
+    })
+    await sio.enter_room(sid, room_code)
+    previous_sid = state["previous_sid"]
+    if previous_sid and previous_sid != sid and sio.manager.is_connected(previous_sid, "/"):
+        # Старое соединение ещё живо (вторая вкладка): отвечать за игрока будет новое
+        await sio.disconnect(previous_sid)
+    await sio.emit("student_resumed", {
+        "player_id": player_id,
+        "resume_token": resume_token,
+        "score": state["score"],
+        "finished": state["finished"],
+        "started": state["started"],
+        "steps_count": state["steps_count"],
+        "pacing": state["pacing"],
+    }, to=sid)
+    if state["started"] and state["pacing"] != "all":
+        # В пошаговой игре заданий у клиента нет: повторяем шаг, на котором он остановился
+        step = await room_store.player_open_step(r, room_code, player_id)
+        if step >= 0:
+            await paced_steps.send_step(r, room_code, state["game"]["game_id"], step, to=sid)
+    return True
+
+
+def _answer_buckets(sid: str, session_data: dict) -> list[rate_limit.Bucket]:
+    buckets = []
+    if settings.sio_rate_per_sid > 0:
+        buckets.append((rate_limit.bucket_key("sid", sid), settings.sio_rate_per_sid, settings.sio_burst_per_sid))
+    ip = session_data.get("ip")
+    if ip and settings.sio_rate_per_ip > 0:
+        buckets.append((rate_limit.bucket_key("ip", ip), settings.sio_rate_per_ip, settings.sio_burst_per_ip))
+    return buckets
+
+
+def _with_session(work, *args):
+    db = SessionLocal()
+    try:
+        return work(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _run_db(work, *args):
+    """
+    Выполняет work(db, *args) в пуле потоков со своей сессией. Обработчики
+    не держат соединение из пула через await: иначе под нагрузкой они
+    разбирают пул, и event loop встаёт в ожидании свободного соединения.
+    """
+    return await asyncio.to_thread(_with_session, work, *args)
+
+
+def _delete_session(db: Session, room: str) -> None:
+    # Шаги ссылаются на сессию без ON DELETE: удаляем их вместе с ней
+    AdventureSession.delete_many(db, [room])
+    db.commit()
+
+
+def _create_session(db: Session, host_id: int, world_id: int, snapshot):
+    """Сессия и шаги игры: (код, число шагов, снимок, собранный из базы или None)."""
+    loaded = None
+    if snapshot is None:
+        snapshot = loaded = world_snapshot.load(db, world_id)
+        if snapshot is None:
+            return None
+    join_code = AdventureSession.create(db, host_id=host_id, world_id=world_id).join_code
+    steps = generate_steps(join_code, db, snapshot)
+    return join_code, len(steps), loaded
+
+
+def _session_info(db: Session, room_code: str):
+    """(world_id, число шагов) сессии или None, если её нет."""
+    world_id = db.query(AdventureSession.world_id).filter_by(join_code=room_code).scalar()
+    if world_id is None:
+        return None
+    steps_count = db.query(AdventureStep).filter_by(session_id=room_code).count()
+    return world_id, steps_count
+
+
+def _game_tasks(db: Session, room: str, world_id: int | None, snapshot):
+    """Задания игры по её шагам: (задания, снимок, собранный из базы или None)."""
+    steps = db.query(AdventureStep).filter_by(
+        session_id=room
+    ).order_by(AdventureStep.step_number).options(
+        selectinload(AdventureStep.quiz_step).selectinload(QuizStep.options),
+        selectinload(AdventureStep.word_order_step),
+    ).all()
+
+    loaded = None
+    if snapshot is None and world_id and any(step.word_order_step for step in steps):
+        snapshot = loaded = world_snapshot.load(db, world_id)
+
+    tasks = []
+    for step in steps:
+        if step.quiz_step:
+            tasks.append({
+                "type": "quiz",
+                "step_id": step.id,
+                "step_number": step.step_number,
+                "question": step.quiz_step.question,
+                "options": [{"id": opt.id, "text": opt.text} for opt in step.quiz_step.options]
+            })
+        elif step.word_order_step:
+            words = _sentence_words(db, snapshot, step.word_order_step.sentence_id)
+            tasks.append({
+                "type": "word_order",
+                "step_id": step.id,
+                "step_number": step.step_number,
+                "sentence": " ".join(words),
+                "words": list(words)
+            })
+    return tasks, loaded
+
+
+def _answer_step(db: Session, room_code: str, step_index: int):
+    # Тип шага, верный вариант и предложение — одним запросом
+    return db.query(
+        AdventureStep.id,
+        QuizStep.id.label("quiz_step_id"),
+        QuizStep.word_id,
+        QuizOption.id.label("correct_option_id"),
+        WordOrderStep.sentence_id,
+    ).outerjoin(
+        QuizStep, QuizStep.id == AdventureStep.id
+    ).outerjoin(
+        QuizOption, (QuizOption.quiz_step_id == QuizStep.id) & QuizOption.is_correct
+    ).outerjoin(
+        WordOrderStep, WordOrderStep.id == AdventureStep.id
+    ).filter(
+        AdventureStep.session_id == room_code,
+        AdventureStep.step_number == step_index + 1
+    ).first()
+
+
+def _expected_words(db: Session, world_id: int | None, sentence_id: int):
+    """Токены предложения, которого нет в снимке из кэша: (токены, снимок, собранный из базы или None)."""
+    snapshot = world_snapshot.load(db, world_id) if world_id else None
+    return _sentence_words(db, snapshot, sentence_id), snapshot
+
+
+def _sentence_words(db: Session, snapshot, sentence_id: int) -> tuple[str, ...]:
+    """Токены предложения шага: из снимка мира, а если его там нет — из базы."""
+    words = snapshot.sentence_words(sentence_id) if snapshot is not None else None
+    if words is None:
+        # Мир изменили во время игры: предложения шага нет в новой версии снимка
+        sentence = db.get(Sentence, sentence_id)
+        if sentence is None:
+            return ()
+        words = tuple(sentence.tokens if sentence.tokens is not None else tokenize(sentence.sentence))
+    return words
 
 
 class ConnectError(Exception):
@@ -76,22 +327,28 @@ class GameAlreadyStartedError(ConnectError):
     def __init__(self):
         super().__init__("Игра уже началась")
 
+class InvalidUsernameError(ConnectError):
+    def __init__(self):
+        super().__init__("Некорректное имя игрока")
+
 
 @sio.event
 async def connect(sid, environ, auth_data=None):
-    db = next(get_db())
+    # Адрес клиента для ограничения частоты; за прокси его подставляет uvicorn --proxy-headers
+    ip = environ.get("REMOTE_ADDR")
     try:
         if not auth_data or "token" not in auth_data:
-            await sio.save_session(sid, {"role": "student"})
+            await sio.save_session(sid, {"role": "student", "ip": ip})
             return
 
         token = auth_data["token"]
-        user = await get_current_user_ws(token, db)
+        user = await _run_db(lambda db: get_current_user_ws(token, db))
 
         await sio.save_session(sid, {
             "user_id": user.id,
             "email": user.email,
             "role": "host",
+            "ip": ip,
             "is_authenticated": True,
             "isStarted": False
         })
@@ -99,62 +356,45 @@ async def connect(sid, environ, auth_data=None):
     except Exception:
         raise ConnectionRefusedError("Invalid token")
 
-    finally:
-        db.close()
-
 
 @sio.event
 async def disconnect(sid):
     try:
         session_data = await sio.get_session(sid)
-        logger.debug(f"Client disconnected: {session_data}")
+        logger.debug("Client disconnected: %s", session_data)
 
         role = session_data.get("role")
         room = session_data.get("room_code")
 
         if role == "host" and room:
-            await sio.emit("host_disconnected", {"message": "Хост покинул игру"}, room=room)
-
-            db = next(get_db())
-            try:
-                session = db.query(AdventureSession).filter_by(
-                    join_code=room,
-                    host_id=session_data.get("user_id")
-                ).first()
-
-                if session:
-                    db.delete(session)
-                    db.commit()
-                    logger.info(f"Session {room} deleted")
-                host_sessions.pop(room, None)
-                r = await get_redis()
-                await room_store.cleanup_room(r, room)
-
-            except Exception as e:
-                logger.error(f"DB cleanup error: {str(e)}")
-                db.rollback()
-            finally:
-                db.close()
-
-        elif role == "student" and room:
-            logger.info(f"Выход из комнаты {room}")
-            await sio.emit("student_left", {"sid": sid}, room=room)
+            # Этот sid больше не отвечает: локальная запись хоста не нужна
+            if host_sessions.get(room) == sid:
+                host_sessions.pop(room)
             r = await get_redis()
-            await room_store.remove_player(r, room, sid)
-            if await room_store.are_all_finished(r, room):
-                await _maybe_finish_game(room)
+            grace = settings.host_grace_seconds
+            state = await room_store.begin_host_grace(r, room, sid, time.time() + grace) if grace > 0 else -1
+            if state == 1:
+                # Комнату закроет HostGraceReaper, если хост не вернётся через host_rejoin
+                HOST_GRACE.labels("started").inc()
+                await sio.emit("host_reconnecting", {"grace_seconds": grace}, room=room, skip_sid=sid)
+            elif state == -1:
+                await teardown_room(room)
+
+        elif role == "student" and room and session_data.get("player_id"):
+            # Игрока убираем не сразу: в течение STUDENT_RESUME_GRACE_SECONDS
+            # он может вернуться с resume_token и продолжить с тем же счётом
+            _schedule_removal(room, session_data["player_id"], sid)
 
         await sio.leave_room(sid, "*")
 
     except KeyError:
-        logger.warning(f"Session data not found for SID: {sid}")
+        logger.warning("Session data not found for SID: %s", sid)
     except Exception as e:
-        logger.error(f"Unexpected disconnect error: {str(e)}", exc_info=True)
+        logger.error("Unexpected disconnect error: %s", e, exc_info=True)
 
 
 @sio.on("host_join")
 async def host_join(sid, data):
-    db = next(get_db())
     try:
         session_data = await sio.get_session(sid)
         if session_data.get("role") != "host":
@@ -165,90 +405,178 @@ async def host_join(sid, data):
             await sio.emit("error", {"message": "Некорректный world_id"}, to=sid)
             return
 
-        session = AdventureSession.create(
-            db,
-            host_id=session_data["user_id"],
-            world_id=world_id,
-        )
+        r = await get_redis()
+        snapshot = await world_snapshot.cached_snapshot(r, world_id)
+        created = await _run_db(_create_session, session_data["user_id"], world_id, snapshot)
+        if created is None:
+            await sio.emit("error", {"message": "Мир не найден"}, to=sid)
+            return
+        join_code, steps_count, loaded = created
+        if loaded is not None:
+            await world_snapshot.share(r, loaded)
 
-        host_sessions[session.join_code] = sid
-        session_data["room_code"] = session.join_code
+        host_sessions.set(join_code, sid)
+        session_data["room_code"] = join_code
+        session_data["world_id"] = world_id
 
-        steps = generate_steps(session.join_code, db)
-        r = await get_redis()
-        await room_store.ensure_room(r, session.join_code, len(steps))
-        await sio.enter_room(sid, session.join_code)
+        await room_store.ensure_room(r, join_code, steps_count, world_id)
+        await room_store.set_host(r, join_code, session_data["user_id"], sid)
+        await sio.enter_room(sid, join_code)
+        # Изменения состава комнаты приходят хосту пачками roster_update
+        await sio.enter_room(sid, lobby_room(join_code))
 
         await sio.emit("host_ready", {
-            "join_code": session.join_code,
-            "steps_count": len(steps),
+            "join_code": join_code,
+            "steps_count": steps_count,
         }, to=sid)
 
     except IntegrityError as e:
-        logger.error(f"Session creation conflict: {e}")
+        logger.error("Session creation conflict: %s", e)
         await sio.emit("error", {"message": e.message}, to=sid)
-        db.rollback()
     except HostPermissionError as e:
         await sio.emit("auth_error", {"message": e.message}, to=sid)
     except Exception as e:
-        logger.error(f"Unexpected error in host_join: {e}", exc_info=True)
+        logger.error("Unexpected error in host_join: %s", e, exc_info=True)
         await sio.emit("error", {"message": "Ошибка при создании игры"}, to=sid)
-        db.rollback()
-    finally:
-        db.close()
+
+
+@sio.on("host_rejoin")
+async def host_rejoin(sid, data):
+    """
+    Хост вернулся после обрыва связи (в течение HOST_GRACE_SECONDS): комната
+    привязывается к новому sid, отложенное закрытие отменяется.
+    """
+    session_data = await sio.get_session(sid)
+    if session_data.get("role") != "host" or not session_data.get("user_id"):
+        await sio.emit("error", {"message": "Только хост может выполнить это действие"}, to=sid)
+        return
+    room_code = (data or {}).get("room_code")
+    if not isinstance(room_code, str) or len(room_code) != 4:
+        await sio.emit("error", {"message": "Неверный код сессии"}, to=sid)
+        return
+
+    r = await get_redis()
+    state = await room_store.rejoin_host(r, room_code, session_data["user_id"], sid)
+    if state is None:
+        await sio.emit("error", {"message": "Комната не найдена"}, to=sid)
+        return
+    HOST_GRACE.labels("rejoined").inc()
+
+    host_sessions.set(room_code, sid)
+    session_data["room_code"] = room_code
+    session_data["world_id"] = state["world_id"]
+    session_data["isStarted"] = state["started"]
+    await sio.save_session(sid, session_data)
+    await sio.enter_room(sid, room_code)
+    await sio.enter_room(sid, lobby_room(room_code))
+
+    previous_sid = state["previous_sid"]
+    if previous_sid and previous_sid != sid and sio.manager.is_connected(previous_sid, "/"):
+        # Сервер ещё не заметил обрыв старого соединения: закрываем его сами
+        await sio.disconnect(previous_sid)
+
+    leaderboard_list = await room_store.get_leaderboard(r, room_code)
+    await sio.emit("host_rejoined", {
+        "join_code": room_code,
+        "steps_count": state["steps_count"],
+        "started": state["started"],
+        "pacing": state["pacing"],
+        "current_step": state["current_step"],
+        "leaderboard": leaderboard_list,
+    }, to=sid)
+    await sio.emit("host_reconnected", {}, room=room_code, skip_sid=sid)
 
 
 @sio.on('student_join')
 async def student_join(sid, data):
-    db = next(get_db())
     try:
         room_code = (data or {}).get('room_code')
 
         if not room_code or not isinstance(room_code, str) or len(room_code) != 4:
             raise InvalidCodeError()
 
-        session = db.query(AdventureSession).filter_by(join_code=room_code).first()
-        if not session:
-            raise SessionNotFoundError()
+        username = (data or {}).get("username")
+        if username is not None and not isinstance(username, str):
+            raise InvalidUsernameError()
+        if username is not None:
+            # Имя уходит в game_results.username: длиннее колонки PostgreSQL его не примет
+            username = username[:GameResult.username.type.length]
 
         r = await get_redis()
+        resume_token = (data or {}).get("resume_token")
+        if isinstance(resume_token, str) and await _resume_student(r, sid, room_code, resume_token):
+            return
+
+        info = await _run_db(_session_info, room_code)
+        if info is None:
+            raise SessionNotFoundError()
+        world_id, steps_count = info
+
         if await room_store.is_started(r, room_code):
             raise GameAlreadyStartedError()
 
-        steps_count = db.query(AdventureStep).filter_by(
-            session_id=room_code
-        ).count()
-        await room_store.ensure_room(r, room_code, steps_count)
+        await room_store.ensure_room(r, room_code, steps_count, world_id)
+        game = await room_store.get_game_info(r, room_code)
 
+        # Игрок в комнате — player_id, а не sid: после переподключения sid будет другим
+        player_id = uuid.uuid4().hex
+        session_data = await sio.get_session(sid)
         await sio.save_session(sid, {
             "role": "student",
+            "ip": session_data.get("ip"),
             "room_code": room_code,
+            "player_id": player_id,
+            "game": game,
             "progress": {"current_step": 0}
         })
 
-        await room_store.upsert_player(
+        resume_secret = await room_store.upsert_player(
             r,
             room_code,
+            player_id,
             sid,
-            (data or {}).get("username"),
+            username,
         )
 
         await sio.enter_room(sid, room_code)
-        await sio.emit('student_joined', {'message': 'Success'}, to=sid)
-        await sio.emit('new_student_joined', {'sid': sid, 'username': (data or {}).get('username')}, room=room_code)
+        await sio.emit('student_joined', {
+            'message': 'Success',
+            'player_id': player_id,
+            'resume_token': f"{player_id}.{resume_secret}",
+        }, to=sid)
+        # Остальным ученикам о входе не сообщаем: хосту и подписчикам lobby_subscribe — пачкой
+        await roster.joined(room_code, player_id, username)
 
     except ConnectError as e:
         await sio.emit('join_error', {'error': str(e)}, to=sid)
     except Exception as e:
-        logger.error(f"Неожиданная ошибка : {e}")
+        logger.error("Неожиданная ошибка : %s", e)
         await sio.emit("error", {"message": "Внутренняя ошибка сервера"})
-    finally:
-        db.close()
+
+
+@sio.on("lobby_subscribe")
+async def lobby_subscribe(sid, data):
+    """Ученик хочет видеть, кто в комнате: текущий состав сразу, дальше — roster_update."""
+    session_data = await sio.get_session(sid)
+    room_code = session_data.get("room_code")
+    if session_data.get("role") != "student" or not room_code:
+        await sio.emit("error", {"message": "Комната не найдена"}, to=sid)
+        return
+    await sio.enter_room(sid, lobby_room(room_code))
+    r = await get_redis()
+    await sio.emit("roster", {"players": await room_store.get_roster(r, room_code)}, to=sid)
+
+
+@sio.on("lobby_unsubscribe")
+async def lobby_unsubscribe(sid, data):
+    session_data = await sio.get_session(sid)
+    room_code = session_data.get("room_code")
+    if room_code:
+        await sio.leave_room(sid, lobby_room(room_code))
 
 
 @sio.on("game_start")
 async def game_start(sid, data):
-    db = next(get_db())
     try:
         session_data = await sio.get_session(sid)
         if session_data.get("role") != "host":
@@ -260,35 +588,31 @@ async def game_start(sid, data):
             await sio.emit("error", {"message": "Комната не найдена"}, to=sid)
             return
 
-        steps = db.query(AdventureStep).filter_by(
-            session_id=room
-        ).order_by(AdventureStep.step_number).all()
-
-        tasks = []
-        for step in steps:
-            if step.quiz_step:
-                tasks.append({
-                    "type": "quiz",
-                    "step_id": step.id,
-                    "step_number": step.step_number,
-                    "question": step.quiz_step.question,
-                    "options": [{"id": opt.id, "text": opt.text} for opt in step.quiz_step.options]
-                })
-            elif step.word_order_step:
-                sentence_text = (step.word_order_step.sentence.sentence or "").lower()
-                tasks.append({
-                    "type": "word_order",
-                    "step_id": step.id,
-                    "step_number": step.step_number,
-                    "sentence": sentence_text,
-                    "words": sentence_text.split()
-                })
+        pacing = (data or {}).get("pacing", settings.game_pacing_default)
+        if pacing not in paced_steps.PACING_MODES:
+            await sio.emit("error", {"message": "Некорректный режим выдачи шагов"}, to=sid)
+            return
 
+        # Тексты предложений — из снимка мира, без запроса на каждый шаг
         r = await get_redis()
-        await room_store.ensure_room(r, room, len(steps))
+        world_id = session_data.get("world_id")
+        snapshot = await world_snapshot.cached_snapshot(r, world_id) if world_id else None
+        tasks, loaded = await _run_db(_game_tasks, room, world_id, snapshot)
+        if loaded is not None:
+            await world_snapshot.share(r, loaded)
+
+        await room_store.ensure_room(r, room, len(tasks))
         leaderboard_list = await room_store.get_leaderboard(r, room)
 
-        await sio.emit("game_started", tasks, room=room)
+        if pacing == "all":
+            await sio.emit("game_started", tasks, room=room)
+        else:
+            # Задания сериализуются здесь один раз; ученикам они уходят по одному событием step
+            payloads = paced_steps.serialize_steps(tasks)
+            game_id = await room_store.save_steps(r, room, payloads, pacing)
+            paced_steps.prime(game_id, payloads)
+            await sio.emit("game_started", {"pacing": pacing, "steps_count": len(tasks)}, room=room)
+            await paced_steps.send_step(r, room, game_id, 0, to=room)
         await sio.emit("leaderboard", leaderboard_list, to=sid)
 
         await room_store.set_started(r, room)
@@ -296,15 +620,29 @@ async def game_start(sid, data):
         await sio.save_session(sid, session_data)
 
     except Exception as e:
-        logger.error(f"Game start error: {e}", exc_info=True)
+        logger.error("Game start error: %s", e, exc_info=True)
         await sio.emit("error", {"message": "Ошибка при старте игры"}, to=sid)
-    finally:
-        db.close()
+
+
+@sio.on("next_step")
+async def next_step(sid, data):
+    """Хост открывает всей комнате следующий шаг игры с pacing "host"."""
+    session_data = await sio.get_session(sid)
+    room = session_data.get("room_code")
+    if session_data.get("role") != "host" or not room:
+        await sio.emit("error", {"message": "Только хост может выполнить это действие"}, to=sid)
+        return
+    r = await get_redis()
+    step = await room_store.advance_step(r, room)
+    if step < 0:
+        await sio.emit("error", {"message": "Следующего шага нет"}, to=sid)
+        return
+    game = await room_store.get_game_info(r, room)
+    await paced_steps.send_step(r, room, game["game_id"], step, to=room)
 
 
 @sio.on('check_answer')
 async def check_answer(sid, data):
-    db = next(get_db())
     try:
         session_data = await sio.get_session(sid)
         room_code = session_data.get("room_code")
@@ -317,70 +655,98 @@ async def check_answer(sid, data):
             await sio.emit("error", {"message": "Некорректный шаг"}, to=sid)
             return
 
-        step = db.query(AdventureStep).filter_by(
-            session_id=room_code,
-            step_number=step_index + 1
-        ).first()
+        # Отказы — до запросов к базе: один вызов Lua на лимиты и один на отметку шага
+        r = await get_redis()
+        bucket = await rate_limit.take(r, _answer_buckets(sid, session_data))
+        if bucket:
+            # Без ответа клиенту: на поток событий он получил бы такой же поток ошибок
+            rate_limit.RATE_LIMITED.labels("check_answer", "sid" if bucket == 1 else "ip").inc()
+            return
+        player_id = session_data.get("player_id", sid)
+        if await room_store.is_answered(r, room_code, player_id, step_index):
+            ANSWERS_REJECTED.labels("duplicate").inc()
+            await sio.emit("error", {"message": "Ответ на этот шаг уже принят"}, to=sid)
+            return
 
+        step = await _run_db(_answer_step, room_code, step_index)
         if not step:
             await sio.emit("error", {"message": "Шаг не найден"}, to=sid)
             return
 
         is_correct = False
-        if step.quiz_step:
+        if step.quiz_step_id is not None:
             answer = (data or {}).get('answer')
             if not isinstance(answer, int):
                 await sio.emit("error", {"message": "Некорректный ответ"}, to=sid)
                 return
-            correct_option = db.query(QuizOption).filter_by(
-                quiz_step_id=step.quiz_step.id,
-                is_correct=True
-            ).first()
-            is_correct = (answer == (correct_option.id if correct_option else None))
+            is_correct = (answer == step.correct_option_id)
+            item = ("word", step.word_id)
         else:
-            expected = (step.word_order_step.sentence.sentence or "").lower().split()
+            world_id = (session_data.get("game") or {}).get("world_id")
+            snapshot = await world_snapshot.cached_snapshot(r, world_id) if world_id else None
+            expected = snapshot.sentence_words(step.sentence_id) if snapshot is not None else None
+            if expected is None:
+                expected, loaded = await _run_db(_expected_words, world_id, step.sentence_id)
+                if loaded is not None:
+                    await world_snapshot.share(r, loaded)
             answer = (data or {}).get("answer")
             if not isinstance(answer, list):
                 await sio.emit("error", {"message": "Некорректный ответ"}, to=sid)
                 return
-            is_correct = (answer == expected)
+            # expected — заранее нормализованный кортеж токенов, проверка — одно сравнение
+            is_correct = (tuple(answer) == expected)
+            item = ("sentence", step.sentence_id)
 
         time_spent = float((data or {}).get("time_spent", 0.0))
         score = calculate_score(is_correct, time_spent)
+        # Событие частое: в лог попадает доля из LOG_SAMPLE_RATES["check_answer"]
+        logger.info(
+            "Ответ в комнате %s, шаг %d: %s, %d очков", room_code, step_index, is_correct, score,
+            extra={"event": "check_answer", "room": room_code, "sid": sid},
+        )
 
-        r = await get_redis()
-        await room_store.add_score(r, room_code, sid, score)
+        # Отметка шага и очки — атомарно: одновременный повтор сюда не пройдёт
+        scored = await room_store.score_answer(r, room_code, player_id, step_index, score)
+        if scored["status"] != "ok":
+            ANSWERS_REJECTED.labels(scored["status"]).inc()
+            message = {
+                "duplicate": "Ответ на этот шаг уже принят",
+                "closed": "Шаг ещё не открыт",
+            }.get(scored["status"], "Комната не найдена")
+            await sio.emit("error", {"message": message}, to=sid)
+            return
+        await results_log.record_answer(
+            r, session_data.get("game") or {}, room_code, player_id, step_index + 1, is_correct, score, time_spent,
+            item=item,
+        )
 
         host_sid = host_sessions.get(room_code)
         if host_sid:
             leaderboard_list = await room_store.get_leaderboard(r, room_code)
             await sio.emit("leaderboard", leaderboard_list, to=host_sid)
 
-        steps_count = await room_store.get_steps_count(r, room_code)
-        if steps_count == 0:
-            steps_count = db.query(AdventureStep).filter_by(
-                session_id=room_code
-            ).count()
-            await room_store.ensure_room(r, room_code, steps_count)
-        if step_index + 1 >= steps_count:
-            all_finished = await room_store.mark_finished_and_check_all(r, room_code, sid)
-            player_score = await room_store.get_player_score(r, room_code, sid)
-            place = await room_store.get_player_place(r, room_code, sid)
-            total_players = len(await room_store.get_leaderboard(r, room_code))
-            await sio.emit(
-                "game_finished",
-                {
-                    "score": player_score,
-                    "place": place,
-                    "total_players": total_players,
-                },
-                to=sid,
+        if scored["pacing"] == "student" and step_index + 1 < scored["steps_count"]:
+            await paced_steps.send_step(
+                r, room_code, (session_data.get("game") or {}).get("game_id"), step_index + 1, to=sid,
             )
-            if all_finished:
+        if step_index + 1 >= scored["steps_count"]:
+            result = await room_store.finish_player(r, room_code, player_id)
+            if result["all_finished"]:
+                # Итог последнему ученику придёт вместе со всеми
                 await _maybe_finish_game(room_code)
+            else:
+                # Предварительное место: пока доигрывают остальные, оно может измениться
+                await sio.emit(
+                    "game_finished",
+                    {
+                        "score": result["score"],
+                        "place": result["place"],
+                        "total_players": result["total_players"],
+                        "final": False,
+                    },
+                    to=sid,
+                )
 
     except Exception as e:
-        logger.error(f"check_answer error: {e}", exc_info=True)
+        logger.error("check_answer error: %s", e, exc_info=True)
         await sio.emit("error", {"message": "Ошибка при проверке ответа"}, to=sid)
-    finally:
-        db.close()
@@ -0,0 +1,66 @@
+"""
+Отложенное закрытие комнат, хост которых отключился.
+
+Обработчик disconnect хоста не закрывает комнату сразу, а кладёт её код
+в ZSET rooms:host_grace со сроком now + HOST_GRACE_SECONDS. Если хост
+вернётся (host_rejoin), код удаляется из ZSET. Каждый процесс раз
+в HOST_GRACE_POLL_SECONDS забирает просроченные коды одним Lua-скриптом
+(ZRANGEBYSCORE + ZREM) и закрывает эти комнаты: ZREM отдаёт каждую комнату
+ровно одному процессу, а сроки в Redis переживают перезапуск любого из них.
+
+Уведомления keyspace об истечении ключей здесь не используются: они
+приходят только подписанным в этот момент процессам, теряются при
+переподключении и требуют notify-keyspace-events в конфигурации Redis.
+"""
+import asyncio
+import logging
+import time
+
+from core import room_store
+from core.config import settings
+from core.redis_client import get_redis
+from .events import HOST_GRACE, teardown_room
+
+logger = logging.getLogger(__name__)
+
+# Сколько комнат закрывать за один опрос
+_CLAIM_LIMIT = 100
+
+
+class HostGraceReaper:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.host_grace_poll_seconds)
+            try:
+                await self.collect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Не удалось закрыть комнаты ушедших хостов: %s", e)
+
+    async def collect(self, now: float | None = None) -> list[str]:
+        """Закрывает комнаты с истёкшим сроком; возвращает их коды."""
+        r = await get_redis()
+        codes = await room_store.claim_expired_hosts(r, now or time.time(), _CLAIM_LIMIT)
+        for code in codes:
+            HOST_GRACE.labels("expired").inc()
+            logger.info("Хост комнаты %s не вернулся, комната закрывается", code)
+            await teardown_room(code)
+        return codes
+
+
+reaper = HostGraceReaper()
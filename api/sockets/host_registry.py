@@ -0,0 +1,109 @@
+"""
+Реестр хостов комнат этого процесса: код комнаты -> sid хоста.
+
+Раньше это был обычный dict: запись добавлял host_join, а удалял только
+disconnect хоста, поэтому завершённые игры (_maybe_finish_game) и хосты,
+чьё отключение не дошло до обработчика, оставались в нём до перезапуска.
+
+Записи живут столько же, сколько комната в Redis: срок
+REDIS_ROOM_TTL_SECONDS продлевается при каждом обращении, как и TTL
+ключей комнаты в core/room_store. Сверх HOST_SESSIONS_MAX_SIZE вытесняется
+запись, к которой дольше всех не обращались. Истёкшие записи удаляются
+при обращении к ним и при purge_expired() (его вызывает сборщик сессий).
+Обработчики из on_evict вызываются для каждой удалённой записи с причиной:
+"finished", "disconnect", "expired", "evicted" или "stale".
+"""
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator
+
+from core.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+HOST_SESSIONS_REMOVED = Counter("host_sessions_removed_total", "Записи реестра хостов, удалённые по причине", ["reason"])
+
+
+class HostSessionRegistry:
+    def __init__(self, ttl: float, max_size: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        # Код комнаты -> (sid хоста, момент истечения); порядок — от давно не тронутых к свежим
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._callbacks: list[Callable[[str, str, str], None]] = []
+
+    def on_evict(self, callback: Callable[[str, str, str], None]) -> None:
+        """callback(code, sid, reason) вызывается для каждой удалённой записи."""
+        self._callbacks.append(callback)
+
+    def set(self, code: str, sid: str) -> None:
+        self._entries[code] = (sid, self._clock() + self.ttl)
+        self._entries.move_to_end(code)
+        while len(self._entries) > self.max_size:
+            old_code, (old_sid, _) = self._entries.popitem(last=False)
+            self._removed(old_code, old_sid, "evicted")
+
+    def get(self, code: str) -> str | None:
+        """sid хоста комнаты; обращение продлевает срок записи, как и TTL комнаты."""
+        entry = self._entries.get(code)
+        if entry is None:
+            return None
+        now = self._clock()
+        if entry[1] <= now:
+            del self._entries[code]
+            self._removed(code, entry[0], "expired")
+            return None
+        self._entries[code] = (entry[0], now + self.ttl)
+        self._entries.move_to_end(code)
+        return entry[0]
+
+    def pop(self, code: str, reason: str = "disconnect") -> str | None:
+        entry = self._entries.pop(code, None)
+        if entry is None:
+            return None
+        self._removed(code, entry[0], reason)
+        return entry[0]
+
+    def purge_expired(self) -> int:
+        """Удаляет все истёкшие записи; они лежат в начале порядка, обход останавливается на первой живой."""
+        now = self._clock()
+        expired = []
+        for code, (sid, expires_at) in self._entries.items():
+            if expires_at > now:
+                break
+            expired.append((code, sid))
+        for code, sid in expired:
+            del self._entries[code]
+            self._removed(code, sid, "expired")
+        return len(expired)
+
+    def items(self) -> list[tuple[str, str]]:
+        return [(code, sid) for code, (sid, _) in self._entries.items()]
+
+    def memory_bytes(self) -> int:
+        """Оценка памяти записей: словарь, кортежи и строки кодов и sid."""
+        size = sys.getsizeof(self._entries)
+        for code, entry in self._entries.items():
+            size += sys.getsizeof(code) + sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+        return size
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _removed(self, code: str, sid: str, reason: str) -> None:
+        HOST_SESSIONS_REMOVED.labels(reason).inc()
+        for callback in self._callbacks:
+            try:
+                callback(code, sid, reason)
+            except Exception as e:
+                logger.error("Обработчик удаления хоста комнаты %s упал: %s", code, e)
+
@@ -0,0 +1,76 @@
+"""
+Пошаговая выдача заданий.
+
+По умолчанию game_start рассылает комнате весь список заданий сразу —
+вместе с вариантами ответов будущих шагов. С {"pacing": "student"}
+ученик получает шаг k+1 событием step, только когда ответил на шаг k;
+с {"pacing": "host"} — когда хост отправит next_step (шаг уходит всей
+комнате). game_started в этих режимах несёт только pacing и steps_count,
+а ответы на ещё не выданные шаги не засчитываются.
+
+Задания сериализуются один раз при старте игры и хранятся в Redis
+(room:{code}:steps). Процесс держит их как fast_json.PreSerialized
+в LRU по (game_id, шаг): пакет step для каждого следующего ученика
+собирается без повторной сериализации задания и без запроса в Redis.
+"""
+from collections import OrderedDict
+
+from redis import asyncio as redis
+
+from core import fast_json
+from core import room_store
+from core.config import settings
+from core.metrics import Counter
+from .server import sio
+
+PACING_MODES = ("all", "student", "host")
+
+STEP_PAYLOADS = Counter("sio_step_payloads_total", "Задания пошаговой игры по источнику", ["source"])
+
+# (game_id, шаг) -> PreSerialized; порядок — от давно не нужных к свежим
+_cache: OrderedDict[tuple[str, int], fast_json.PreSerialized] = OrderedDict()
+
+
+def serialize_steps(tasks: list[dict]) -> list[str]:
+    """Пакеты step: задание с его номером (с 0), по одной JSON-строке на шаг."""
+    return [fast_json.dumps({"step": index, **task}) for index, task in enumerate(tasks)]
+
+
+def _remember(key: tuple[str, int], payload: fast_json.PreSerialized) -> None:
+    _cache[key] = payload
+    _cache.move_to_end(key)
+    while len(_cache) > settings.paced_step_cache_size:
+        _cache.popitem(last=False)
+
+
+def prime(game_id: str | None, payloads: list[str]) -> None:
+    """Кладёт задания только что начатой игры в кэш процесса, который её начал."""
+    if not game_id:
+        return
+    for index, payload in enumerate(payloads):
+        _remember((game_id, index), fast_json.PreSerialized(payload))
+
+
+async def get_step(r: redis.Redis, code: str, game_id: str | None, index: int) -> fast_json.PreSerialized | None:
+    key = (game_id or code, index)
+    payload = _cache.get(key)
+    if payload is not None:
+        _cache.move_to_end(key)
+        STEP_PAYLOADS.labels("local").inc()
+        return payload
+    raw = await room_store.get_step_payload(r, code, index)
+    if raw is None:
+        return None
+    STEP_PAYLOADS.labels("redis").inc()
+    payload = fast_json.PreSerialized(raw)
+    _remember(key, payload)
+    return payload
+
+
+async def send_step(r: redis.Redis, code: str, game_id: str | None, index: int, to: str) -> bool:
+    """Отправляет шаг ученику (sid) или всей комнате (код); False — такого шага нет."""
+    payload = await get_step(r, code, game_id, index)
+    if payload is None:
+        return False
+    await sio.emit("step", payload, to=to)
+    return True
@@ -0,0 +1,74 @@
+"""
+Состав комнаты: входы и выходы учеников копятся и уходят хосту пачкой.
+
+Раньше student_join рассылал new_student_joined всей комнате, а выход
+ученика — student_left: при 200 учениках за первую минуту это около
+20 000 сообщений, которые нужны только хосту. Теперь изменения состава
+копятся в памяти процесса и раз в ROSTER_FLUSH_MS уходят одним
+roster_update {"joined": [{"sid", "username"}], "left": [sid]} в канал
+lobby:{code}. В канале хост комнаты и ученики, подписавшиеся через
+lobby_subscribe; "sid" — это player_id ученика. Ученик, который вошёл
+и вышел в пределах одной пачки, в неё не попадает.
+"""
+import asyncio
+import logging
+
+from core.config import settings
+from core.metrics import Counter
+from .server import sio
+
+logger = logging.getLogger(__name__)
+
+ROSTER_UPDATES = Counter("sio_roster_updates_total", "Отправленные пачки изменений состава комнат")
+
+
+def lobby_room(code: str) -> str:
+    return f"lobby:{code}"
+
+
+class RosterBatcher:
+    def __init__(self):
+        # Код комнаты -> player_id -> {"sid", "username"} для вошедших, None для вышедших
+        self._pending: dict[str, dict[str, dict | None]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def joined(self, code: str, player_id: str, username: str | None) -> None:
+        await self._change(code, player_id, {"sid": player_id, "username": username})
+
+    async def left(self, code: str, player_id: str) -> None:
+        await self._change(code, player_id, None)
+
+    async def _change(self, code: str, player_id: str, entry: dict | None) -> None:
+        changes = self._pending.get(code)
+        if changes is None:
+            changes = self._pending[code] = {}
+            if settings.roster_flush_ms > 0:
+                task = asyncio.get_running_loop().create_task(self._flush_later(code))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        if entry is None and changes.get(player_id) is not None:
+            # Вошёл и вышел, пока копилась пачка: хосту о нём знать незачем
+            del changes[player_id]
+        else:
+            changes[player_id] = entry
+        if settings.roster_flush_ms <= 0:
+            await self.flush(code)
+
+    async def _flush_later(self, code: str) -> None:
+        await asyncio.sleep(settings.roster_flush_ms / 1000)
+        try:
+            await self.flush(code)
+        except Exception as e:
+            logger.error("Не удалось отправить состав комнаты %s: %s", code, e)
+
+    async def flush(self, code: str) -> None:
+        changes = self._pending.pop(code, None)
+        if not changes:
+            return
+        joined = [entry for entry in changes.values() if entry is not None]
+        left = [player_id for player_id, entry in changes.items() if entry is None]
+        ROSTER_UPDATES.inc()
+        await sio.emit("roster_update", {"joined": joined, "left": left}, room=lobby_room(code))
+
+
+roster = RosterBatcher()
@@ -0,0 +1,169 @@
+"""
+Сборщик брошенных игровых сессий и комнат.
+
+Сессия удаляется сама, только когда хост корректно отключился. Если
+процесс упал или перезапустился, а также у сессий из POST /adventures,
+которые так и не запустили, строки adventure_sessions и все их шаги
+остаются навсегда, а коды комнат (их всего 36^4) — занятыми. В Redis
+ключи игроков (room:{code}:player:{sid}) живут без TTL и переживают
+истёкшие meta и рейтинг комнаты.
+
+Раз в session_gc_interval_seconds каждый процесс:
+
+- убирает из host_sessions истёкшие записи и записи хостов, которые уже
+  не подключены (отключение не дошло до обработчика disconnect), и продлевает TTL
+  комнат подключённых хостов, чтобы долгая пауза в игре не сделала
+  комнату «брошенной»;
+- пытается взять блокировку session_gc:lock (SET NX EX на интервал) —
+  общую работу за интервал делает один процесс:
+  - сессии старше session_gc_min_age_seconds по порядку created_at
+    проверяются пачками по session_gc_batch_size на наличие room:{code}:meta,
+    сессии без живой комнаты удаляются вместе с шагами
+    (AdventureSession.delete_many), не больше session_gc_max_batches пачек;
+  - столько же шагов SCAN по ключам игроков с курсором, сохранённым
+    в Redis между проходами: ключи комнат без meta удаляются.
+
+Запросы к базе выполняются в отдельном потоке, чтобы не блокировать loop.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from redis import asyncio as redis
+from sqlalchemy import select, tuple_
+
+from core import room_store
+from core.config import settings
+from core.metrics import Counter, Histogram
+from core.redis_client import get_redis
+from db.models import AdventureSession
+from db.session import SessionLocal
+from .events import host_sessions
+from .server import sio
+
+logger = logging.getLogger(__name__)
+
+GC_RECLAIMED = Counter("session_gc_reclaimed_total", "Строки и ключи, удалённые сборщиком сессий", ["kind"])
+GC_RUN_SECONDS = Histogram("session_gc_run_seconds", "Время одного прохода сборщика сессий")
+GC_ERRORS = Counter("session_gc_errors_total", "Проходы сборщика сессий, завершившиеся ошибкой")
+
+LOCK_KEY = "session_gc:lock"
+SCAN_CURSOR_KEY = "session_gc:scan_cursor"
+
+
+def _old_sessions(cutoff: datetime, after: tuple | None, limit: int) -> list[tuple[str, datetime]]:
+    """Следующая пачка (join_code, created_at) сессий старше cutoff — keyset по (created_at, join_code)."""
+    db = SessionLocal()
+    try:
+        query = (
+            select(AdventureSession.join_code, AdventureSession.created_at)
+            .where(AdventureSession.created_at < cutoff)
+            .order_by(AdventureSession.created_at, AdventureSession.join_code)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(tuple_(AdventureSession.created_at, AdventureSession.join_code) > after)
+        return [(code, created_at) for code, created_at in db.execute(query)]
+    finally:
+        db.close()
+
+
+def _delete_sessions(codes: list[str]) -> dict[str, int]:
+    db = SessionLocal()
+    try:
+        deleted = AdventureSession.delete_many(db, codes)
+        db.commit()
+        return deleted
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class SessionCollector:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.session_gc_interval_seconds)
+            started = time.perf_counter()
+            try:
+                await self.collect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                GC_ERRORS.inc()
+                logger.error("Проход сборщика сессий не удался: %s", e)
+            GC_RUN_SECONDS.observe(time.perf_counter() - started)
+
+    async def collect(self) -> dict[str, int]:
+        """Один проход; возвращает, сколько чего удалено (для логов и бенчмарков)."""
+        r = await get_redis()
+        reclaimed = {"host_sessions": await self._reap_host_sessions(r)}
+        if await r.set(LOCK_KEY, "1", nx=True, ex=settings.session_gc_interval_seconds):
+            reclaimed.update(await self._reap_sessions(r))
+            reclaimed["redis_players"] = await self._reap_players(r)
+        for kind, count in reclaimed.items():
+            if count:
+                GC_RECLAIMED.labels(kind).inc(count)
+        if any(reclaimed.values()):
+            logger.info("Сборщик сессий удалил: %s", reclaimed)
+        return reclaimed
+
+    async def _reap_host_sessions(self, r: redis.Redis) -> int:
+        removed = host_sessions.purge_expired()
+        stale = [code for code, sid in host_sessions.items() if not sio.manager.is_connected(sid, "/")]
+        for code in stale:
+            host_sessions.pop(code, "stale")
+        await room_store.touch_rooms(r, list(host_sessions))
+        return removed + len(stale)
+
+    async def _reap_sessions(self, r: redis.Redis) -> dict[str, int]:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.session_gc_min_age_seconds)
+        batch_size = settings.session_gc_batch_size
+        reclaimed: dict[str, int] = {}
+        after = None
+        for _ in range(settings.session_gc_max_batches):
+            batch = await asyncio.to_thread(_old_sessions, cutoff, after, batch_size)
+            if not batch:
+                break
+            last_code, last_created_at = batch[-1]
+            after = (last_created_at, last_code)
+            codes = [code for code, _ in batch]
+            alive = await room_store.rooms_alive(r, codes)
+            abandoned = [code for code in codes if code not in alive and code not in host_sessions]
+            if abandoned:
+                deleted = await asyncio.to_thread(_delete_sessions, abandoned)
+                for kind, count in deleted.items():
+                    reclaimed[kind] = reclaimed.get(kind, 0) + count
+            if len(batch) < batch_size:
+                break
+        return reclaimed
+
+    async def _reap_players(self, r: redis.Redis) -> int:
+        cursor = int(await r.get(SCAN_CURSOR_KEY) or 0)
+        deleted = 0
+        for _ in range(settings.session_gc_max_batches):
+            cursor, count = await room_store.reap_orphan_players(r, cursor, settings.session_gc_scan_count)
+            deleted += count
+            if cursor == 0:
+                break
+        await r.set(SCAN_CURSOR_KEY, cursor)
+        return deleted
+
+
+collector = SessionCollector()
@@ -1,27 +1,29 @@
 import random
-from db.models import AdventureSession, AdventureStep, QuizStep, WordOrderStep, QuizOption
+from core import distractors
+from core.world_snapshot import WorldSnapshot
+from db.models import AdventureStep, QuizStep, WordOrderStep, QuizOption
 from db.session import get_db
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from fastapi import Depends
 
 
-def generate_steps(session_id: str, db: Session = Depends(get_db)):
+def generate_steps(session_id: str, db: Session = Depends(get_db), snapshot: WorldSnapshot | None = None):
     """
-    Генерирует шаги приключения для указанной сессии.
+    Генерирует шаги приключения для указанной сессии и возвращает их id.
+    Слова и предложения берутся из снимка мира сессии (core/world_snapshot).
+    Может построить индекс неправильных вариантов, поэтому из event loop
+    вызывается в пуле потоков или после distractors.prepare.
     """
-    # Получаем сессию и связанный мир
-    session = db.get(AdventureSession, session_id)
-    if not session:
-        raise ValueError("Сессия не найдена")
+    if snapshot is None:
+        raise ValueError("Мир не найден")
 
-    world = session.world
-    words = world.words
-    sentences = world.sentences
-
-    steps = []
-
-    has_sentences = bool(sentences)
+    has_sentences = bool(snapshot.sentence_ids)
+    distractor_index = distractors.get_index(snapshot)
 
+    # Сначала выбираются задания, потом строки пишутся пачками: по одному
+    # INSERT на таблицу вместо flush и отдельных INSERT на каждый шаг и вариант
+    plan = []
     for step_number in range(1, 10):  # 9 шагов - магическое число!
         if has_sentences:
             step_type = random.choice(["quiz", "word_order"])
@@ -29,62 +31,34 @@ def generate_steps(session_id: str, db: Session = Depends(get_db)):
             step_type = "quiz"
 
         if step_type == "quiz":
-            # Создаём шаг викторины
-            word = random.choice(words)
-
-            # Основной шаг
-            step = AdventureStep(
-                session_id=session_id,
-                step_number=step_number
-            )
-            db.add(step)
-            db.flush()  # Чтобы получить ID для связи
-
-            # Детали викторины
-            quiz = QuizStep(
-                id=step.id,
-                question=f"Переведите: {word.word}"
-            )
-            db.add(quiz)
-
-            # Варианты ответов
-            correct_option = QuizOption(
-                quiz_step_id=quiz.id,
-                text=word.translation,
-                is_correct=True
-            )
-            db.add(correct_option)
-
-            # 3 случайных неправильных варианта
-            candidates = [w for w in words if w.id != word.id]
-            for wrong_word in random.sample(candidates, k=min(3, len(candidates))):
-                db.add(QuizOption(
-                    quiz_step_id=quiz.id,
-                    text=wrong_word.translation,
-                    is_correct=False
-                ))
-
-            steps.append(step)
-
+            plan.append((step_number, "quiz", random.choice(snapshot.word_ids)))
         elif step_type == "word_order":
-            # Создаём шаг сбора предложения
-            sentence = random.choice(sentences)
+            plan.append((step_number, "word_order", random.choice(snapshot.sentence_ids)))
 
-            # Основной шаг
-            step = AdventureStep(
-                session_id=session_id,
-                step_number=step_number
-            )
-            db.add(step)
-            db.flush()
+    # Основные шаги — одним INSERT ... RETURNING: их id нужны деталям шагов
+    step_ids = dict((number, step_id) for step_id, number in db.execute(
+        insert(AdventureStep).returning(AdventureStep.id, AdventureStep.step_number),
+        [{"session_id": session_id, "step_number": step_number} for step_number, _, _ in plan],
+    ))
 
-            # Детали шага
-            db.add(WordOrderStep(
-                id=step.id,
-                sentence_id=sentence.id,
-            ))
+    quizzes, options, word_orders = [], [], []
+    for step_number, step_type, item_id in plan:
+        step_id = step_ids[step_number]
+        if step_type == "quiz":
+            word, translation = snapshot.word(item_id)
+            quizzes.append({"id": step_id, "question": f"Переведите: {word}", "word_id": item_id})
+            options.append({"quiz_step_id": step_id, "text": translation, "is_correct": True})
+            # 3 неправильных варианта из переводов, похожих на верный
+            options.extend(
+                {"quiz_step_id": step_id, "text": wrong_translation, "is_correct": False}
+                for wrong_translation in distractor_index.pick(item_id, 3)
+            )
+        else:
+            word_orders.append({"id": step_id, "sentence_id": item_id})
 
-            steps.append(step)
+    for model, rows in ((QuizStep, quizzes), (QuizOption, options), (WordOrderStep, word_orders)):
+        if rows:
+            db.execute(insert(model), rows)
 
     db.commit()
-    return steps
\ No newline at end of file
+    return [step_ids[step_number] for step_number, _, _ in plan]
@@ -0,0 +1,114 @@
+"""
+Общие утилиты для скриптов из benchmarks/: окружение, тестовые данные
+и подмена транспорта Socket.IO, чтобы вызывать обработчики напрямую.
+"""
+import os
+from collections import defaultdict
+
+
+def prepare_env(database_url: str | None = None) -> None:
+    """Заполняет обязательные настройки до импорта core.config."""
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ.setdefault("S3_ENDPOINT", "http://localhost")
+    os.environ.setdefault("S3_BUCKET", "bench")
+    os.environ.setdefault("S3_ACCESS_KEY", "bench")
+    os.environ.setdefault("S3_SECRET_KEY", "bench")
+
+
+def use_fake_redis():
+    """Подменяет общий Redis-клиент на in-process fakeredis."""
+    import fakeredis
+    from core import redis_client
+
+    fake = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    redis_client.redis_client = fake
+    return fake
+
+
+def seed_world(db, *, words: int = 50, sentences: int = 10, email: str = "bench@example.com"):
+    """Создаёт автора и публичный мир с заданным количеством слов и предложений."""
+    from core.security import get_password_hash
+    from core.tokenizer import tokenize
+    from db.models import User, World, Word, Sentence
+
+    user = db.query(User).filter(User.email == email).first()
+    if not user:
+        user = User(username="bench", email=email, password_hash=get_password_hash("bench-password"))
+        db.add(user)
+        db.commit()
+
+    world = World(title="Bench world", description="", is_public=True, author_id=user.id)
+    db.add(world)
+    db.commit()
+
+    db.add_all([
+        Word(word=f"word{i}", translation=f"сүз{i}", world_id=world.id)
+        for i in range(words)
+    ])
+    db.add_all([
+        Sentence(sentence=f"Бу {i} нче җөмлә монда.", tokens=tokenize(f"Бу {i} нче җөмлә монда."), world_id=world.id)
+        for i in range(sentences)
+    ])
+    db.commit()
+    return user, world
+
+
+class SioRecorder:
+    """
+    Подменяет у сервера sio методы работы с сессиями, комнатами и emit.
+    Обработчики из api/sockets/events.py можно вызывать как обычные корутины,
+    а все отправленные сообщения остаются в self.emitted.
+    """
+
+    def __init__(self):
+        self.sessions: dict[str, dict] = {}
+        self.rooms: dict[str, set[str]] = defaultdict(set)
+        self.emitted: list[tuple[str, str | None, object]] = []
+        self.deliveries = 0
+        self.deliveries_by_event: dict[str, int] = defaultdict(int)
+
+    def install(self, sio) -> "SioRecorder":
+        sio.get_session = self.get_session
+        sio.save_session = self.save_session
+        sio.emit = self.emit
+        sio.enter_room = self.enter_room
+        sio.leave_room = self.leave_room
+        return self
+
+    async def get_session(self, sid, namespace=None):
+        return self.sessions.setdefault(sid, {})
+
+    async def save_session(self, sid, session, namespace=None):
+        self.sessions[sid] = session
+
+    async def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None, **kwargs):
+        target = to or room
+        self.emitted.append((event, target, data))
+        if target is None:
+            recipients = set(self.sessions)
+        elif target in self.rooms:
+            recipients = self.rooms[target]
+        else:
+            recipients = {target}
+        delivered = len(recipients - {skip_sid})
+        self.deliveries += delivered
+        self.deliveries_by_event[event] += delivered
+
+    async def enter_room(self, sid, room, namespace=None):
+        self.rooms[room].add(sid)
+
+    async def leave_room(self, sid, room, namespace=None):
+        if room == "*":
+            for members in self.rooms.values():
+                members.discard(sid)
+        else:
+            self.rooms[room].discard(sid)
+
+    def last(self, event: str):
+        for name, _, data in reversed(self.emitted):
+            if name == event:
+                return data
+        return None
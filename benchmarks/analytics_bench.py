@@ -0,0 +1,162 @@
+"""
+Статистика по словам и предложениям (core/analytics): сведение ответов
+циклом по строкам против NumPy и чтение для учителя из world_item_stats
+против агрегации по answer_log.
+
+    python -m benchmarks.analytics_bench [--games 2000] [--players 25]
+
+Ответы генерируются для одного мира на 300 слов и 40 предложений,
+по 9 шагов на игрока, и пишутся во временную базу SQLite.
+
+В конце мир правится так, как это делает PUT /worlds/{id}: одно слово
+и одно предложение удаляются, у слова и предложения меняются регистр
+и пробелы, добавляется новое слово. Статистика остальных должна
+остаться прежней; иначе — FAIL и код выхода 1.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from benchmarks._harness import prepare_env
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "iketel_analytics_bench.db")
+
+
+def _answers(world_id: int, word_ids: list[int], sentence_ids: list[int], games: int, players: int) -> list[dict]:
+    rng = random.Random(7)
+    # У каждого слова своя «настоящая» точность — чтобы было что сортировать
+    accuracy = {key: rng.uniform(0.3, 0.95) for key in
+                [("word", i) for i in word_ids] + [("sentence", i) for i in sentence_ids]}
+    moment = datetime(2026, 1, 1)
+    rows = []
+    for _ in range(games):
+        game_id = uuid.uuid4().hex
+        steps = [("word", rng.choice(word_ids)) if rng.random() < 0.7 else ("sentence", rng.choice(sentence_ids))
+                 for _ in range(9)]
+        for player in range(players):
+            for number, item in enumerate(steps, start=1):
+                rows.append({
+                    "game_id": game_id, "world_id": world_id, "join_code": "BNCH", "player_id": f"p{player}",
+                    "step_number": number, "item_type": item[0], "item_id": item[1],
+                    "is_correct": rng.random() < accuracy[item], "score": 100,
+                    "time_spent": rng.uniform(1.0, 12.0), "answered_at": moment,
+                })
+    return rows
+
+
+def _python_loop(rows) -> dict:
+    totals = defaultdict(lambda: [0, 0, 0.0, 0])
+    for world_id, item_type, item_id, is_correct, time_spent in rows:
+        entry = totals[(world_id, item_type, item_id)]
+        entry[0] += 1
+        entry[1] += bool(is_correct)
+        if time_spent is not None:
+            entry[2] += time_spent
+            entry[3] += 1
+    return totals
+
+
+def _timed(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def _check_edit(db, world_id: int) -> list[str]:
+    """Правит мир и сравнивает статистику до и после правки."""
+    from api.endpoints.worlds import _replace_content
+    from api.models.worlds import WorldCreate
+    from core import analytics
+    from db.models import Sentence, Word
+
+    before = {(item["item_type"], item["item_id"]): item["attempts"] for item in analytics.get_world_stats(db, world_id)}
+    words = db.query(Word).filter(Word.world_id == world_id).order_by(Word.id).all()
+    sentences = db.query(Sentence).filter(Sentence.world_id == world_id).order_by(Sentence.id).all()
+    removed = {("word", words[0].id), ("sentence", sentences[0].id)}
+    edited = WorldCreate(
+        title="Bench world",
+        words=[{"word": words[1].word.upper(), "translation": f"  {words[1].translation} "}]
+        + [{"word": w.word, "translation": w.translation} for w in words[2:]]
+        + [{"word": "яңа", "translation": "новое"}],
+        sentences=[{"sentence": sentences[1].sentence.lower()}]
+        + [{"sentence": s.sentence} for s in sentences[2:]],
+    )
+    started = time.perf_counter()
+    _replace_content(db, world_id, edited)
+    db.commit()
+    edit_ms = (time.perf_counter() - started) * 1000
+
+    after = {(item["item_type"], item["item_id"]): item["attempts"] for item in analytics.get_world_stats(db, world_id)}
+    expected = {key: attempts for key, attempts in before.items() if key not in removed}
+    print(f"{'правка мира, мс':<40}{edit_ms:>12.1f}")
+    print(f"статистика после правки: {len(after)} из {len(expected)} позиций, прежних значений: "
+          f"{sum(after.get(key) == attempts for key, attempts in expected.items())}")
+    return [] if after == expected else ["статистика изменилась после правки мира"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=25)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    prepare_env(f"sqlite:///{DB_PATH}")
+    from sqlalchemy import case, func, select
+
+    from benchmarks._harness import seed_world
+    from core import analytics
+    from db.models import AnswerLog, Base
+    from db.session import SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    _, world = seed_world(db, words=300, sentences=40)
+    world_id = world.id
+    rows = _answers(world_id, [w.id for w in world.words], [s.id for s in world.sentences], args.games, args.players)
+    print(f"ответов: {len(rows)} ({args.games} игр × {args.players} игроков × 9 шагов)")
+
+    columns = [(r["world_id"], r["item_type"], r["item_id"], r["is_correct"], r["time_spent"]) for r in rows]
+    loop_ms = _timed(lambda: _python_loop(columns))
+    numpy_ms = _timed(lambda: analytics.aggregate(columns))
+    batch = columns[:500]
+    print(f"{'сведение':<40}{'цикл, мс':>12}{'NumPy, мс':>12}")
+    print(f"{'все ответы':<40}{loop_ms:>12.1f}{numpy_ms:>12.1f}")
+    print(f"{'пачка писателя (500)':<40}{_timed(lambda: _python_loop(batch), 20):>12.2f}"
+          f"{_timed(lambda: analytics.aggregate(batch), 20):>12.2f}")
+
+    for start in range(0, len(rows), 20000):
+        db.execute(AnswerLog.__table__.insert(), rows[start:start + 20000])
+    db.commit()
+
+    rebuild_ms = _timed(lambda: analytics.rebuild_world_stats(db, world_id), 1)
+    # Так пришлось бы отвечать учителю без world_item_stats: агрегация по всему журналу мира
+    on_the_fly = (
+        select(AnswerLog.item_type, AnswerLog.item_id, func.count(),
+               func.sum(case((AnswerLog.is_correct, 1), else_=0)), func.avg(AnswerLog.time_spent))
+        .where(AnswerLog.world_id == world_id)
+        .group_by(AnswerLog.item_type, AnswerLog.item_id)
+    )
+    print(f"{'пересчёт rebuild_world_stats, мс':<40}{rebuild_ms:>12.1f}")
+    print(f"{'чтение: GROUP BY по answer_log, мс':<40}{_timed(lambda: db.execute(on_the_fly).all()):>12.1f}")
+    print(f"{'чтение: get_world_stats, мс':<40}{_timed(lambda: analytics.get_world_stats(db, world_id)):>12.1f}")
+
+    problems = _check_edit(db, world_id)
+    db.close()
+    for problem in problems:
+        print("FAIL", problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
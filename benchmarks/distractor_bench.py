@@ -0,0 +1,125 @@
+"""
+Неправильные варианты викторины на мирах разного размера: прежний
+random.sample по списку всех остальных слов против core/distractors.
+
+    python -m benchmarks.distractor_bench [--sizes 100 1000 10000]
+
+Для каждого размера — время выбора вариантов на один вопрос, время
+построения индекса (один раз на версию мира) и «похожесть» вариантов:
+среднее косинусное сходство биграмм неправильного перевода с верным
+(у случайных вариантов оно около нуля — их легко отбросить).
+Для самого большого мира — самая долгая пауза event loop, пока индекс
+строится прямо в нём (get_index) и в пуле потоков (prepare).
+"""
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmarks._harness import prepare_env
+
+SYLLABLES = ["ка", "ла", "ма", "ры", "су", "ти", "но", "бе", "гу", "да", "ше", "ял", "ир", "өй", "күл", "тау"]
+
+
+def _vocabulary(size: int, rng: random.Random) -> list[SimpleNamespace]:
+    return [
+        SimpleNamespace(id=i + 1, word=f"w{i}",
+                        translation="".join(rng.choices(SYLLABLES, k=rng.randint(1, 6))) + str(i % 7))
+        for i in range(size)
+    ]
+
+
+def _old_pick(words, word) -> list[str]:
+    candidates = [w for w in words if w.id != word.id]
+    return [w.translation for w in random.sample(candidates, k=min(3, len(candidates)))]
+
+
+def _similarity(features, positions: dict[str, int], correct: str, options: list[str]) -> float:
+    return float(np.mean([features[positions[correct]] @ features[positions[o]] for o in options]))
+
+
+async def _loop_stall(build) -> float:
+    """Самая долгая пауза event loop (мс), пока выполняется build()."""
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await build()
+    done = True
+    await task
+    return stall * 1000
+
+
+async def _stalls(words) -> tuple[float, float]:
+    from core import distractors
+
+    def snapshot(version: int) -> SimpleNamespace:
+        # Новая версия на каждый замер: индекс не берётся из кэша
+        return SimpleNamespace(world_id=0, version=version, word_ids=[w.id for w in words],
+                               translations=lambda: [w.translation for w in words])
+
+    async def on_loop():
+        distractors.get_index(snapshot(1))
+
+    async def in_thread():
+        await distractors.prepare(snapshot(2))
+
+    return await _loop_stall(on_loop), await _loop_stall(in_thread)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--questions", type=int, default=2000)
+    args = parser.parse_args()
+
+    prepare_env()
+    from core.config import settings
+    from core.distractors import DistractorIndex, _features
+
+    rng = random.Random(11)
+    print(f"{'слов':>7}{'прежний, мкс':>15}{'индекс, мкс':>14}{'построение, мс':>17}"
+          f"{'сходство: прежний':>20}{'индекс':>9}")
+    for size in args.sizes:
+        words = _vocabulary(size, rng)
+        questions = [rng.choice(words) for _ in range(args.questions)]
+
+        started = time.perf_counter()
+        old = [_old_pick(words, word) for word in questions]
+        old_us = (time.perf_counter() - started) / len(questions) * 1e6
+
+        started = time.perf_counter()
+        index = DistractorIndex([w.id for w in words], [w.translation for w in words], settings.distractor_candidates)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        new = [index.pick(word.id, 3) for word in questions]
+        new_us = (time.perf_counter() - started) / len(questions) * 1e6
+
+        texts = [w.translation for w in words]
+        features = _features(texts)
+        positions = {text: pos for pos, text in enumerate(texts)}
+        old_sim = np.mean([_similarity(features, positions, w.translation, o) for w, o in zip(questions, old)])
+        new_sim = np.mean([_similarity(features, positions, w.translation, o) for w, o in zip(questions, new) if o])
+        print(f"{size:>7}{old_us:>15.1f}{new_us:>14.1f}{build_ms:>17.1f}{old_sim:>20.2f}{new_sim:>9.2f}")
+
+    on_loop_ms, in_thread_ms = asyncio.run(_stalls(words))
+    print(f"пауза event loop при построении индекса на {len(words)} слов: "
+          f"get_index {on_loop_ms:.1f} мс, prepare {in_thread_ms:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Soak-тест реестра хостов комнат (api/sockets/host_registry).
+
+    python -m benchmarks.host_sessions_soak [--games 2000] [--students 2] [--abandon-every 10]
+
+Играет подряд тысячи игр через обработчики Socket.IO (fakeredis, SQLite):
+хост создаёт комнату, ученики отвечают на все шаги, игра завершается,
+а хост остаётся подключённым — раньше каждая такая игра оставляла запись
+в host_sessions. Каждая --abandon-every-я игра бросается посередине:
+хост пропадает без disconnect, и запись должна вытесняться по
+HOST_SESSIONS_MAX_SIZE (для теста — --max-size).
+
+По ходу печатает размер реестра, его оценку памяти и прирост памяти
+процесса (tracemalloc, без аллокаций fakeredis и SQLite) относительно
+конца прогрева — первой четверти игр. Завершается с кодом 1, если реестр
+вырос сверх --max-size или память после прогрева выросла больше чем
+на --max-growth-kb. Под tracemalloc 2000 игр идут несколько минут.
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import sys
+import tracemalloc
+
+from benchmarks._harness import SioRecorder, prepare_env, seed_world, use_fake_redis
+
+DB_PATH = "/tmp/host_sessions_soak.db"
+
+
+def _traced_kb() -> float:
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, "*fakeredis*"),
+        tracemalloc.Filter(False, "*sqlite3*"),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ))
+    return sum(stat.size for stat in snapshot.statistics("filename")) / 1024
+
+
+async def _play(events, recorder: SioRecorder, token: str, world_id: int, game: int,
+                students: int, abandon: bool) -> None:
+    host_sid = f"host-{game}"
+    await events.connect(host_sid, {}, {"token": token})
+    await events.host_join(host_sid, {"world_id": world_id})
+    join_code = recorder.last("host_ready")["join_code"]
+
+    student_sids = [f"student-{game}-{n}" for n in range(students)]
+    for sid in student_sids:
+        await events.student_join(sid, {"room_code": join_code, "username": sid})
+    await events.game_start(host_sid, {})
+    tasks = recorder.last("game_started")
+
+    answered = tasks[: len(tasks) // 2] if abandon else tasks
+    for sid in student_sids:
+        for step, task in enumerate(answered):
+            answer = task["options"][0]["id"] if task["type"] == "quiz" else task["words"]
+            await events.check_answer(sid, {"step": step, "answer": answer, "time_spent": 2.0})
+
+    # Хост не отключается: ни после завершения игры, ни брошенной
+    if abandon:
+        # TTL брошенной комнаты в Redis здесь не дождаться: её ключи удаляются сразу
+        from core import room_store
+        from core.redis_client import get_redis
+        await room_store.cleanup_room(await get_redis(), join_code)
+    recorder.emitted.clear()
+    for sid in [host_sid, *student_sids]:
+        recorder.sessions.pop(sid, None)
+    recorder.rooms.pop(join_code, None)
+    # host_join подписывает хоста и на канал состава комнаты
+    recorder.rooms.pop(events.lobby_room(join_code), None)
+
+
+async def _run(args) -> int:
+    from api.sockets import events
+    from core import results_log
+    from core.security import create_access_token
+    from db.models import Base
+    from db.session import SessionLocal, engine
+
+    r = use_fake_redis()
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    user, world = seed_world(db, words=6, sentences=2)
+    token, world_id = create_access_token({"sub": user.email}), world.id
+    db.close()
+    recorder = SioRecorder().install(events.sio)
+    # Предупреждения о вытеснении из реестра здесь ожидаемы
+    logging.getLogger(events.__name__).setLevel(logging.ERROR)
+
+    removed: dict[str, int] = {}
+    events.host_sessions.on_evict(lambda code, sid, reason: removed.__setitem__(reason, removed.get(reason, 0) + 1))
+
+    tracemalloc.start()
+    every = max(args.games // 20, 1)
+    warmup = args.games // 4
+    baseline_kb = None
+    peak_size = 0
+    print(f"{'игр':>7}{'в реестре':>11}{'реестр, КБ':>12}{'прирост, КБ':>13}")
+    for game in range(1, args.games + 1):
+        abandon = args.abandon_every and game % args.abandon_every == 0
+        await _play(events, recorder, token, world_id, game, args.students, abandon)
+        peak_size = max(peak_size, len(events.host_sessions))
+        if game % every == 0:
+            # Стрим результатов без писателя только растёт: его не считаем
+            await r.delete(results_log.STREAM)
+            gc.collect()
+            traced = _traced_kb()
+            if baseline_kb is None or game <= warmup:
+                baseline_kb = traced
+            print(f"{game:>7}{len(events.host_sessions):>11}{events.host_sessions.memory_bytes() / 1024:>12.1f}"
+                  f"{traced - baseline_kb:>13.1f}")
+    growth = _traced_kb() - baseline_kb
+    tracemalloc.stop()
+
+    print(f"удалено из реестра по причинам: {removed}; максимум записей: {peak_size}")
+    problems = []
+    if peak_size > args.max_size:
+        problems.append(f"в реестре было {peak_size} записей при лимите {args.max_size}")
+    if growth > args.max_growth_kb:
+        problems.append(f"память выросла на {growth:.0f} КБ после прогрева (порог {args.max_growth_kb} КБ)")
+    for problem in problems:
+        print("FAIL", problem)
+    return 1 if problems else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=2)
+    parser.add_argument("--abandon-every", type=int, default=10)
+    parser.add_argument("--max-size", type=int, default=50)
+    parser.add_argument("--max-growth-kb", type=int, default=256)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    prepare_env(f"sqlite:///{DB_PATH}")
+    os.environ["HOST_SESSIONS_MAX_SIZE"] = str(args.max_size)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Сравнение сериализации: прежний путь (stdlib json + валидация response_model)
+против orjson, а для Socket.IO — ещё и MessagePack.
+
+    python -m benchmarks.json_bench
+
+- GET /worlds/{id} для мира на 5 000 слов: WorldDetail + jsonable_encoder +
+  JSONResponse против ORJSONResponse из готового словаря;
+- основные Socket.IO события (game_started, leaderboard на 500 игроков,
+  game_finished, roster_update и входящий check_answer): стандартный
+  Packet на engineio.json (stdlib), FastJsonPacket из api/sockets/server.py
+  (orjson без поиска бинарных вложений) и MessagePack для клиентов
+  с ?serializer=msgpack;
+- пакет step пошаговой игры: задание, сериализуемое на каждого ученика,
+  против заранее сериализованного (fast_json.PreSerialized), и размер
+  game_started со всеми заданиями против одного шага.
+"""
+import timeit
+
+from benchmarks._harness import prepare_env
+
+
+def _world_payload(words: int) -> dict:
+    return {
+        "id": 1,
+        "title": "Мир на 5 000 слов",
+        "description": "Проверка сериализации",
+        "words": [
+            {"id": i, "word": f"сүз {i}", "translation": f"слово {i}", "world_id": 1}
+            for i in range(words)
+        ],
+        "image": None,
+        "sentences": [
+            {"id": i, "sentence": f"Бу {i} нче җөмлә монда", "world_id": 1}
+            for i in range(200)
+        ],
+        "is_public": True,
+        "is_owner": False,
+    }
+
+
+def _leaderboard(players: int) -> list[dict]:
+    return [
+        {"sid": f"sid-{i:04d}-abcdefgh", "username": f"Укучы {i}", "score": 900 - i}
+        for i in range(players)
+    ]
+
+
+def _tasks() -> list[dict]:
+    quizzes = [
+        {
+            "type": "quiz",
+            "step_id": i,
+            "step_number": i + 1,
+            "question": f"Переведите: сүз {i}",
+            "options": [{"id": i * 4 + k, "text": f"слово {k}"} for k in range(4)],
+        }
+        for i in range(6)
+    ]
+    sentences = [
+        {
+            "type": "word_order",
+            "step_id": 6 + i,
+            "step_number": 7 + i,
+            "words": ["монда", "җөмлә", "нче", f"{i}", "Бу"],
+        }
+        for i in range(3)
+    ]
+    return quizzes + sentences
+
+
+def _timed(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def bench_http(words: int) -> None:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    from api.models.worlds import WorldDetail
+
+    payload = _world_payload(words)
+
+    def old_path():
+        model = WorldDetail(**payload)
+        validated = WorldDetail.model_validate(model.model_dump())
+        return JSONResponse(jsonable_encoder(validated)).body
+
+    def new_path():
+        return ORJSONResponse(payload).body
+
+    old_us, new_us = _timed(old_path, 20), _timed(new_path, 20)
+    print(f"GET /worlds/{{id}}, {words} слов")
+    print(f"  response_model + json: {old_us:>10.0f} мкс, {len(old_path()):>8} байт")
+    print(f"  ORJSONResponse:        {new_us:>10.0f} мкс, {len(new_path()):>8} байт  (x{old_us / new_us:.1f})")
+
+
+def bench_socket(name: str, data, number: int) -> None:
+    from engineio import json as stdlib_json
+    from socketio import packet
+
+    from api.sockets.server import FastJsonPacket, _encode
+
+    class StdlibPacket(packet.Packet):
+        json = stdlib_json
+
+    variants = {
+        "Packet + stdlib json": (StdlibPacket, False),
+        "FastJsonPacket": (FastJsonPacket, False),
+        "MessagePack": (FastJsonPacket, True),
+    }
+    print(f"Socket.IO {name}")
+    baseline_us = None
+    for title, (cls, binary) in variants.items():
+        def encode():
+            return _encode(cls(packet.EVENT, data=[name, data]), binary)
+
+        encoded = encode()
+        encode_us = _timed(encode, number)
+        decode_us = _timed(lambda: cls(encoded_packet=encoded), number)
+        size = len(encoded if binary else encoded.encode())
+        baseline_us = baseline_us or encode_us
+        print(f"  {title:<21} encode {encode_us:>8.1f} мкс, decode {decode_us:>8.1f} мкс, "
+              f"{size:>7} байт  (encode x{baseline_us / encode_us:.1f})")
+
+
+def bench_step(number: int) -> None:
+    from socketio import packet
+
+    from api.sockets.paced_steps import serialize_steps
+    from api.sockets.server import FastJsonPacket
+    from core.fast_json import PreSerialized
+
+    tasks = _tasks()
+    task = {"step": 0, **tasks[0]}
+    prepared = PreSerialized(serialize_steps(tasks)[0])
+
+    def rebuilt():
+        return FastJsonPacket(packet.EVENT, data=["step", {"step": 0, **tasks[0]}]).encode()
+
+    def preserialized():
+        return FastJsonPacket(packet.EVENT, data=["step", prepared]).encode()
+
+    assert rebuilt() == preserialized() == FastJsonPacket(packet.EVENT, data=["step", task]).encode()
+    rebuilt_us, prepared_us = _timed(rebuilt, number), _timed(preserialized, number)
+    full = len(FastJsonPacket(packet.EVENT, data=["game_started", tasks]).encode().encode())
+    print(f"Socket.IO step (задание {len(preserialized().encode())} байт, game_started со всеми {full} байт)")
+    print(f"  задание на каждого      encode {rebuilt_us:>8.1f} мкс")
+    print(f"  PreSerialized           encode {prepared_us:>8.1f} мкс  (x{rebuilt_us / prepared_us:.1f})")
+
+
+def main() -> None:
+    prepare_env()
+    bench_http(5000)
+    bench_socket("game_started", _tasks(), 2000)
+    bench_socket("leaderboard", _leaderboard(500), 200)
+    bench_socket("game_finished", {"top3": _leaderboard(3), "total_players": 500}, 5000)
+    bench_socket("roster_update", {"joined": [{"sid": f"{i:032x}", "username": f"Укучы {i}"} for i in range(20)],
+                                   "left": [f"{i:032x}" for i in range(20, 23)]}, 5000)
+    bench_socket("check_answer", {"step": 7, "answer": ["Бу", "7", "нче", "җөмлә", "монда"],
+                                  "time_spent": 3.25}, 5000)
+    bench_step(20000)
+
+
+if __name__ == "__main__":
+    main()
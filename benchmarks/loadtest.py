@@ -0,0 +1,261 @@
+"""
+Нагрузочный прогон полной игры через Socket.IO.
+
+Поднимает приложение (uvicorn в этом же процессе) на локальной базе и Redis
+и прогоняет N комнат по M учеников: host_join → student_join → game_start →
+check_answer на каждый шаг с паузой «на подумать». В конце печатает
+пропускную способность, перцентили задержки по событиям и долю ошибок.
+
+    python -m benchmarks.loadtest --rooms 20 --students 30
+    python -m benchmarks.loadtest --database-url postgresql+psycopg2://... --redis-url redis://localhost:6379/1
+
+По умолчанию используются SQLite-файл и fakeredis, так что внешние сервисы
+не нужны. Задержка события — время до ACK от сервера, то есть до конца
+работы обработчика. С --reconnect-rate часть учеников посреди игры рвёт
+соединение и возвращается с resume_token (строка student_resume).
+С --pacing student задания приходят по одному событием step после ответа
+на предыдущий шаг, а не всем списком в game_started.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks._harness import prepare_env, use_fake_redis, seed_world
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def call(self, client, event: str, data=None, timeout: float = 30.0, label: str | None = None):
+        label = label or event
+        started = time.perf_counter()
+        try:
+            await client.call(event, data, timeout=timeout)
+        except Exception:
+            self.errors[label] += 1
+            raise
+        self.latencies[label].append(time.perf_counter() - started)
+
+    def count_failures(self, name: str, results: list) -> None:
+        # BaseException: отменённая задача (CancelledError) — тоже неудача
+        failed = sum(isinstance(result, BaseException) for result in results)
+        if failed:
+            self.errors[name] += failed
+
+    def report(self, elapsed: float) -> str:
+        total = sum(len(values) for values in self.latencies.values())
+        failed = sum(self.errors.values())
+        lines = [
+            f"время прогона: {elapsed:.1f} с, событий: {total}, "
+            f"пропускная способность: {total / elapsed:.1f} событий/с",
+            f"{'событие':<16}{'кол-во':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'ошибки':>8}",
+        ]
+        for event in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(event, []))
+            lines.append(
+                f"{event:<16}{len(values):>8}"
+                f"{_percentile(values, 50):>10.1f}{_percentile(values, 95):>10.1f}"
+                f"{_percentile(values, 99):>10.1f}{self.errors.get(event, 0):>8}"
+            )
+        lines.append(f"доля ошибок: {failed / max(total + failed, 1):.2%}")
+        return "\n".join(lines)
+
+
+def _percentile(values: list[float], p: int) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0] * 1000
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1] * 1000
+
+
+def _client_serializer(args, index: int) -> str:
+    if args.serializer == "mixed":
+        return "msgpack" if index % 2 else "json"
+    return args.serializer
+
+
+async def _connect(client, url: str, serializer: str, **kwargs):
+    if serializer == "msgpack":
+        url += "?serializer=msgpack"
+    await client.connect(url, socketio_path="/sio", transports=["websocket"], **kwargs)
+
+
+def _new_client(stats: Stats, role: str, serializer: str = "json"):
+    import socketio
+
+    client = socketio.AsyncClient(reconnection=False, serializer="msgpack" if serializer == "msgpack" else "default")
+    inbox: dict[str, asyncio.Future] = defaultdict(lambda: asyncio.get_running_loop().create_future())
+
+    def deliver(event):
+        async def handler(data=None):
+            future = inbox[event]
+            if not future.done():
+                future.set_result(data)
+        return handler
+
+    for event in ("host_ready", "student_joined", "student_resumed", "game_started", "game_finished"):
+        client.on(event, deliver(event))
+    # Шаги пошаговой игры приходят по одному: очередь вместо future
+    steps = inbox["step"] = asyncio.Queue()
+    client.on("step", steps.put)
+
+    async def on_error(data=None):
+        stats.errors[f"{role}:error"] += 1
+
+    client.on("error", on_error)
+    client.on("join_error", on_error)
+    return client, inbox
+
+
+def _pick_answer(task: dict, accuracy: float):
+    if task["type"] == "quiz":
+        return random.choice(task["options"])["id"]
+    words = list(task["words"])
+    if random.random() > accuracy:
+        random.shuffle(words)
+    return words
+
+
+async def run_student(url, stats, room_code, index, args, started: asyncio.Event):
+    serializer = _client_serializer(args, index)
+    client, inbox = _new_client(stats, "student", serializer)
+    await _connect(client, url, serializer)
+    try:
+        await stats.call(client, "student_join", {"room_code": room_code, "username": f"student{index}"})
+        resume_token = (await asyncio.wait_for(inbox["student_joined"], args.timeout))["resume_token"]
+        started.set()
+        game = await asyncio.wait_for(inbox["game_started"], args.timeout)
+        tasks = game if args.pacing == "all" else None
+        steps_count = len(tasks) if tasks is not None else game["steps_count"]
+        reconnect_at = steps_count // 2 if random.random() < args.reconnect_rate else None
+        for step in range(steps_count):
+            if step == reconnect_at:
+                # Обрыв связи посреди игры: новое соединение продолжает с тем же игроком
+                await client.disconnect()
+                client, inbox = _new_client(stats, "student", serializer)
+                await _connect(client, url, serializer)
+                await stats.call(client, "student_join", {"room_code": room_code, "resume_token": resume_token},
+                                 label="student_resume")
+                await asyncio.wait_for(inbox["student_resumed"], args.timeout)
+            task = tasks[step] if tasks is not None else await asyncio.wait_for(inbox["step"].get(), args.timeout)
+            think = random.uniform(args.think_min, args.think_max)
+            await asyncio.sleep(think)
+            await stats.call(client, "check_answer", {
+                "step": step,
+                "answer": _pick_answer(task, args.accuracy),
+                "time_spent": think,
+            })
+        await asyncio.wait_for(inbox["game_finished"], args.timeout)
+    finally:
+        await client.disconnect()
+
+
+async def run_room(url, stats, token, world_id, args):
+    serializer = _client_serializer(args, 0)
+    host, inbox = _new_client(stats, "host", serializer)
+    await _connect(host, url, serializer, auth={"token": token})
+    students: list[asyncio.Task] = []
+    try:
+        await stats.call(host, "host_join", {"world_id": world_id})
+        room_code = (await asyncio.wait_for(inbox["host_ready"], args.timeout))["join_code"]
+
+        joined = [asyncio.Event() for _ in range(args.students)]
+        students = [
+            asyncio.create_task(run_student(url, stats, room_code, i, args, joined[i]))
+            for i in range(args.students)
+        ]
+        await asyncio.wait_for(asyncio.gather(*(event.wait() for event in joined)), args.timeout)
+        await stats.call(host, "game_start", {"pacing": args.pacing})
+        await asyncio.gather(*students, return_exceptions=True)
+    finally:
+        # Комната не доиграла (ученики не вошли за --timeout, game_start упал):
+        # оставшиеся ученики отменяются и учитываются как неудачные, а не висят до конца прогона
+        for task in students:
+            task.cancel()
+        stats.count_failures("student:failed", await asyncio.gather(*students, return_exceptions=True))
+        await host.disconnect()
+
+
+async def run(args) -> int:
+    import uvicorn
+
+    import main
+    from core.security import create_access_token
+    from db.models import Base
+    from db.session import SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        user, world = seed_world(db, words=args.words, sentences=args.sentences, email="loadtest@example.com")
+        token = create_access_token({"sub": user.email})
+        world_id = world.id
+    finally:
+        db.close()
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"http://127.0.0.1:{args.port}"
+    stats = Stats()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_room(url, stats, token, world_id, args) for _ in range(args.rooms)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - started
+    stats.count_failures("room:failed", results)
+
+    server.should_exit = True
+    await serve_task
+
+    print(stats.report(elapsed))
+    return 1 if sum(stats.errors.values()) else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--students", type=int, default=20, help="учеников в комнате")
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--sentences", type=int, default=30)
+    parser.add_argument("--think-min", type=float, default=1.0, help="минимальная пауза перед ответом, с")
+    parser.add_argument("--think-max", type=float, default=4.0, help="максимальная пауза перед ответом, с")
+    parser.add_argument("--accuracy", type=float, default=0.7, help="доля правильно собранных предложений")
+    parser.add_argument("--reconnect-rate", type=float, default=0.0,
+                        help="доля учеников, которые посреди игры переподключаются с resume_token")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serializer", choices=("json", "msgpack", "mixed"), default="json",
+                        help="формат пакетов Socket.IO у клиентов; mixed — через одного")
+    parser.add_argument("--pacing", choices=("all", "student"), default="all",
+                        help="выдача заданий: все в game_started или по одному после ответа")
+    parser.add_argument("--database-url", help="по умолчанию DATABASE_URL или SQLite-файл bench.db")
+    parser.add_argument("--redis-url", help="по умолчанию fakeredis в этом процессе")
+    args = parser.parse_args()
+
+    prepare_env(args.database_url)
+    # Все клиенты прогона идут с 127.0.0.1: лимит на IP срезал бы их как один класс за NAT
+    os.environ.setdefault("SIO_RATE_PER_IP", "0")
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        use_fake_redis()
+
+    logging.disable(logging.WARNING)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Перебор паролей на POST /auth/login: сколько CPU сервера он стоит
+без ограничения входа и с ним (core/rate_limit).
+
+    python -m benchmarks.login_spray_bench [--attempts 100]
+
+Приложение вызывается в этом же процессе (httpx ASGITransport, SQLite,
+fakeredis), CPU — time.process_time() процесса, включая поток с bcrypt.
+Сценарии: перебор одного email с одного IP без ограничения и с ним,
+перебор многих email с одного IP, перебор одного email с доверенного IP
+(NAT школы) и вход настоящего пользователя с другого IP во время перебора.
+Завершается с кодом 1, если отклонённая попытка стоит больше
+--max-cpu-share от попытки с bcrypt или настоящий пользователь не вошёл.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks._harness import prepare_env, seed_world, use_fake_redis
+
+DB_PATH = "/tmp/login_spray_bench.db"
+ATTACKER_IP = "203.0.113.7"
+SCHOOL_IP = "198.51.100.20"
+TEACHER_IP = "192.0.2.44"
+
+
+async def _spray(client, emails: list[str], attempts: int) -> dict:
+    statuses: dict[int, int] = {}
+    started = time.process_time()
+    for i in range(attempts):
+        response = await client.post("/auth/login", json={"email": emails[i % len(emails)], "password": f"guess-{i}"})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    cpu = time.process_time() - started
+    return {"statuses": statuses, "cpu_ms": cpu * 1000, "per_attempt_ms": cpu * 1000 / attempts}
+
+
+async def _run(args) -> int:
+    import httpx
+
+    import main
+    from core.config import settings
+    from db.models import Base, User
+    from db.session import SessionLocal, engine
+
+    r = use_fake_redis()
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    user, _ = seed_world(db, words=0, sentences=0)
+    victims = [f"user{i}@example.com" for i in range(50)]
+    db.add_all([User(username=email, email=email, password_hash=user.password_hash) for email in victims])
+    db.commit()
+    email = user.email
+    db.close()
+    settings.login_trusted_ips = [SCHOOL_IP + "/32"]
+    limits = (settings.login_max_failures_per_email, settings.login_max_failures_per_ip)
+
+    def client_from(ip: str):
+        transport = httpx.ASGITransport(app=main.fastapi_app, client=(ip, 40000))
+        return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+    results = {}
+    settings.login_max_failures_per_email, settings.login_max_failures_per_ip = 0, 0
+    async with client_from(ATTACKER_IP) as client:
+        results["один email, без ограничения"] = await _spray(client, [email], args.attempts)
+    settings.login_max_failures_per_email, settings.login_max_failures_per_ip = limits
+    await r.flushdb()
+
+    async with client_from(ATTACKER_IP) as client:
+        results["один email, с ограничением"] = await _spray(client, [email], args.attempts)
+    await r.flushdb()
+    async with client_from(ATTACKER_IP) as client:
+        results["много email с одного IP"] = await _spray(client, victims, args.attempts)
+    async with client_from(TEACHER_IP) as client:
+        response = await client.post("/auth/login", json={"email": email, "password": "bench-password"})
+        teacher_status = response.status_code
+    await r.flushdb()
+    async with client_from(SCHOOL_IP) as client:
+        results["один email с доверенного IP"] = await _spray(client, [email], args.attempts)
+
+    print(f"{'сценарий':<32}{'попыток':>9}{'401':>6}{'429':>6}{'CPU, мс':>10}{'мс/попытка':>12}")
+    for name, result in results.items():
+        statuses = result["statuses"]
+        print(f"{name:<32}{args.attempts:>9}{statuses.get(401, 0):>6}{statuses.get(429, 0):>6}"
+              f"{result['cpu_ms']:>10.0f}{result['per_attempt_ms']:>12.3f}")
+    print(f"вход учителя с другого IP во время перебора: {teacher_status}")
+
+    # Стоимость отклонённой попытки — CPU сверх попыток с bcrypt, поделённый на число 429
+    bcrypt_ms = results["один email, без ограничения"]["per_attempt_ms"]
+    throttled = results["один email, с ограничением"]
+    rejected = throttled["statuses"].get(429, 0)
+    verified = args.attempts - rejected
+    rejected_ms = max(throttled["cpu_ms"] - verified * bcrypt_ms, 0) / max(rejected, 1)
+    print(f"попытка с bcrypt: {bcrypt_ms:.3f} мс CPU, отклонённая (429): ~{rejected_ms:.3f} мс CPU")
+
+    problems = []
+    if not rejected:
+        problems.append("перебор не был ограничен")
+    elif rejected_ms > bcrypt_ms * args.max_cpu_share:
+        problems.append(f"отклонённая попытка стоит {rejected_ms / bcrypt_ms:.1%} от попытки с bcrypt")
+    if teacher_status != 200:
+        problems.append(f"учитель с другого IP получил {teacher_status}")
+    for problem in problems:
+        print("FAIL", problem)
+    return 1 if problems else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, default=100)
+    parser.add_argument("--max-cpu-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    prepare_env(f"sqlite:///{DB_PATH}")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
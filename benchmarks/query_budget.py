@@ -0,0 +1,229 @@
+"""
+Бюджет SQL-запросов для HTTP-маршрутов и socket-событий.
+
+Запуск из корня репозитория на отдельной базе с применёнными миграциями:
+
+    DATABASE_URL=postgresql+psycopg2://... REDIS_URL=redis://localhost:6379/1 \
+        python -m benchmarks.query_budget
+    python -m benchmarks.query_budget --fake-redis      # Redis не нужен
+    python -m benchmarks.query_budget --update          # перезаписать baseline
+
+Для каждого сценария считается количество SQL-выражений. На PostgreSQL каждый
+SELECT дополнительно прогоняется через EXPLAIN с выключенным enable_seqscan:
+если в плане остался Seq Scan, значит подходящего индекса нет. Скрипт
+завершается с кодом 1, если сценарий выполнил больше выражений, чем записано
+в baseline, или появился Seq Scan по таблице, которой там не было.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from benchmarks._harness import prepare_env, use_fake_redis, seed_world, SioRecorder
+
+BASELINE_PATH = Path(__file__).with_name("query_budget.json")
+
+
+class StatementRecorder:
+    """Собирает SQL-выражения, выполненные через engine."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.engine = engine
+        self.statements: list[tuple[str, object]] = []
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("query_budget_explain"):
+            return
+        self.statements.append((statement, parameters))
+
+    def reset(self) -> None:
+        self.statements = []
+
+    def seq_scans(self) -> list[str]:
+        """Таблицы, которые PostgreSQL читает Seq Scan'ом даже без enable_seqscan."""
+        if self.engine.dialect.name != "postgresql":
+            return []
+        tables = set()
+        with self.engine.connect() as conn:
+            conn.info["query_budget_explain"] = True
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            for statement, parameters in self.statements:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                plan = conn.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {statement}", parameters
+                ).scalar()
+                tables.update(_collect_seq_scans(plan[0]["Plan"]))
+            conn.rollback()
+        return sorted(tables)
+
+
+def _collect_seq_scans(node: dict) -> set[str]:
+    found = set()
+    if node.get("Node Type") == "Seq Scan":
+        found.add(node.get("Relation Name"))
+    for child in node.get("Plans", []):
+        found |= _collect_seq_scans(child)
+    return found
+
+
+async def run_scenarios(recorder: StatementRecorder) -> dict[str, dict]:
+    import httpx
+
+    import main
+    from api.sockets import events, host_grace
+    from core.config import settings
+    from core.security import create_access_token
+    from db.session import SessionLocal
+
+    random.seed(26)
+    results: dict[str, dict] = {}
+
+    def record(name: str) -> None:
+        results[name] = {
+            "statements": len(recorder.statements),
+            "seq_scans": recorder.seq_scans(),
+        }
+        recorder.reset()
+
+    db = SessionLocal()
+    try:
+        user, world = seed_world(db)
+        world_id, email = world.id, user.email
+    finally:
+        db.close()
+
+    token = create_access_token({"sub": email})
+    auth = {"Authorization": f"Bearer {token}"}
+    # Запросы идут в том же event loop, что и socket-события: общий клиент Redis
+    # (и fakeredis) привязан к одному loop, а TestClient поднимает свой в потоке
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.fastapi_app), base_url="http://test")
+
+    # --- HTTP ---
+    recorder.reset()
+    (await client.get("/worlds/")).raise_for_status()
+    record("GET /worlds/")
+
+    (await client.get("/worlds/userWorlds", headers=auth)).raise_for_status()
+    record("GET /worlds/userWorlds")
+
+    (await client.get(f"/worlds/{world_id}", headers=auth)).raise_for_status()
+    record("GET /worlds/{world_id}")
+
+    # Повторное чтение — из снимка мира, в базу идёт только проверка токена
+    (await client.get(f"/worlds/{world_id}", headers=auth)).raise_for_status()
+    record("GET /worlds/{world_id} (кэш)")
+
+    (await client.post("/adventures/", json={"world_id": world_id}, headers=auth)).raise_for_status()
+    record("POST /adventures/")
+
+    # --- Socket.IO ---
+    sio = SioRecorder().install(events.sio)
+    host_sid, student_sid = "host-sid", "student-sid"
+
+    await events.connect(host_sid, {}, {"token": token})
+    record("sio connect (host)")
+
+    await events.host_join(host_sid, {"world_id": world_id})
+    join_code = sio.last("host_ready")["join_code"]
+    record("sio host_join")
+
+    await events.student_join(student_sid, {"room_code": join_code, "username": "student"})
+    resume_token = sio.last("student_joined")["resume_token"]
+    record("sio student_join")
+
+    await events.game_start(host_sid, {})
+    tasks = sio.last("game_started")
+    record("sio game_start")
+
+    first = tasks[0]
+    if first["type"] == "quiz":
+        answer = first["options"][0]["id"]
+    else:
+        answer = first["words"]
+    await events.check_answer(student_sid, {"step": 0, "answer": answer, "time_spent": 3.0})
+    record("sio check_answer")
+
+    # Повторный ответ на тот же шаг отклоняется по битовому массиву в Redis, без базы
+    await events.check_answer(student_sid, {"step": 0, "answer": answer, "time_spent": 3.0})
+    record("sio check_answer (повтор)")
+
+    await events.disconnect(student_sid)
+    record("sio disconnect (student)")
+
+    # Переподключение по resume_token — только Redis, без запросов к базе
+    await events.student_join("student-sid-2", {"room_code": join_code, "resume_token": resume_token})
+    record("sio student_join (resume)")
+
+    await events.disconnect(host_sid)
+    record("sio disconnect (host)")
+
+    # Хост не вернулся за HOST_GRACE_SECONDS: комнату закрывает фоновая задача
+    await host_grace.reaper.collect(now=time.time() + settings.host_grace_seconds + 1)
+    record("host grace expiry")
+
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]) -> list[str]:
+    problems = []
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            problems.append(f"{name}: нет в baseline (запустите с --update)")
+            continue
+        if current["statements"] > expected["statements"]:
+            problems.append(
+                f"{name}: {current['statements']} SQL-выражений, в baseline {expected['statements']}"
+            )
+        new_scans = set(current["seq_scans"]) - set(expected["seq_scans"])
+        if new_scans:
+            problems.append(f"{name}: новый Seq Scan по {', '.join(sorted(new_scans))}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="по умолчанию DATABASE_URL из окружения")
+    parser.add_argument("--fake-redis", action="store_true", help="использовать fakeredis вместо REDIS_URL")
+    parser.add_argument("--update", action="store_true", help="записать текущие значения в baseline")
+    args = parser.parse_args()
+
+    prepare_env(args.database_url)
+    if args.fake_redis:
+        use_fake_redis()
+
+    from db.models import Base
+    from db.session import engine
+
+    Base.metadata.create_all(engine)
+    recorder = StatementRecorder(engine)
+    results = asyncio.run(run_scenarios(recorder))
+
+    for name, current in results.items():
+        scans = ", ".join(current["seq_scans"]) or "-"
+        print(f"{name:<28} {current['statements']:>4} SQL   seq scan: {scans}")
+
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"baseline записан в {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("baseline не найден, запустите с --update", file=sys.stderr)
+        return 1
+
+    problems = compare(results, json.loads(BASELINE_PATH.read_text(encoding="utf-8")))
+    for problem in problems:
+        print(f"FAIL {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
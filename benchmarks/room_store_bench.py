@@ -0,0 +1,182 @@
+"""
+Микробенчмарк core/room_store.
+
+Для каждой операции и размера комнаты (по умолчанию 10…10 000 игроков)
+замеряет число обращений к Redis (round trips) и время вызова. Round trips
+сравниваются с baseline из room_store_baseline.json: если операция стала
+ходить в Redis чаще, скрипт завершается с кодом 1.
+
+    python -m benchmarks.room_store_bench                       # fakeredis в процессе
+    python -m benchmarks.room_store_bench --redis-url redis://localhost:6379/15
+    python -m benchmarks.room_store_bench --update              # перезаписать baseline
+
+Время сравнивается только с флагом --check-time и только на том же бэкенде,
+на котором записан baseline: на fakeredis оно показывает затраты Python,
+а не сети.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from benchmarks._harness import prepare_env
+
+BASELINE_PATH = Path(__file__).with_name("room_store_baseline.json")
+ROOM_SIZES = (10, 100, 1000, 10000)
+REPEATS = 5
+
+
+class RoundTripCounter:
+    """Считает обращения к Redis: команда или целый pipeline — один round trip."""
+
+    def __init__(self, client):
+        self.count = 0
+        original_execute = client.execute_command
+        original_pipeline = client.pipeline
+
+        async def execute_command(*args, **options):
+            self.count += 1
+            return await original_execute(*args, **options)
+
+        def pipeline(*args, **kwargs):
+            pipe = original_pipeline(*args, **kwargs)
+            original_pipe_execute = pipe.execute
+
+            async def execute(*a, **kw):
+                self.count += 1
+                return await original_pipe_execute(*a, **kw)
+
+            pipe.execute = execute
+            return pipe
+
+        client.execute_command = execute_command
+        client.pipeline = pipeline
+
+
+async def _fill_room(r, code: str, size: int) -> list[str]:
+    from core import room_store
+
+    await room_store.ensure_room(r, code, 9)
+    sids = [f"sid-{i}" for i in range(size)]
+    for sid in sids:
+        await room_store.upsert_player(r, code, sid, sid, f"player {sid}")
+        await room_store.add_score(r, code, sid, random.randint(0, 900))
+    return sids
+
+
+async def bench_size(r, counter: RoundTripCounter, size: int) -> dict[str, dict]:
+    from core import room_store
+
+    code = f"B{size}"
+    await room_store.cleanup_room(r, code)
+    sids = await _fill_room(r, code, size)
+
+    async def measure(name, make_call):
+        timings, trips = [], []
+        for i in range(REPEATS):
+            call = make_call(i)
+            counter.count = 0
+            started = time.perf_counter()
+            await call
+            timings.append(time.perf_counter() - started)
+            trips.append(counter.count)
+        results[name] = {"round_trips": max(trips), "ms": round(min(timings) * 1000, 3)}
+
+    results: dict[str, dict] = {}
+    await measure("upsert_player", lambda i: room_store.upsert_player(r, code, f"new-{i}", f"new-{i}", "newcomer"))
+    await measure("add_score", lambda i: room_store.add_score(r, code, random.choice(sids), 50))
+    await measure("score_answer", lambda i: room_store.score_answer(r, code, sids[i % len(sids)], i % 9, 50))
+    await measure("is_answered", lambda i: room_store.is_answered(r, code, sids[i % len(sids)], i % 9))
+    await measure("get_leaderboard", lambda i: room_store.get_leaderboard(r, code))
+    await measure("get_top3", lambda i: room_store.get_top3(r, code))
+    await measure("finish_player", lambda i: room_store.finish_player(r, code, sids[i % len(sids)]))
+
+    # cleanup_room и finalize_room разрушают комнату, поэтому перед каждым повтором она собирается заново
+    for name, operation in (("cleanup_room", room_store.cleanup_room), ("finalize_room", room_store.finalize_room)):
+        timings, trips = [], []
+        for _ in range(min(REPEATS, 2)):
+            await _fill_room(r, code, size)
+            counter.count = 0
+            started = time.perf_counter()
+            await operation(r, code)
+            timings.append(time.perf_counter() - started)
+            trips.append(counter.count)
+        results[name] = {"round_trips": max(trips), "ms": round(min(timings) * 1000, 3)}
+    return results
+
+
+async def run(args) -> dict:
+    if args.redis_url:
+        from redis import asyncio as redis
+        r = redis.from_url(args.redis_url, decode_responses=True)
+        backend = "redis"
+    else:
+        import fakeredis
+        r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        backend = "fakeredis"
+
+    random.seed(30)
+    counter = RoundTripCounter(r)
+    report = {"backend": backend, "sizes": {}}
+    for size in args.sizes:
+        report["sizes"][str(size)] = await bench_size(r, counter, size)
+    await r.aclose()
+    return report
+
+
+def compare(report: dict, baseline: dict, check_time: bool, tolerance: float) -> list[str]:
+    problems = []
+    same_backend = report["backend"] == baseline.get("backend")
+    for size, operations in report["sizes"].items():
+        for name, current in operations.items():
+            expected = baseline.get("sizes", {}).get(size, {}).get(name)
+            if expected is None:
+                continue
+            if current["round_trips"] > expected["round_trips"]:
+                problems.append(
+                    f"{name} @ {size}: {current['round_trips']} round trips, в baseline {expected['round_trips']}"
+                )
+            if check_time and same_backend and current["ms"] > expected["ms"] * tolerance:
+                problems.append(f"{name} @ {size}: {current['ms']} мс, в baseline {expected['ms']} мс")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", help="по умолчанию fakeredis в этом процессе")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(ROOM_SIZES))
+    parser.add_argument("--update", action="store_true", help="записать результат в baseline")
+    parser.add_argument("--check-time", action="store_true", help="сравнивать и время")
+    parser.add_argument("--time-tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    prepare_env()
+    report = asyncio.run(run(args))
+
+    print(f"бэкенд: {report['backend']}")
+    print(f"{'операция':<30}{'игроков':>9}{'round trips':>13}{'мс':>11}")
+    for size, operations in report["sizes"].items():
+        for name, current in operations.items():
+            print(f"{name:<30}{size:>9}{current['round_trips']:>13}{current['ms']:>11.3f}")
+
+    if args.update:
+        BASELINE_PATH.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"baseline записан в {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("baseline не найден, запустите с --update", file=sys.stderr)
+        return 1
+
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    problems = compare(report, baseline, args.check_time, args.time_tolerance)
+    for problem in problems:
+        print(f"FAIL {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""
+Сообщения о составе комнаты на лобби из 50/200/1000 учеников.
+
+    python -m benchmarks.roster_bench [--sizes 50,200,1000] [--spread 3] [--lobby-share 0.1] [--leave-share 0.2]
+
+Ученики входят в комнату через обработчики Socket.IO (fakeredis, SQLite),
+равномерно в течение --spread секунд, доля --lobby-share подписывается
+на lobby_subscribe, доля --leave-share затем уходит. Печатает, сколько
+сообщений о составе получили клиенты: «было» — прежняя рассылка
+new_student_joined и student_left всей комнате (по числу её участников
+в момент события), «стало» — roster_update хосту и подписчикам пачками
+раз в ROSTER_FLUSH_MS.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks._harness import SioRecorder, prepare_env, seed_world, use_fake_redis
+
+DB_PATH = "/tmp/roster_bench.db"
+
+
+def _old_deliveries(students: int, leaving: int) -> int:
+    # Вход: new_student_joined всем в комнате — хосту и уже вошедшим, включая самого ученика
+    joins = sum(1 + n for n in range(1, students + 1))
+    # Выход: student_left хосту и оставшимся
+    leaves = sum(1 + students - n for n in range(1, leaving + 1))
+    return joins + leaves
+
+
+async def _lobby(events, token: str, world_id: int, students: int, args) -> dict:
+    from api.sockets.roster import roster
+    from core import room_store
+    from core.config import settings
+    from core.redis_client import get_redis
+
+    recorder = SioRecorder().install(events.sio)
+    host_sid = f"host-{students}"
+    await events.connect(host_sid, {}, {"token": token})
+    await events.host_join(host_sid, {"world_id": world_id})
+    join_code = recorder.last("host_ready")["join_code"]
+
+    sids = [f"student-{students}-{n}" for n in range(students)]
+    subscribers = set(sids[:: max(int(1 / args.lobby_share), 1)]) if args.lobby_share > 0 else set()
+    pause = args.spread / students
+    started = time.perf_counter()
+    for n, sid in enumerate(sids):
+        await events.connect(sid, {}, None)
+        await events.student_join(sid, {"room_code": join_code, "username": f"Укучы {n}"})
+        if sid in subscribers:
+            await events.lobby_subscribe(sid, {})
+        await asyncio.sleep(max(started + pause * (n + 1) - time.perf_counter(), 0))
+    leaving = int(students * args.leave_share)
+    for sid in sids[-leaving:] if leaving else []:
+        await events.disconnect(sid)
+    # Выход засчитывается после STUDENT_RESUME_GRACE_SECONDS (здесь 0), пачка уходит через ROSTER_FLUSH_MS
+    await asyncio.sleep(settings.roster_flush_ms / 1000 + 0.1)
+    await roster.flush(join_code)
+
+    # Состав, собранный хостом из пачек, должен совпасть с составом комнаты в Redis
+    updates = [data for event, _, data in recorder.emitted if event == "roster_update"]
+    seen: dict[str, str] = {}
+    for data in updates:
+        seen.update((entry["sid"], entry["username"]) for entry in data["joined"])
+        for player_id in data["left"]:
+            seen.pop(player_id, None)
+    actual = {entry["sid"]: entry["username"] for entry in await room_store.get_roster(await get_redis(), join_code)}
+    return {
+        "deliveries": recorder.deliveries_by_event["roster_update"] + recorder.deliveries_by_event["roster"],
+        "updates": len(updates),
+        "consistent": seen == actual and len(actual) == students - leaving,
+        "old": _old_deliveries(students, leaving),
+        "subscribers": len(subscribers),
+    }
+
+
+async def _run(args) -> int:
+    from api.sockets import events
+    from core.config import settings
+    from core.security import create_access_token
+    from db.models import Base
+    from db.session import SessionLocal, engine
+
+    use_fake_redis()
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    user, world = seed_world(db, words=10, sentences=2)
+    token, world_id = create_access_token({"sub": user.email}), world.id
+    db.close()
+
+    print(f"вход за {args.spread} с, ROSTER_FLUSH_MS={settings.roster_flush_ms}, "
+          f"подписчиков лобби {args.lobby_share:.0%}, уходит {args.leave_share:.0%}")
+    print(f"{'учеников':>9}{'было':>10}{'стало':>8}{'пачек':>7}{'подписчиков':>13}{'во сколько раз':>16}")
+    problems = []
+    for students in args.sizes:
+        result = await _lobby(events, token, world_id, students, args)
+        print(f"{students:>9}{result['old']:>10}{result['deliveries']:>8}{result['updates']:>7}"
+              f"{result['subscribers']:>13}{result['old'] / max(result['deliveries'], 1):>16.1f}")
+        if not result["consistent"]:
+            problems.append(f"{students}: состав из roster_update не совпал с комнатой")
+    for problem in problems:
+        print("FAIL", problem)
+    return 1 if problems else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[50, 200, 1000])
+    parser.add_argument("--spread", type=float, default=3.0)
+    parser.add_argument("--lobby-share", type=float, default=0.1)
+    parser.add_argument("--leave-share", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    prepare_env(f"sqlite:///{DB_PATH}")
+    os.environ["STUDENT_RESUME_GRACE_SECONDS"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Сборщик брошенных сессий (api/sockets/session_gc) на засеянной базе.
+
+    python -m benchmarks.session_gc_bench [--abandoned 5000] [--live 200] [--orphans 20000]
+
+Создаёт брошенные сессии (старые, без комнаты в Redis) с шагами викторины,
+живые (старые, но с room:{code}:meta), свежие (моложе min_age) и ключи
+игроков истёкших комнат, затем гоняет проходы сборщика, пока он что-то
+удаляет. Печатает время проходов и сколько чего удалено; завершается
+с кодом 1, если пропала живая или свежая сессия или осталась брошенная.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._harness import prepare_env, seed_world, use_fake_redis
+
+DB_PATH = "/tmp/session_gc_bench.db"
+
+
+def _codes(count: int, offset: int) -> list[str]:
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    result = []
+    for n in range(offset, offset + count):
+        code = ""
+        for _ in range(4):
+            n, digit = divmod(n, len(alphabet))
+            code += alphabet[digit]
+        result.append(code)
+    return result
+
+
+def _seed_sessions(db, world, codes: list[str], created_at: datetime, steps: int) -> None:
+    from db.models import AdventureSession, AdventureStep, QuizOption, QuizStep
+
+    db.execute(AdventureSession.__table__.insert(), [
+        {"join_code": code, "world_id": world.id, "host_id": world.author_id, "created_at": created_at}
+        for code in codes
+    ])
+    step_rows = [{"session_id": code, "step_number": n} for code in codes for n in range(steps)]
+    db.execute(AdventureStep.__table__.insert(), step_rows)
+    step_ids = [row.id for row in db.query(AdventureStep.id).filter(AdventureStep.session_id.in_(codes))]
+    db.execute(QuizStep.__table__.insert(), [{"id": step_id, "question": "?"} for step_id in step_ids])
+    db.execute(QuizOption.__table__.insert(), [
+        {"quiz_step_id": step_id, "text": str(k), "is_correct": k == 0} for step_id in step_ids for k in range(4)
+    ])
+    db.commit()
+
+
+async def _run(args) -> int:
+    from core import room_store
+    from core.config import settings
+    from db.models import AdventureSession, Base
+    from db.session import SessionLocal, engine
+    from api.sockets import session_gc
+
+    r = use_fake_redis()
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    _, world = seed_world(db, words=10, sentences=0)
+
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(seconds=settings.session_gc_min_age_seconds * 2)
+    abandoned = _codes(args.abandoned, 0)
+    live = _codes(args.live, args.abandoned)
+    young = _codes(args.live, args.abandoned + args.live)
+    started = time.perf_counter()
+    _seed_sessions(db, world, abandoned, old, args.steps)
+    _seed_sessions(db, world, live, old, args.steps)
+    _seed_sessions(db, world, young, now, args.steps)
+    for code in live:
+        await room_store.ensure_room(r, code, args.steps, world.id)
+    async with r.pipeline(transaction=False) as pipe:
+        for n in range(args.orphans):
+            pipe.hset(f"room:X{n % 997:03d}:player:sid{n}", mapping={"username": "u", "finished": "0"})
+        await pipe.execute()
+    print(f"засеяно за {time.perf_counter() - started:.1f} с: брошенных {len(abandoned)}, живых {len(live)}, "
+          f"свежих {len(young)}, ключей игроков без комнаты {args.orphans}")
+
+    total: dict[str, int] = {}
+    passes = 0
+    while True:
+        await r.delete(session_gc.LOCK_KEY)  # каждый проход — как следующий интервал
+        started = time.perf_counter()
+        reclaimed = await session_gc.collector.collect()
+        elapsed = (time.perf_counter() - started) * 1000
+        passes += 1
+        for kind, count in reclaimed.items():
+            total[kind] = total.get(kind, 0) + count
+        print(f"проход {passes}: {elapsed:8.1f} мс  {reclaimed}")
+        if not any(reclaimed.values()):
+            break
+
+    left = {code for (code,) in db.query(AdventureSession.join_code)}
+    db.close()
+    print(f"итого: {total}")
+    problems = []
+    if left & set(abandoned):
+        problems.append(f"осталось брошенных: {len(left & set(abandoned))}")
+    if set(live + young) - left:
+        problems.append(f"удалено живых или свежих: {len(set(live + young) - left)}")
+    orphans_left = len([key async for key in r.scan_iter(match="room:X*:player:*")])
+    if orphans_left:
+        problems.append(f"осталось ключей игроков: {orphans_left}")
+    for problem in problems:
+        print("FAIL", problem)
+    return 1 if problems else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--abandoned", type=int, default=5000)
+    parser.add_argument("--live", type=int, default=200)
+    parser.add_argument("--orphans", type=int, default=20000)
+    parser.add_argument("--steps", type=int, default=10)
+    args = parser.parse_args()
+
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    prepare_env(f"sqlite:///{DB_PATH}")
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
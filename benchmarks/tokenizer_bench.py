@@ -0,0 +1,56 @@
+"""
+Токены предложений: разбиение на каждом ответе (прежний check_answer)
+против сравнения с заранее сохранёнными токенами и стоимость разбиения
+при импорте мира.
+
+    python -m benchmarks.tokenizer_bench [--sentences 10000]
+"""
+import argparse
+import random
+import timeit
+
+from benchmarks._harness import prepare_env
+
+WORDS = ["мин", "син", "ул", "алма", "ашыйм", "мәктәпкә", "барам", "китап", "укыйм", "җөмлә", "бүген",
+         "кичә", "Казанда", "яшим", "өйдә", "эшлим", "Собака", "бежит", "домой", "быстро"]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(4, 12))
+    return " ".join(words).capitalize() + rng.choice([".", "!", "?", "..."])
+
+
+def _timed(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=10000)
+    args = parser.parse_args()
+
+    prepare_env()
+    from core.tokenizer import tokenize
+
+    rng = random.Random(5)
+    sentences = [_sentence(rng) for _ in range(args.sentences)]
+    sentence = sentences[0]
+    answer = tokenize(sentence)
+    expected = tuple(answer)
+
+    def old_check():
+        return answer == (sentence or "").lower().split()
+
+    def new_check():
+        return tuple(answer) == expected
+
+    print(f"{'сценарий':<46}{'мкс':>10}")
+    print(f"{'проверка ответа: lower().split() на каждый':<46}{_timed(old_check, 100000):>10.2f}")
+    print(f"{'проверка ответа: сохранённые токены':<46}{_timed(new_check, 100000):>10.2f}")
+    print(f"{'tokenize одного предложения':<46}{_timed(lambda: tokenize(sentence), 100000):>10.2f}")
+    total_ms = _timed(lambda: [tokenize(s) for s in sentences], 3) / 1000
+    print(f"импорт {len(sentences)} предложений: {total_ms:.1f} мс на разбиение")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Статистика ответов по словам и предложениям мира.
+
+Для каждого (world_id, item_type, item_id) в world_item_stats хранятся
+суммы: число попыток, верных ответов и затраченное время. Писатель
+результатов (core/results_log) прибавляет к ним каждую записанную пачку
+ответов, поэтому чтение для учителя — одна выборка по ключу мира без
+прохода по answer_log. Точность, среднее время и сложность считаются
+из сумм при чтении. PUT /worlds/{id} сохраняет id слов и предложений,
+оставшихся в мире, поэтому их статистика переживает правку мира.
+
+Пачки сводятся по колонкам NumPy: ключ упаковывается в одно int64,
+np.unique группирует ключи, np.bincount суммирует значения по группам —
+без цикла по строкам и ORM-объектам. rebuild_world_stats пересчитывает
+таблицу из answer_log целиком тем же способом, кусками по chunk_size строк.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from db.models import AnswerLog, Sentence, Word, WorldItemStats
+from db.session import dialect_insert
+
+ITEM_TYPES = ("word", "sentence")
+_TYPE_CODES = {name: code for code, name in enumerate(ITEM_TYPES)}
+
+# Колонки answer_log, из которых складывается статистика, в порядке _columns
+ANSWER_COLUMNS = (
+    AnswerLog.world_id, AnswerLog.item_type, AnswerLog.item_id, AnswerLog.is_correct, AnswerLog.time_spent,
+)
+
+# Суммируемые величины в порядке колонок массива значений
+_SUMS = ("attempts", "correct", "time_sum", "time_count")
+
+
+# Ключ (world_id, item_type, item_id) упаковывается в одно int64:
+# np.unique по одномерному массиву на порядок быстрее, чем по строкам (n, 3)
+_ITEM_BITS = 32
+_TYPE_BITS = 2
+
+
+def _pack(world_ids: np.ndarray, type_codes: np.ndarray, item_ids: np.ndarray) -> np.ndarray:
+    return (world_ids << (_ITEM_BITS + _TYPE_BITS)) | (type_codes << _ITEM_BITS) | item_ids
+
+
+def _unpack(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (keys >> (_ITEM_BITS + _TYPE_BITS),
+            (keys >> _ITEM_BITS) & ((1 << _TYPE_BITS) - 1),
+            keys & ((1 << _ITEM_BITS) - 1))
+
+
+def _columns(rows) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Переводит строки (world_id, item_type, item_id, is_correct, time_spent)
+    в упакованные ключи int64 и значения (n, 4) float64; строки без мира
+    или без слова/предложения (старые шаги) отбрасываются.
+    """
+    if not rows:
+        return np.empty(0, np.int64), np.empty((0, len(_SUMS)))
+    # Колонка за колонкой: zip(*rows) на сотнях тысяч строк в разы медленнее
+    world_ids, item_types, item_ids, is_correct, time_spent = ([row[i] for row in rows] for i in range(5))
+    # None превращается в nan, так что пропуски отсекаются маской, а не циклом
+    worlds = np.array(world_ids, np.float64)
+    items = np.array(item_ids, np.float64)
+    types = np.array(item_types, object)
+    type_codes = np.full(len(types), -1, np.int64)
+    for name, code in _TYPE_CODES.items():
+        type_codes[types == name] = code
+    spent = np.array(time_spent, np.float64)
+    timed = ~np.isnan(spent)
+
+    valid = ~np.isnan(worlds) & ~np.isnan(items) & (type_codes >= 0)
+    keys = _pack(worlds[valid].astype(np.int64), type_codes[valid], items[valid].astype(np.int64))
+    values = np.column_stack((
+        np.ones(len(keys)),
+        np.array(is_correct, np.float64)[valid],
+        np.where(timed, spent, 0.0)[valid],
+        timed[valid].astype(np.float64),
+    ))
+    return keys, values
+
+
+def _reduce(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Сводит значения с одинаковыми ключами: уникальные ключи и суммы по ним."""
+    if len(keys) == 0:
+        return keys, values
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.column_stack([
+        np.bincount(inverse, weights=values[:, i], minlength=len(unique)) for i in range(values.shape[1])
+    ])
+    return unique, sums
+
+
+def aggregate(rows) -> tuple[np.ndarray, np.ndarray]:
+    """Суммы по (world_id, item_type, item_id) для строк ANSWER_COLUMNS."""
+    return _reduce(*_columns(rows))
+
+
+def _stats_rows(keys: np.ndarray, sums: np.ndarray) -> list[dict]:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # np.unique уже отсортировал ключи: параллельные писатели берут блокировки
+    # строк в одном порядке и не ловят взаимоблокировку
+    return [
+        {
+            "world_id": int(world_id),
+            "item_type": ITEM_TYPES[type_code],
+            "item_id": int(item_id),
+            "attempts": int(attempts),
+            "correct": int(correct),
+            "time_sum": float(time_sum),
+            "time_count": int(time_count),
+            "updated_at": now,
+        }
+        for world_id, type_code, item_id, (attempts, correct, time_sum, time_count)
+        in zip(*(part.tolist() for part in _unpack(keys)), sums.tolist())
+    ]
+
+
+def apply_answers(db: Session, rows) -> int:
+    """
+    Прибавляет пачку ответов к world_item_stats (без commit — в транзакции
+    вызывающего). Возвращает число затронутых строк статистики.
+    """
+    stats = _stats_rows(*aggregate(rows))
+    if not stats:
+        return 0
+    stmt = dialect_insert(WorldItemStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["world_id", "item_type", "item_id"],
+        set_={
+            **{name: getattr(WorldItemStats, name) + getattr(stmt.excluded, name) for name in _SUMS},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt, stats)
+    return len(stats)
+
+
+def rebuild_world_stats(db: Session, world_id: int | None = None, chunk_size: int = 50000) -> int:
+    """
+    Пересчитывает world_item_stats из answer_log — для одного мира или для всех.
+    Нужен после заполнения item_type/item_id задним числом или при расхождении.
+    Возвращает число строк статистики.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # Писатель результатов ждёт конца пересчёта, иначе его пачка
+        # попала бы между чтением answer_log и заменой строк
+        db.execute(text("LOCK TABLE world_item_stats IN SHARE ROW EXCLUSIVE MODE"))
+
+    query = select(*ANSWER_COLUMNS).where(
+        AnswerLog.world_id.is_not(None), AnswerLog.item_type.is_not(None), AnswerLog.item_id.is_not(None),
+    )
+    cleanup = delete(WorldItemStats)
+    if world_id is not None:
+        query = query.where(AnswerLog.world_id == world_id)
+        cleanup = cleanup.where(WorldItemStats.world_id == world_id)
+
+    # Каждый кусок сводится сразу, в памяти остаются только частичные суммы
+    partial_keys, partial_sums = [], []
+    for chunk in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+        keys, sums = aggregate(chunk)
+        partial_keys.append(keys)
+        partial_sums.append(sums)
+    keys, sums = _reduce(
+        np.concatenate(partial_keys) if partial_keys else np.empty(0, np.int64),
+        np.concatenate(partial_sums) if partial_sums else np.empty((0, len(_SUMS))),
+    )
+
+    stats = _stats_rows(keys, sums)
+    db.execute(cleanup)
+    if stats:
+        db.execute(dialect_insert(WorldItemStats), stats)
+    db.commit()
+    return len(stats)
+
+
+def difficulty(attempts: int, correct: int) -> float:
+    """
+    Доля ошибок со сглаживанием Лапласа: у слова с одной-двумя попытками
+    сложность около 0.5, а не 0 или 1, поэтому оно не занимает верх списка.
+    """
+    return 1 - (correct + 1) / (attempts + 2)
+
+
+def get_world_stats(db: Session, world_id: int) -> list[dict]:
+    """Статистика слов и предложений мира, от самых сложных к простым."""
+    stats = db.execute(select(WorldItemStats).where(WorldItemStats.world_id == world_id)).scalars().all()
+    words = {
+        row.id: (row.word, row.translation)
+        for row in db.execute(select(Word.id, Word.word, Word.translation).where(Word.world_id == world_id))
+    }
+    sentences = {
+        row.id: row.sentence
+        for row in db.execute(select(Sentence.id, Sentence.sentence).where(Sentence.world_id == world_id))
+    }
+
+    items = []
+    for item in stats:
+        if item.item_type == "word":
+            if item.item_id not in words:
+                continue  # слово удалили из мира
+            text_value, translation = words[item.item_id]
+        else:
+            if item.item_id not in sentences:
+                continue
+            text_value, translation = sentences[item.item_id], None
+        items.append({
+            "item_type": item.item_type,
+            "item_id": item.item_id,
+            "text": text_value,
+            "translation": translation,
+            "attempts": item.attempts,
+            "correct": item.correct,
+            "accuracy": round(item.correct / item.attempts, 4) if item.attempts else None,
+            "avg_time": round(item.time_sum / item.time_count, 2) if item.time_count else None,
+            "difficulty": round(difficulty(item.attempts, item.correct), 4),
+        })
+    items.sort(key=lambda entry: (-entry["difficulty"], -entry["attempts"]))
+    return items
@@ -13,9 +13,114 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 1000
 
+    # Пул соединений PostgreSQL
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    # За PgBouncer (transaction pooling) соединения держит он, приложение пул не ведёт
+    db_pgbouncer_mode: bool = False
+
     redis_url: str = "redis://redis:6379/0"
     redis_room_ttl_seconds: int = 21600
+    redis_max_connections: int = 100
+    redis_pool_timeout: float = 5.0
+    redis_socket_timeout: float | None = None
+    redis_health_check_interval: int = 30
+
+    # Токен для /metrics; если не задан, эндпоинт открыт (закрывается на уровне сети)
+    metrics_token: str | None = None
+
+    # Порог, после которого запрос пишется в лог как медленный
+    slow_request_ms: float = 500.0
+    slow_request_queries: int = 25
+
+    # Монитор event loop: период замера задержки и порог блокировки
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval_ms: float = 100.0
+    loop_block_threshold_ms: float = 250.0
+
+    # Токен для маршрутов /admin и флагов профилирования; если не задан, они недоступны
+    admin_token: str | None = None
+
+    # Профилирование запросов и socket-событий
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.0
+    profiling_interval_ms: float = 5.0
+    profiling_dir: str = "profiles"
+    profiling_max_files: int = 200
+
+    # Логирование: формат (json или text), уровни по логгерам, прореживание частых событий
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_levels: dict[str, str] = {"engineio.server": "WARNING", "socketio.server": "WARNING"}
+    log_sample_rates: dict[str, float] = {"check_answer": 0.01}
+    log_queue_size: int = 10000
+
+    # Запись ответов и итогов игр: Redis Stream -> фоновый писатель -> answer_log/game_results
+    results_writer_enabled: bool = True
+    results_stream_max_len: int = 200000
+    results_batch_size: int = 500
+    results_block_ms: int = 1000
+    results_claim_idle_ms: int = 60000
+    results_retry_max_seconds: float = 60.0
+    results_dead_letter_max_len: int = 10000
+
+    # Клиент может запросить MessagePack вместо JSON: ?serializer=msgpack при подключении
+    sio_msgpack_enabled: bool = True
+
+    # Индекс неправильных вариантов: сколько похожих переводов держать на слово
+    # и для скольких версий миров хранить индексы в памяти процесса
+    distractor_candidates: int = 8
+    distractor_cache_size: int = 64
+
+    # Снимки содержимого миров: TTL ключей в Redis и сколько снимков держать в памяти процесса
+    world_snapshot_ttl_seconds: int = 3600
+    world_snapshot_cache_size: int = 256
+
+    # Сборщик брошенных сессий: сессии старше min_age без живой комнаты в Redis
+    # удаляются пачками по batch_size, не больше max_batches пачек за проход
+    session_gc_enabled: bool = True
+    session_gc_interval_seconds: int = 300
+    session_gc_min_age_seconds: int = 7200
+    session_gc_batch_size: int = 200
+    session_gc_max_batches: int = 10
+    session_gc_scan_count: int = 1000
+
+    # Реестр хостов комнат в памяти процесса: записи живут REDIS_ROOM_TTL_SECONDS
+    # с последнего обращения, сверх лимита вытесняются давно не тронутые
+    host_sessions_max_size: int = 10000
+
+    # Сколько ждать переподключения ученика с resume_token, прежде чем убрать его из комнаты
+    student_resume_grace_seconds: int = 30
+
+    # Сколько ждать возвращения отключившегося хоста (host_rejoin), прежде чем закрыть комнату;
+    # 0 — закрывать сразу. Сроки хранятся в Redis и проверяются раз в HOST_GRACE_POLL_SECONDS
+    host_grace_seconds: int = 60
+    host_grace_poll_seconds: float = 1.0
     
+    # Входы и выходы учеников копятся и уходят хосту одним roster_update раз в ROSTER_FLUSH_MS; 0 — сразу
+    roster_flush_ms: int = 500
+
+    # Пошаговая игра (game_start с "pacing"): режим по умолчанию и сколько заданий держать в памяти процесса
+    game_pacing_default: str = "all"
+    paced_step_cache_size: int = 4096
+
+    # Ограничение частоты check_answer (token bucket в Redis): токенов в секунду и ёмкость
+    # на соединение и на IP; за одним IP бывает целый класс за NAT школы. 0 — без ограничения
+    sio_rate_per_sid: float = 5.0
+    sio_burst_per_sid: int = 10
+    sio_rate_per_ip: float = 100.0
+    sio_burst_per_ip: int = 200
+
+    # Защита входа от перебора: неудачи по email и по IP в скользящем окне; сверх лимита — 429.
+    # LOGIN_TRUSTED_IPS — JSON-список адресов и сетей (NAT школ), которые не ограничиваются по IP
+    login_window_seconds: int = 900
+    login_max_failures_per_email: int = 10
+    login_max_failures_per_ip: int = 50
+    login_trusted_ips: list[str] = []
+
     # S3 настройки
     s3_endpoint: str
     s3_bucket: str
@@ -0,0 +1,137 @@
+"""
+Неправильные варианты ответа для викторины.
+
+Вместо случайных переводов из всего мира (легко отбросить: «кот» среди
+«Великая Отечественная война», «синий», «бежать») для каждого слова
+заранее выбираются distractor_candidates переводов, похожих на верный:
+близких по написанию (общие пары букв) и по длине. Выбор вариантов для
+вопроса — случайная выборка из этой строки, O(1) от размера мира.
+
+Индекс строится по колонкам NumPy: переводы превращаются в векторы
+хэшированных биграмм и длины, сходство считается умножением матриц
+блоками по _BLOCK слов, лучшие кандидаты — np.argpartition. Индекс
+хранится в LRU процесса по версии снимка мира (core/world_snapshot):
+изменение мира увеличивает версию, и следующий вопрос строит новый индекс.
+Построение на 10 000 слов занимает сотни миллисекунд, поэтому код в event
+loop получает индекс через prepare (в пуле потоков), а не get_index.
+"""
+import asyncio
+import random
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from core.config import settings
+from core.metrics import Counter
+from core.world_snapshot import WorldSnapshot
+
+DISTRACTOR_INDEX_BUILDS = Counter("distractor_index_builds_total", "Построенные индексы неправильных вариантов")
+DISTRACTOR_CACHE_HITS = Counter("distractor_cache_hits_total", "Индексы неправильных вариантов, взятые из кэша")
+
+_DIMS = 256
+_BLOCK = 1024
+# Доля сходства по длине в итоговой оценке (остальное — общие биграммы)
+_LENGTH_WEIGHT = 0.3
+# Центры «корзин» длины по логарифму: 2, 4, 8, ... 64 символа
+_LENGTH_CENTERS = np.log2(np.array([2, 3, 4, 6, 8, 12, 16, 24, 32, 64], np.float32))
+
+
+def _features(texts: list[str]) -> np.ndarray:
+    """
+    Векторы (n, _DIMS + корзины длины) float32, у которых скалярное
+    произведение — взвешенная сумма косинусов по биграммам и по длине.
+    Так оценка пары — одно умножение матриц без поэлементных поправок.
+    """
+    rows, cols = [], []
+    for row, value in enumerate(texts):
+        padded = f" {value.lower()} "
+        for i in range(len(padded) - 1):
+            rows.append(row)
+            cols.append(zlib.crc32(padded[i:i + 2].encode()) % _DIMS)
+    bigrams = np.zeros((len(texts), _DIMS), np.float32)
+    np.add.at(bigrams, (np.array(rows, np.int64), np.array(cols, np.int64)), 1.0)
+
+    log_lengths = np.log2(np.array([max(len(t), 1) for t in texts], np.float32))
+    lengths = np.exp(-np.square(log_lengths[:, None] - _LENGTH_CENTERS[None, :]) / 0.5)
+
+    def normalized(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-6)
+
+    return np.hstack((
+        normalized(bigrams) * np.sqrt(1 - _LENGTH_WEIGHT),
+        normalized(lengths) * np.sqrt(_LENGTH_WEIGHT),
+    )).astype(np.float32)
+
+
+class DistractorIndex:
+    """Для каждого слова мира — похожие на его перевод другие переводы."""
+
+    def __init__(self, word_ids: list[int], translations: list[str], candidates: int):
+        # Одинаковые переводы у разных слов сводятся в один: иначе среди
+        # вариантов оказались бы два верных
+        keys = [t.strip().lower() for t in translations]
+        texts: dict[str, str] = {}
+        for key, translation in zip(keys, translations):
+            texts.setdefault(key, translation)
+        unique = {key: pos for pos, key in enumerate(texts)}
+        self.translations = list(texts.values())
+        self.positions = {word_id: unique[key] for word_id, key in zip(word_ids, keys)}
+        self.neighbors = self._build(self.translations, candidates)
+
+    @staticmethod
+    def _build(translations: list[str], candidates: int) -> np.ndarray:
+        n = len(translations)
+        k = min(candidates, n - 1)
+        if k <= 0:
+            return np.empty((n, 0), np.int32)
+        features = _features(translations)
+        neighbors = np.empty((n, k), np.int32)
+        for start in range(0, n, _BLOCK):
+            stop = min(start + _BLOCK, n)
+            scores = features[start:stop] @ features.T
+            scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # само слово
+            neighbors[start:stop] = np.argpartition(scores, n - k, axis=1)[:, n - k:]
+        return neighbors
+
+    def pick(self, word_id: int, count: int = 3, rng: random.Random | None = None) -> list[str]:
+        """count переводов, похожих на перевод word_id, но не совпадающих с ним."""
+        pos = self.positions.get(word_id)
+        if pos is None:
+            return []
+        row = self.neighbors[pos].tolist()
+        chosen = (rng or random).sample(row, k=min(count, len(row)))
+        return [self.translations[p] for p in chosen]
+
+
+_cache: OrderedDict[tuple[int, int], DistractorIndex] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_index(snapshot: WorldSnapshot) -> DistractorIndex:
+    """Индекс для версии мира из снимка: из кэша процесса или построенный заново."""
+    world_id = snapshot.world_id
+    key = (world_id, snapshot.version)
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            DISTRACTOR_CACHE_HITS.inc()
+            return index
+
+    index = DistractorIndex(list(snapshot.word_ids), snapshot.translations(), settings.distractor_candidates)
+    DISTRACTOR_INDEX_BUILDS.inc()
+
+    with _cache_lock:
+        # Индексы прежних версий этого мира больше не понадобятся
+        for stale in [cached for cached in _cache if cached[0] == world_id and cached != key]:
+            del _cache[stale]
+        _cache[key] = index
+        while len(_cache) > settings.distractor_cache_size:
+            _cache.popitem(last=False)
+    return index
+
+
+async def prepare(snapshot: WorldSnapshot) -> DistractorIndex:
+    """get_index для кода в event loop: индекс строится в пуле потоков, а не в самом цикле."""
+    return await asyncio.to_thread(get_index, snapshot)
@@ -1,5 +1,5 @@
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import logging
@@ -17,7 +17,7 @@ def error_response(status_code: int, message: str, *, code: str | None = None, d
     }
     if details:
         payload["error"]["details"] = details
-    return JSONResponse(status_code=status_code, content=payload)
+    return ORJSONResponse(status_code=status_code, content=payload)
 
 
 def register_exception_handlers(app):
@@ -25,7 +25,11 @@ def register_exception_handlers(app):
 
     @app.exception_handler(StarletteHTTPException)
     async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-        return error_response(exc.status_code, str(exc.detail), code=str(exc.status_code))
+        response = error_response(exc.status_code, str(exc.detail), code=str(exc.status_code))
+        # Retry-After у 429, WWW-Authenticate у 401
+        if exc.headers:
+            response.headers.update(exc.headers)
+        return response
 
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -34,5 +38,5 @@ def register_exception_handlers(app):
 
     @app.exception_handler(Exception)
     async def unhandled_exception_handler(request: Request, exc: Exception):
-        logger.error(f"Unhandled error: {exc}", exc_info=True)
+        logger.error("Unhandled error: %s", exc, exc_info=True)
         return error_response(500, "Внутренняя ошибка сервера", code="INTERNAL_ERROR") 
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+JSON-модуль на orjson для python-socketio/engineio.
+
+Сервер ожидает модуль с функциями dumps/loads, возвращающими str, и
+передаёт в dumps аргументы стандартного json (separators и т.п.) —
+orjson и так пишет компактно, поэтому они игнорируются. Кириллица
+остаётся в UTF-8, а не экранируется как \\uXXXX, что заметно сокращает
+размер пакетов с татарскими и русскими словами.
+"""
+import orjson
+
+JSONDecodeError = orjson.JSONDecodeError
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+class PreSerialized:
+    """
+    Значение, уже сериализованное в JSON: dumps вставляет его в результат
+    как есть (orjson.Fragment), не обходя заново. value() — разобранный
+    объект для MessagePack-клиентов, разбирается один раз.
+    """
+    __slots__ = ("json", "fragment", "_value")
+
+    def __init__(self, json: str):
+        self.json = json
+        self.fragment = orjson.Fragment(json)
+        self._value = None
+
+    def value(self):
+        if self._value is None:
+            self._value = orjson.loads(self.json)
+        return self._value
+
+
+def _default(obj):
+    if isinstance(obj, PreSerialized):
+        return obj.fragment
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj, **kwargs) -> str:
+    return orjson.dumps(obj, option=_OPTIONS, default=_default).decode()
+
+
+def loads(s, **kwargs):
+    # orjson не разбирает целые длиннее 64 бит, так что отдельная защита
+    # от огромных чисел, как в engineio.json, не нужна
+    return orjson.loads(s)
@@ -0,0 +1,139 @@
+"""
+Логирование без блокировок event loop.
+
+Обработчики на корневом логгере заменяются одним QueueHandler: в потоке
+loop запись только кладётся в ограниченную очередь, а форматирование
+(JSON или текст) и запись в stdout выполняет поток QueueListener.
+Сообщения форматируются лениво — там же, в потоке listener, поэтому
+в коде нужно писать logger.info("... %s", value), а не f-строки.
+
+Уровни задаются LOG_LEVEL и LOG_LEVELS (JSON: {"engineio.server": "WARNING"}).
+Частые события (check_answer) пишутся с extra={"event": ...} и
+прореживаются по LOG_SAMPLE_RATES; WARNING и выше не прореживаются.
+"""
+import atexit
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+from core.config import settings
+from core.metrics import Counter
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Записи лога, отброшенные из-за переполненной очереди"
+)
+
+# Аргументы этих типов не меняются, пока запись ждёт в очереди,
+# поэтому их можно форматировать позже в потоке listener
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None), bytes)
+
+# Стандартные атрибуты LogRecord; всё остальное пришло через extra
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON; поля из extra попадают в объект как есть."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей с extra={"event": ...} ниже WARNING."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в потоке loop и не ждёт
+    места в очереди: при переполнении запись отбрасывается и считается.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(a, _IMMUTABLE_ARGS) for a in args)):
+            # Изменяемые аргументы (dict, модели) форматируем сейчас, пока они не поменялись
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def setup_logging() -> None:
+    """Настраивает корневой логгер; повторный вызов ничего не делает."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+
+    handler = NonBlockingQueueHandler(queue.Queue(settings.log_queue_size))
+    handler.addFilter(SamplingFilter(settings.log_sample_rates))
+
+    # Файл/строка, поток и процесс в вывод не попадают, а их сбор — самая
+    # дорогая часть создания записи (см. «Optimization» в документации logging)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+    for name, level in settings.log_levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
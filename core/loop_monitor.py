@@ -0,0 +1,126 @@
+"""
+Монитор задержки event loop и детектор блокирующих вызовов.
+
+Задача в loop раз в LOOP_MONITOR_INTERVAL_MS засыпает и меряет, насколько
+позже запланированного она проснулась (lag). Заодно она обновляет
+heartbeat. Отдельный поток-сторож следит за heartbeat: если loop не
+отвечает дольше LOOP_BLOCK_THRESHOLD_MS, сторож снимает стек потока loop
+и пишет его в лог вместе с маршрутом или socket-событием, которое сейчас
+выполняется (по коду обработчика в стеке).
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from core.config import settings
+from core.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_seconds", "Задержка планирования event loop")
+LOOP_BLOCKED = Counter("event_loop_blocked_total", "Блокировки event loop дольше порога", ["source"])
+
+STACK_LIMIT = 30
+
+_recent_lags: deque[float] = deque(maxlen=1024)
+# Код обработчика -> что он обслуживает ("GET /worlds/{world_id}", "sio:check_answer")
+_handler_labels: dict = {}
+
+
+def _lag_percentiles() -> dict:
+    if not _recent_lags:
+        return {}
+    ordered = sorted(_recent_lags)
+    last = len(ordered) - 1
+    return {
+        (label,): ordered[round(last * q)]
+        for label, q in (("0.5", 0.5), ("0.95", 0.95), ("0.99", 0.99), ("1", 1.0))
+    }
+
+
+Gauge("event_loop_lag_recent_seconds", "Перцентили задержки event loop за последние замеры",
+      ["quantile"], fn=_lag_percentiles)
+
+
+def register_handler(func, label: str) -> None:
+    """Запоминает обработчик, чтобы приписывать ему блокировки."""
+    code = getattr(func, "__code__", None)
+    if code is not None:
+        _handler_labels[code] = label
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop_thread: int | None = None
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            LOOP_LAG_SECONDS.observe(lag)
+            _recent_lags.append(lag)
+            self.heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported_for = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self.heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.threshold or reported_for == heartbeat:
+                continue
+            # Одна запись на одну блокировку: следующая — после нового heartbeat
+            reported_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            source = _attribute(frame)
+            LOOP_BLOCKED.labels(source).inc()
+            logger.warning(
+                "Event loop заблокирован более %.0f мс (%s):\n%s",
+                blocked_for * 1000, source, "".join(traceback.format_stack(frame, limit=STACK_LIMIT)),
+            )
+
+
+def _attribute(frame) -> str:
+    source = "unknown"
+    while frame is not None:
+        label = _handler_labels.get(frame.f_code)
+        if label is not None:
+            source = label  # ближайший к корню обработчик перезапишет вложенные
+        frame = frame.f_back
+    return source
+
+
+monitor = LoopMonitor(
+    settings.loop_monitor_interval_ms / 1000,
+    settings.loop_block_threshold_ms / 1000,
+)
@@ -0,0 +1,212 @@
+"""
+Выборочное профилирование отдельных HTTP-запросов и Socket.IO событий.
+
+Фоновый поток раз в PROFILING_INTERVAL_MS снимает стек потока event loop.
+Сэмпл засчитывается профилю, если в стеке есть корневой кадр его запроса
+или обработчика, поэтому параллельные запросы не смешиваются. Результат
+пишется в PROFILING_DIR в формате collapsed stacks (одна строка
+«кадр;кадр;кадр N»), который понимают flamegraph.pl и speedscope.
+
+Если PROFILING_ENABLED выключен, middleware не подключается, а обработчики
+событий не оборачиваются — накладных расходов нет.
+"""
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+enabled = settings.profiling_enabled
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class Profile:
+    __slots__ = ("kind", "label", "root", "samples", "started")
+
+    def __init__(self, kind: str, label: str, root):
+        self.kind = kind
+        self.label = label
+        self.root = root
+        self.samples: Counter[str] = Counter()
+        self.started = time.time()
+
+
+class _Sampler:
+    """Один поток на процесс; спит, пока нет активных профилей."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active: set[Profile] = set()
+        self.target_thread: int | None = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self.target_thread = threading.get_ident()
+            self.active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def discard(self, profile: Profile) -> None:
+        with self._lock:
+            self.active.discard(profile)
+
+    def _run(self) -> None:
+        while True:
+            if not self.active:
+                self._wakeup.clear()
+                self._wakeup.wait()
+            time.sleep(self.interval)
+            # Под блокировкой: после discard() профиль гарантированно не меняется
+            with self._lock:
+                if not self.active:
+                    continue
+                frame = sys._current_frames().get(self.target_thread)
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                for profile in self.active:
+                    try:
+                        depth = stack.index(profile.root)
+                    except ValueError:
+                        continue
+                    profile.samples[_collapse(stack[depth::-1])] += 1
+                del stack
+
+
+def _collapse(frames) -> str:
+    return ";".join(
+        f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})"
+        for frame in frames
+    )
+
+
+_sampler = _Sampler(settings.profiling_interval_ms / 1000)
+# Сколько ещё раз профилировать событие, поставленное через админку: {event: count}
+_armed_events: dict[str, int] = {}
+
+
+def _profiles_dir() -> Path:
+    path = Path(settings.profiling_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def start(kind: str, label: str) -> Profile:
+    """Начинает профиль; корнем считается кадр вызывающей функции."""
+    profile = Profile(kind, label, sys._getframe(1))
+    _sampler.add(profile)
+    return profile
+
+
+def stop(profile: Profile) -> None:
+    _sampler.discard(profile)
+    if not profile.samples:
+        return
+    name = f"{int(profile.started * 1000)}_{profile.kind}_{_SAFE_NAME.sub('_', profile.label)}.folded"
+    try:
+        directory = _profiles_dir()
+        lines = [f"{stack} {count}" for stack, count in profile.samples.most_common()]
+        (directory / name).write_text("\n".join(lines) + "\n", encoding="utf-8")
+        _prune(directory)
+    except OSError as e:
+        logger.error("Не удалось сохранить профиль %s: %s", name, e)
+
+
+def _prune(directory: Path) -> None:
+    files = sorted(directory.glob("*.folded"))
+    for stale in files[:-settings.profiling_max_files]:
+        stale.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    directory = _profiles_dir()
+    return [
+        {"name": path.name, "size": path.stat().st_size}
+        for path in sorted(directory.glob("*.folded"), reverse=True)
+    ]
+
+
+def profile_path(name: str) -> Path | None:
+    if _SAFE_NAME.sub("_", name) != name or not name.endswith(".folded"):
+        return None
+    path = _profiles_dir() / name
+    return path if path.is_file() else None
+
+
+def arm_event(event: str, count: int) -> None:
+    _armed_events[event] = count
+
+
+def armed_events() -> dict[str, int]:
+    return dict(_armed_events)
+
+
+def _sampled() -> bool:
+    return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+
+def should_profile_event(event: str) -> bool:
+    remaining = _armed_events.get(event)
+    if remaining:
+        if remaining == 1:
+            del _armed_events[event]
+        else:
+            _armed_events[event] = remaining - 1
+        return True
+    return _sampled()
+
+
+def _is_admin_flag(value: str | None) -> bool:
+    return bool(value and settings.admin_token and secrets.compare_digest(value, settings.admin_token))
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: профилирует запрос, если в заголовке X-Profile передан
+    ADMIN_TOKEN, или с ?profile=1 и заголовком X-Admin-Token, либо по
+    PROFILING_SAMPLE_RATE. Токен в строке запроса не принимается: URL
+    попадает в access-логи uvicorn и прокси.
+    Подключается самым внутренним, чтобы эндпоинт выполнялся в той же задаче.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        profile = start("http", f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stop(profile)
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        admin = False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return _is_admin_flag(value.decode("latin-1"))
+            if name == b"x-admin-token":
+                admin = _is_admin_flag(value.decode("latin-1"))
+        query = scope.get("query_string", b"").decode("latin-1")
+        if admin and any(pair.partition("=")[0] == "profile" for pair in query.split("&")):
+            return True
+        return _sampled()
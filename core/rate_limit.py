@@ -0,0 +1,186 @@
+"""
+Ограничение частоты в Redis: token bucket для socket-событий и скользящее
+окно неудачных входов для POST /auth/login.
+
+Каждое ведро — хэш {tokens, ts} с TTL до полного восполнения. Все вёдра
+события (на sid и на IP) проверяются и списываются одним вызовом Lua:
+событие проходит, только если токен есть в каждом, а отклонённое
+событие ничего не списывает. Время берётся из Redis (TIME), поэтому
+вёдра согласованы между процессами независимо от их часов.
+
+Вход: каждая неудачная попытка — элемент ZSET с временем в score, отдельно
+по email и по IP клиента. Пока за LOGIN_WINDOW_SECONDS набралось не меньше
+лимита неудач, вход отклоняется с 429 и Retry-After до того, как сервер
+пойдёт в базу и потратит CPU на bcrypt. IP из LOGIN_TRUSTED_IPS (NAT школ)
+по IP не ограничиваются, лимит по email действует и для них.
+"""
+import hashlib
+import ipaddress
+import logging
+import secrets
+from functools import lru_cache
+from typing import List, Tuple
+
+from redis import asyncio as redis
+from redis.exceptions import RedisError
+
+from core.config import settings
+from core.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = Counter("sio_rate_limited_total", "Socket-события, отклонённые ограничением частоты", ["event", "bucket"])
+LOGIN_THROTTLED = Counter("login_throttled_total", "Попытки входа, отклонённые до проверки пароля", ["key"])
+LOGIN_FAILURES = Counter("login_failures_total", "Неудачные попытки входа")
+
+# Ведро: (ключ, токенов в секунду, ёмкость)
+Bucket = Tuple[str, float, int]
+
+_TAKE_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local states = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        return i
+    end
+    states[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    redis.call("HSET", key, "tokens", states[i] - 1, "ts", now)
+    redis.call("EXPIRE", key, math.ceil(burst / rate) + 1)
+end
+return 0
+"""
+
+
+def bucket_key(kind: str, ident: str) -> str:
+    return f"ratelimit:{kind}:{ident}"
+
+
+async def take(r: redis.Redis, buckets: List[Bucket]) -> int:
+    """
+    Списывает по токену из каждого ведра. Возвращает 0, если событие
+    разрешено, иначе номер (с 1) первого пустого ведра.
+    """
+    if not buckets:
+        return 0
+    keys = [key for key, _, _ in buckets]
+    args = []
+    for _, rate, burst in buckets:
+        args.extend((rate, burst))
+    return int(await r.eval(_TAKE_SCRIPT, len(keys), *keys, *args))
+
+
+_LOGIN_CHECK_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local window = tonumber(ARGV[1])
+local wait, which = 0, 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i + 1])
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now - window)
+    local count = redis.call("ZCARD", key)
+    if count >= limit then
+        -- Вход откроется, когда из окна выйдет столько неудач, чтобы их осталось limit - 1
+        local entry = redis.call("ZRANGE", key, count - limit, count - limit, "WITHSCORES")
+        local key_wait = tonumber(entry[2]) + window - now
+        if key_wait > wait then
+            wait, which = key_wait, i
+        end
+    end
+end
+return {tostring(wait), which}
+"""
+
+_LOGIN_FAILURE_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+for i, key in ipairs(KEYS) do
+    redis.call("ZADD", key, now, ARGV[1])
+    -- Сверх лимита элементы не нужны: хранится не больше limit последних неудач
+    redis.call("ZREMRANGEBYRANK", key, 0, -tonumber(ARGV[i + 2]) - 1)
+    redis.call("EXPIRE", key, ARGV[2])
+end
+return 0
+"""
+
+
+@lru_cache(maxsize=8)
+def _trusted_networks(entries: tuple[str, ...]) -> tuple:
+    return tuple(ipaddress.ip_network(entry, strict=False) for entry in entries)
+
+
+def is_trusted_ip(ip: str | None) -> bool:
+    if not ip or not settings.login_trusted_ips:
+        return False
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_networks(tuple(settings.login_trusted_ips)))
+
+
+def login_keys(email: str, ip: str | None) -> List[Tuple[str, str, int]]:
+    """Окна неудач для попытки входа: (вид, ключ, лимит); вид с лимитом 0 не проверяется."""
+    keys = []
+    if settings.login_max_failures_per_email > 0:
+        # Ключ — хэш email: адреса пользователей не попадают в имена ключей Redis
+        digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+        keys.append(("email", f"login:fail:email:{digest}", settings.login_max_failures_per_email))
+    if ip and settings.login_max_failures_per_ip > 0 and not is_trusted_ip(ip):
+        keys.append(("ip", f"login:fail:ip:{ip}", settings.login_max_failures_per_ip))
+    return keys
+
+
+async def login_retry_after(r: redis.Redis, keys: List[Tuple[str, str, int]]) -> int:
+    """
+    Через сколько секунд можно снова пытаться войти; 0 — можно сейчас.
+    Если Redis недоступен, вход не блокируется.
+    """
+    if not keys:
+        return 0
+    try:
+        wait, which = await r.eval(
+            _LOGIN_CHECK_SCRIPT, len(keys), *[key for _, key, _ in keys],
+            settings.login_window_seconds, *[limit for _, _, limit in keys],
+        )
+    except RedisError as e:
+        logger.warning("Ограничение входа пропущено, Redis недоступен: %s", e)
+        return 0
+    if not int(which):
+        return 0
+    LOGIN_THROTTLED.labels(keys[int(which) - 1][0]).inc()
+    return max(1, int(float(wait) + 0.999))
+
+
+async def record_login_failure(r: redis.Redis, keys: List[Tuple[str, str, int]]) -> None:
+    LOGIN_FAILURES.inc()
+    if not keys:
+        return
+    try:
+        await r.eval(
+            _LOGIN_FAILURE_SCRIPT, len(keys), *[key for _, key, _ in keys],
+            secrets.token_hex(8), settings.login_window_seconds, *[limit for _, _, limit in keys],
+        )
+    except RedisError as e:
+        logger.warning("Неудачный вход не учтён, Redis недоступен: %s", e)
+
+
+async def reset_login_failures(r: redis.Redis, keys: List[Tuple[str, str, int]]) -> None:
+    """После успешного входа неудачи по email забываются; по IP — нет, иначе перебор чередовали бы с входом."""
+    email_keys = [key for kind, key, _ in keys if kind == "email"]
+    if not email_keys:
+        return
+    try:
+        await r.delete(*email_keys)
+    except RedisError as e:
+        logger.warning("Неудачи входа не сброшены, Redis недоступен: %s", e)
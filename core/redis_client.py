@@ -1,11 +1,65 @@
+import time
+
 from redis import asyncio as redis
+from core import request_stats
 from core.config import settings
+from core.metrics import Gauge, Histogram
+
+REDIS_POOL_WAITING = Gauge("redis_pool_waiting", "Команды, ожидающие соединение из пула Redis")
+REDIS_POOL_WAIT_SECONDS = Histogram("redis_pool_wait_seconds", "Время ожидания соединения из пула Redis")
+REDIS_POOL_WAITING.set(0)
+REDIS_COMMAND_SECONDS = Histogram("redis_command_duration_seconds", "Время выполнения команд Redis", ["command"])
+
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """Пул с ограничением размера, который считает ожидающих и время ожидания."""
 
-redis_client = redis.from_url(
+    async def get_connection(self, command_name, *keys, **options):
+        REDIS_POOL_WAITING.inc()
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        finally:
+            REDIS_POOL_WAITING.dec()
+            REDIS_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+redis_pool = InstrumentedBlockingConnectionPool.from_url(
     settings.redis_url,
     decode_responses=True,
+    max_connections=settings.redis_max_connections,
+    timeout=settings.redis_pool_timeout,
+    socket_timeout=settings.redis_socket_timeout,
+    health_check_interval=settings.redis_health_check_interval,
 )
 
+class InstrumentedRedis(redis.Redis):
+    """Клиент Redis, который замеряет каждую команду."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            elapsed = time.perf_counter() - started
+            REDIS_COMMAND_SECONDS.labels(args[0]).observe(elapsed)
+            request_stats.record_redis(elapsed)
+
+
+redis_client = InstrumentedRedis(connection_pool=redis_pool)
+
+
+def _pool_stats() -> dict:
+    in_use = len(redis_pool._in_use_connections)
+    return {
+        ("max",): redis_pool.max_connections,
+        ("checked_out",): in_use,
+        ("idle",): len(redis_pool._available_connections),
+    }
+
+
+Gauge("redis_pool_connections", "Соединения пула Redis по состоянию", ["state"], fn=_pool_stats)
+
 
 async def get_redis():
     return redis_client
@@ -0,0 +1,49 @@
+"""
+Счётчики SQL и Redis в рамках одного HTTP-запроса.
+
+Хуки движка SQLAlchemy и клиента Redis добавляют время в объект из
+contextvar; middleware создаёт его в начале запроса и по итогам пишет
+заголовок Server-Timing. Вне запроса (socket-события, фоновые задачи)
+объекта нет, и запись ничего не стоит.
+"""
+from contextvars import ContextVar
+
+
+class RequestStats:
+    __slots__ = ("db_count", "db_time", "redis_count", "redis_time")
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_time = 0.0
+        self.redis_count = 0
+        self.redis_time = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_count} queries", '
+            f'redis;dur={self.redis_time * 1000:.1f};desc="{self.redis_count} commands", '
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def begin() -> RequestStats:
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def record_db(elapsed: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.db_count += 1
+        stats.db_time += elapsed
+
+
+def record_redis(elapsed: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.redis_count += 1
+        stats.redis_time += elapsed
@@ -0,0 +1,297 @@
+"""
+Запись ответов и итогов игр в PostgreSQL без ожидания со стороны игры.
+
+Обработчики socket-событий только добавляют запись в Redis Stream
+(один round trip), а фоновый писатель читает стрим через consumer group
+пачками и вставляет их в answer_log и game_results одним INSERT ... ON
+CONFLICT DO NOTHING в отдельном потоке, чтобы не блокировать event loop.
+
+- at-least-once: запись подтверждается (XACK) и удаляется из стрима только
+  после commit; при ошибке пачка остаётся в pending и читается снова;
+- идемпотентность: уникальные ключи (game_id, player_id[, step_number])
+  отбрасывают повторы после повторной доставки;
+- повторы: экспоненциальная пауза до RESULTS_RETRY_MAX_SECONDS; записи
+  упавшего процесса забирает другой через XAUTOCLAIM после
+  RESULTS_CLAIM_IDLE_MS простоя;
+- записи, которые база отвергает при любой попытке (DataError,
+  IntegrityError — например, слишком длинное имя игрока), повтор не
+  исправит: пачка делится пополам, пока такие записи не окажутся по
+  одной, они переносятся в стрим results:dead и подтверждаются, а
+  остальные записываются — иначе одна запись навсегда остановила бы
+  писателя, и стрим переполнился бы;
+- статистика по словам и предложениям (core/analytics) прибавляется
+  к world_item_stats в той же транзакции, что и вставка ответов;
+- backpressure: если в стриме уже RESULTS_STREAM_MAX_LEN необработанных
+  записей, новые не добавляются и считаются в results_dropped_total —
+  игра продолжается, а уже принятые записи не вытесняются.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+
+from redis import asyncio as redis
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import DataError, IntegrityError
+
+from core import analytics, fast_json
+from core.config import settings
+from core.metrics import Counter, Gauge, Histogram
+from core.redis_client import get_redis
+from db.models import AnswerLog, GameResult
+from db.session import SessionLocal, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+STREAM = "results:stream"
+DEAD_STREAM = "results:dead"
+GROUP = "results-writer"
+
+RESULTS_ENQUEUED = Counter("results_enqueued_total", "Записи, добавленные в стрим результатов", ["kind"])
+RESULTS_DROPPED = Counter("results_dropped_total", "Записи, не принятые из-за переполненного стрима", ["kind"])
+RESULTS_WRITTEN = Counter("results_written_total", "Строки, записанные в PostgreSQL", ["table"])
+RESULTS_WRITE_ERRORS = Counter("results_write_errors_total", "Неудачные попытки записать пачку")
+RESULTS_DEAD_LETTERED = Counter("results_dead_lettered_total", "Записи, отвергнутые базой и перенесённые в results:dead")
+RESULTS_BATCH_SECONDS = Histogram("results_batch_seconds", "Время записи одной пачки в PostgreSQL")
+RESULTS_BACKLOG = Gauge("results_backlog", "Необработанные записи в стриме результатов")
+RESULTS_BACKLOG.set(0)
+
+# Не вытесняем старые записи (MAXLEN), а не принимаем новые: так принятое
+# к записи не теряется, а переполнение видно по results_dropped_total
+_APPEND_SCRIPT = """
+if redis.call("XLEN", KEYS[1]) >= tonumber(ARGV[1]) then
+    return false
+end
+return redis.call("XADD", KEYS[1], "*", "kind", ARGV[2], "data", ARGV[3])
+"""
+
+
+async def _append(r: redis.Redis, kind: str, data: dict) -> bool:
+    try:
+        entry_id = await r.eval(
+            _APPEND_SCRIPT, 1, STREAM, settings.results_stream_max_len, kind, fast_json.dumps(data)
+        )
+    except Exception as e:
+        # Потеря записи журнала не должна ронять обработчик ответа
+        logger.error("Не удалось добавить %s в стрим результатов: %s", kind, e)
+        entry_id = None
+    if entry_id is None:
+        RESULTS_DROPPED.labels(kind).inc()
+        return False
+    RESULTS_ENQUEUED.labels(kind).inc()
+    return True
+
+
+async def record_answer(r: redis.Redis, game: dict, join_code: str, player_id: str, step_number: int,
+                        is_correct: bool, score: int, time_spent: float,
+                        item: tuple[str, int | None] = (None, None)) -> None:
+    """
+    Ставит ответ в очередь на запись; game — {"game_id", "world_id"} из room_store,
+    item — ("word", word_id) или ("sentence", sentence_id) для аналитики мира.
+    """
+    if not game.get("game_id"):
+        return
+    item_type, item_id = item
+    await _append(r, "answer", {
+        "game_id": game["game_id"],
+        "world_id": game.get("world_id"),
+        "join_code": join_code,
+        "player_id": player_id,
+        "step_number": step_number,
+        "item_type": item_type,
+        "item_id": item_id,
+        "is_correct": is_correct,
+        "score": score,
+        "time_spent": time_spent,
+        "ts": time.time(),
+    })
+
+
+async def record_game(r: redis.Redis, join_code: str, finished: dict) -> None:
+    """Ставит в очередь итоги игры целиком — одна запись на комнату."""
+    if not finished.get("game_id"):
+        return
+    await _append(r, "game", {
+        "game_id": finished["game_id"],
+        "world_id": finished.get("world_id"),
+        "join_code": join_code,
+        "players": [
+            {"player_id": p["player_id"], "username": p["username"], "score": p["score"], "place": p["place"]}
+            for p in finished["ranking"]
+        ],
+        "ts": time.time(),
+    })
+
+
+def _to_rows(entries) -> tuple[list[dict], list[dict]]:
+    answers, results = [], []
+    for entry_id, fields in entries:
+        try:
+            kind, data = fields["kind"], fast_json.loads(fields["data"])
+            moment = datetime.fromtimestamp(data["ts"], timezone.utc).replace(tzinfo=None)
+            if kind == "answer":
+                answers.append({
+                    "game_id": data["game_id"],
+                    "world_id": data.get("world_id"),
+                    "join_code": data.get("join_code"),
+                    "player_id": data["player_id"],
+                    "step_number": data["step_number"],
+                    "item_type": data.get("item_type"),
+                    "item_id": data.get("item_id"),
+                    "is_correct": data["is_correct"],
+                    "score": data["score"],
+                    "time_spent": data.get("time_spent"),
+                    "answered_at": moment,
+                })
+            elif kind == "game":
+                total = len(data["players"])
+                results.extend({
+                    "game_id": data["game_id"],
+                    "world_id": data.get("world_id"),
+                    "join_code": data.get("join_code"),
+                    "player_id": player["player_id"],
+                    "username": player.get("username"),
+                    "score": player["score"],
+                    "place": player["place"],
+                    "total_players": total,
+                    "finished_at": moment,
+                } for player in data["players"])
+            else:
+                raise ValueError(f"неизвестный вид записи {kind!r}")
+        except (KeyError, TypeError, ValueError) as e:
+            # Битую запись повтор не исправит: пишем в лог и подтверждаем вместе с пачкой
+            logger.error("Пропущена запись %s из стрима результатов: %s", entry_id, e)
+    return answers, results
+
+
+def _write_rows(answers: list[dict], results: list[dict]) -> None:
+    db = SessionLocal()
+    try:
+        if answers:
+            # RETURNING отдаёт только действительно вставленные строки: повторно
+            # доставленные ответы не попадут в статистику второй раз
+            inserted = db.execute(
+                dialect_insert(AnswerLog).on_conflict_do_nothing().returning(*analytics.ANSWER_COLUMNS),
+                answers,
+            ).all()
+            # Статистика мира обновляется в той же транзакции, что и журнал
+            analytics.apply_answers(db, inserted)
+        if results:
+            db.execute(dialect_insert(GameResult).on_conflict_do_nothing(), results)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    RESULTS_WRITTEN.labels("answer_log").inc(len(answers))
+    RESULTS_WRITTEN.labels("game_results").inc(len(results))
+
+
+class ResultsWriter:
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._task: asyncio.Task | None = None
+        self._group_ready = False
+        self._last_claim = 0.0
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        # Недописанная пачка останется в pending и будет дописана после перезапуска
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            try:
+                r = await get_redis()
+                await self._ensure_group(r)
+                entries = await self._next_batch(r)
+                if entries:
+                    await self._write(r, entries)
+                RESULTS_BACKLOG.set(await r.xlen(STREAM))
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                self._group_ready = False  # стрим могли удалить вместе с группой
+                RESULTS_WRITE_ERRORS.inc()
+                delay = min(2 ** failures, settings.results_retry_max_seconds)
+                logger.error("Запись результатов не удалась (попытка %d), повтор через %.0f с: %s",
+                             failures, delay, e)
+                await asyncio.sleep(delay)
+
+    async def _ensure_group(self, r: redis.Redis) -> None:
+        if self._group_ready:
+            return
+        try:
+            await r.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    async def _next_batch(self, r: redis.Redis) -> list:
+        count = settings.results_batch_size
+        # Сначала свои неподтверждённые записи (пачка, которую не удалось записать)
+        own = await r.xreadgroup(GROUP, self.consumer, {STREAM: "0"}, count=count)
+        if own and own[0][1]:
+            return own[0][1]
+        # Затем записи процессов, которые взяли их и пропали
+        now = time.monotonic()
+        if now - self._last_claim >= settings.results_claim_idle_ms / 1000:
+            self._last_claim = now
+            claimed = await r.xautoclaim(STREAM, GROUP, self.consumer,
+                                         min_idle_time=settings.results_claim_idle_ms, count=count)
+            if claimed[1]:
+                return claimed[1]
+        fresh = await r.xreadgroup(GROUP, self.consumer, {STREAM: ">"}, count=count,
+                                   block=settings.results_block_ms)
+        return fresh[0][1] if fresh else []
+
+    async def _write(self, r: redis.Redis, entries: list) -> None:
+        started = time.perf_counter()
+        rejected = await self._persist(entries)
+        RESULTS_BATCH_SECONDS.observe(time.perf_counter() - started)
+        ids = [entry_id for entry_id, _ in entries]
+        async with r.pipeline(transaction=False) as pipe:
+            for entry_id, fields, error in rejected:
+                pipe.xadd(DEAD_STREAM, {**fields, "entry_id": entry_id, "error": error[:1000]},
+                          maxlen=settings.results_dead_letter_max_len, approximate=True)
+            pipe.xack(STREAM, GROUP, *ids)
+            pipe.xdel(STREAM, *ids)
+            await pipe.execute()
+
+    async def _persist(self, entries: list) -> list[tuple[str, dict, str]]:
+        """
+        Записывает пачку; возвращает (id, поля, ошибка) записей, которые база
+        отвергает сами по себе. Ошибки соединения уходят наверх — на повтор.
+        """
+        answers, results = _to_rows(entries)
+        if not (answers or results):
+            return []
+        try:
+            await asyncio.to_thread(_write_rows, answers, results)
+            return []
+        except (DataError, IntegrityError) as e:
+            if len(entries) == 1:
+                entry_id, fields = entries[0]
+                RESULTS_DEAD_LETTERED.inc()
+                logger.error("Запись %s отвергнута базой и перенесена в %s: %s", entry_id, DEAD_STREAM, e.orig)
+                return [(entry_id, fields, str(e.orig))]
+        # Виновную запись ищем делением пачки: остальные записываются как обычно
+        middle = len(entries) // 2
+        return await self._persist(entries[:middle]) + await self._persist(entries[middle:])
+
+
+writer = ResultsWriter()
@@ -1,4 +1,6 @@
+import secrets
 import time
+import uuid
 from typing import List, Dict
 from redis import asyncio as redis
 from core.config import settings
@@ -6,8 +8,17 @@ from core.config import settings
 
 ROOM_META = "room:{code}:meta"
 ROOM_PLAYERS = "room:{code}:players"
-ROOM_PLAYER = "room:{code}:player:{sid}"
+# Игрок комнаты адресуется player_id, а не sid: sid меняется при переподключении,
+# текущий хранится в поле "sid" хэша игрока
+ROOM_PLAYER = "room:{code}:player:{player_id}"
 ROOM_FINISHED = "room:{code}:finished"
+# Отвеченные шаги всех игроков комнаты одним битовым массивом:
+# бит slot * steps_count + step, slot — порядковый номер игрока в комнате
+ROOM_ANSWERED = "room:{code}:answered"
+# Задания пошаговой игры (pacing "student" или "host"): JSON-строки по порядку шагов
+ROOM_STEPS = "room:{code}:steps"
+# Комнаты, хост которых отключился: код -> срок (unix time), после которого комнату закрывают
+HOST_GRACE = "rooms:host_grace"
 
 
 def _meta_key(code: str) -> str:
@@ -18,22 +29,31 @@ def _players_key(code: str) -> str:
     return ROOM_PLAYERS.format(code=code)
 
 
-def _player_key(code: str, sid: str) -> str:
-    return ROOM_PLAYER.format(code=code, sid=sid)
+def _player_key(code: str, player_id: str) -> str:
+    return ROOM_PLAYER.format(code=code, player_id=player_id)
 
 
 def _finished_key(code: str) -> str:
     return ROOM_FINISHED.format(code=code)
 
 
+def _answered_key(code: str) -> str:
+    return ROOM_ANSWERED.format(code=code)
+
+
+def _steps_key(code: str) -> str:
+    return ROOM_STEPS.format(code=code)
+
+
 async def _touch_room(r: redis.Redis, code: str) -> None:
     ttl = settings.redis_room_ttl_seconds
-    await r.expire(_meta_key(code), ttl)
-    await r.expire(_players_key(code), ttl)
-    await r.expire(_finished_key(code), ttl)
+    async with r.pipeline(transaction=False) as pipe:
+        for key in (_meta_key(code), _players_key(code), _finished_key(code), _answered_key(code), _steps_key(code)):
+            pipe.expire(key, ttl)
+        await pipe.execute()
 
 
-async def ensure_room(r: redis.Redis, code: str, steps_count: int) -> None:
+async def ensure_room(r: redis.Redis, code: str, steps_count: int, world_id: int | None = None) -> None:
     meta_key = _meta_key(code)
     exists = await r.exists(meta_key)
     if not exists:
@@ -44,11 +64,78 @@ async def ensure_room(r: redis.Redis, code: str, steps_count: int) -> None:
                 "steps_count": str(steps_count),
                 "created_at": str(int(time.time())),
                 "finished_count": "0",
+                # Коды комнат переиспользуются, game_id отличает одну игру от другой
+                "game_id": uuid.uuid4().hex,
+                "world_id": str(world_id or ""),
             },
         )
     await _touch_room(r, code)
 
 
+async def get_game_info(r: redis.Redis, code: str) -> Dict[str, str | int | None]:
+    game_id, world_id = await r.hmget(_meta_key(code), "game_id", "world_id")
+    return {"game_id": game_id, "world_id": int(world_id) if world_id else None}
+
+
+async def save_steps(r: redis.Redis, code: str, payloads: List[str], pacing: str) -> str | None:
+    """
+    Сохраняет задания пошаговой игры (уже сериализованные) и режим выдачи;
+    открыт шаг 0. Возвращает game_id комнаты — ключ кэша заданий в процессах.
+    """
+    steps_key = _steps_key(code)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.delete(steps_key)
+        if payloads:
+            pipe.rpush(steps_key, *payloads)
+        pipe.expire(steps_key, settings.redis_room_ttl_seconds)
+        pipe.hset(_meta_key(code), mapping={"pacing": pacing, "current_step": "0"})
+        pipe.hget(_meta_key(code), "game_id")
+        results = await pipe.execute()
+    return results[-1]
+
+
+async def get_step_payload(r: redis.Redis, code: str, index: int) -> str | None:
+    return await r.lindex(_steps_key(code), index)
+
+
+async def advance_step(r: redis.Redis, code: str) -> int:
+    """Хост открывает следующий шаг (pacing "host"). Возвращает его номер или -1, если открывать нечего."""
+    script = """
+    local meta = redis.call("HMGET", KEYS[1], "pacing", "current_step", "steps_count")
+    local current = tonumber(meta[2]) or 0
+    if meta[1] ~= "host" or current + 1 >= (tonumber(meta[3]) or 0) then
+        return -1
+    end
+    return redis.call("HINCRBY", KEYS[1], "current_step", 1)
+    """
+    return int(await r.eval(script, 1, _meta_key(code)))
+
+
+async def player_open_step(r: redis.Redis, code: str, player_id: str) -> int:
+    """
+    Шаг, на котором игрок пошаговой игры сейчас: для pacing "host" — открытый
+    хостом, для "student" — первый неотвеченный. -1 — таких нет или игра не пошаговая.
+    """
+    script = """
+    local meta = redis.call("HMGET", KEYS[2], "pacing", "current_step", "steps_count")
+    local steps = tonumber(meta[3]) or 0
+    if meta[1] == "host" then
+        return tonumber(meta[2]) or 0
+    end
+    local slot = tonumber(redis.call("HGET", KEYS[1], "slot"))
+    if meta[1] ~= "student" or not slot then
+        return -1
+    end
+    for step = 0, steps - 1 do
+        if redis.call("GETBIT", KEYS[3], slot * steps + step) == 0 then
+            return step
+        end
+    end
+    return -1
+    """
+    return int(await r.eval(script, 3, _player_key(code, player_id), _meta_key(code), _answered_key(code)))
+
+
 async def set_started(r: redis.Redis, code: str) -> None:
     await r.hset(_meta_key(code), "started", "1")
     await _touch_room(r, code)
@@ -67,59 +154,191 @@ async def get_steps_count(r: redis.Redis, code: str) -> int:
         return 0
 
 
-async def upsert_player(r: redis.Redis, code: str, sid: str, username: str | None) -> None:
-    player_key = _player_key(code, sid)
+async def upsert_player(r: redis.Redis, code: str, player_id: str, sid: str, username: str | None) -> str:
+    """Добавляет игрока в комнату; возвращает секрет, которым он подтвердит переподключение."""
+    player_key = _player_key(code, player_id)
+    resume_secret = secrets.token_urlsafe(16)
+    # Номер игрока в битовом массиве отвеченных шагов; номера не переиспользуются
+    slot = await r.hincrby(_meta_key(code), "player_slots", 1) - 1
     await r.hset(
         player_key,
         mapping={
             "username": username or "",
             "finished": "0",
+            "sid": sid,
+            "resume": resume_secret,
+            "slot": str(slot),
         },
     )
-    await r.zadd(_players_key(code), {sid: 0}, nx=True)
+    await r.zadd(_players_key(code), {player_id: 0}, nx=True)
     await _touch_room(r, code)
+    return resume_secret
 
 
-async def remove_player(r: redis.Redis, code: str, sid: str) -> None:
+async def resume_player(r: redis.Redis, code: str, player_id: str, resume_secret: str,
+                        sid: str) -> Dict | None:
+    """
+    Привязывает новый sid к существующему игроку, если секрет совпал, а игрок
+    и комната ещё существуют. Один вызов Redis; счёт, место в рейтинге и отметка
+    о завершении не трогаются. Возвращает состояние игрока или None.
+    """
+    script = """
+    local player_key = KEYS[1]
+    local meta_key = KEYS[2]
+    local players_key = KEYS[3]
+    if redis.call("EXISTS", meta_key) == 0 then
+        return false
+    end
+    local secret = redis.call("HGET", player_key, "resume")
+    if not secret or secret ~= ARGV[2] then
+        return false
+    end
+    local fields = redis.call("HMGET", player_key, "username", "finished", "sid")
+    redis.call("HSET", player_key, "sid", ARGV[3])
+    local meta = redis.call("HMGET", meta_key, "started", "steps_count", "game_id", "world_id", "pacing")
+    local score = redis.call("ZSCORE", players_key, ARGV[1]) or "0"
+    return {fields[1] or "", fields[2] or "0", fields[3] or "", score,
+            meta[1] or "0", meta[2] or "0", meta[3] or "", meta[4] or "", meta[5] or "all"}
+    """
+    result = await r.eval(
+        script, 3, _player_key(code, player_id), _meta_key(code), _players_key(code),
+        player_id, resume_secret, sid,
+    )
+    if not result:
+        return None
+    await _touch_room(r, code)
+    username, finished, previous_sid, score, started, steps_count, game_id, world_id, pacing = result
+    return {
+        "username": username,
+        "finished": finished == "1",
+        "previous_sid": previous_sid or None,
+        "score": int(float(score)),
+        "started": started == "1",
+        "steps_count": int(steps_count or 0),
+        "pacing": pacing,
+        "game": {"game_id": game_id or None, "world_id": int(world_id) if world_id else None},
+    }
+
+
+async def remove_player(r: redis.Redis, code: str, player_id: str, sid: str) -> bool:
+    """
+    Удаляет игрока, если он так и не переподключился: его текущий sid всё ещё
+    тот, с которым он отключился. Возвращает True, если игрок удалён.
+    """
+    # Прошедший все шаги игрок остаётся в рейтинге: его итог попадёт
+    # в финальные места и в game_results, даже если он уже ушёл
     script = """
     local player_key = KEYS[1]
     local meta_key = KEYS[2]
     local players_key = KEYS[3]
-    local finished = redis.call("HGET", player_key, "finished")
-    if finished == "1" then
-        redis.call("HINCRBY", meta_key, "finished_count", -1)
+    local fields = redis.call("HMGET", player_key, "finished", "sid")
+    if fields[1] == "1" or fields[2] ~= ARGV[2] then
+        return 0
     end
     redis.call("DEL", player_key)
     redis.call("ZREM", players_key, ARGV[1])
     return 1
     """
-    await r.eval(script, 3, _player_key(code, sid), _meta_key(code), _players_key(code), sid)
+    removed = await r.eval(script, 3, _player_key(code, player_id), _meta_key(code), _players_key(code),
+                           player_id, sid)
     await _touch_room(r, code)
+    return bool(removed)
 
 
-async def add_score(r: redis.Redis, code: str, sid: str, delta: int) -> None:
-    await r.zincrby(_players_key(code), delta, sid)
+async def add_score(r: redis.Redis, code: str, player_id: str, delta: int) -> None:
+    await r.zincrby(_players_key(code), delta, player_id)
     await _touch_room(r, code)
 
 
+async def is_answered(r: redis.Redis, code: str, player_id: str, step: int) -> bool:
+    """Дешёвая проверка до оценки ответа: отвечал ли игрок на шаг (шаги с 0)."""
+    script = """
+    local slot = tonumber(redis.call("HGET", KEYS[1], "slot"))
+    local steps = tonumber(redis.call("HGET", KEYS[2], "steps_count")) or 0
+    local step = tonumber(ARGV[1])
+    if not slot or step < 0 or step >= steps then
+        return 0
+    end
+    return redis.call("GETBIT", KEYS[3], slot * steps + step)
+    """
+    return bool(await r.eval(script, 3, _player_key(code, player_id), _meta_key(code), _answered_key(code), step))
+
+
+async def score_answer(r: redis.Redis, code: str, player_id: str, step: int, delta: int) -> Dict[str, int | str]:
+    """
+    Засчитывает ответ на шаг (шаги с 0) ровно один раз: отметка в битовом
+    массиве и начисление очков — один вызов Lua, так что два одновременных
+    ответа на один шаг не дадут очков дважды. Заодно возвращает steps_count
+    и режим выдачи шагов (pacing). status: "ok", "duplicate" (шаг уже засчитан),
+    "closed" (в пошаговой игре шаг ещё не выдан) или "invalid" (нет игрока,
+    комнаты или шага с таким номером).
+    """
+    script = """
+    local slot = tonumber(redis.call("HGET", KEYS[1], "slot"))
+    local meta = redis.call("HMGET", KEYS[2], "steps_count", "pacing", "current_step")
+    local steps = tonumber(meta[1]) or 0
+    local pacing = meta[2] or "all"
+    local step = tonumber(ARGV[2])
+    if not slot or step < 0 or step >= steps then
+        return {"invalid", steps, pacing}
+    end
+    local bit = slot * steps + step
+    if pacing == "host" and step > (tonumber(meta[3]) or 0) then
+        return {"closed", steps, pacing}
+    end
+    if pacing == "student" and step > 0 and redis.call("GETBIT", KEYS[4], bit - 1) == 0 then
+        return {"closed", steps, pacing}
+    end
+    if redis.call("SETBIT", KEYS[4], bit, 1) == 1 then
+        return {"duplicate", steps, pacing}
+    end
+    redis.call("ZINCRBY", KEYS[3], ARGV[3], ARGV[1])
+    for i = 2, #KEYS do
+        redis.call("EXPIRE", KEYS[i], ARGV[4])
+    end
+    return {"ok", steps, pacing}
+    """
+    status, steps_count, pacing = await r.eval(
+        script, 5, _player_key(code, player_id), _meta_key(code), _players_key(code), _answered_key(code),
+        _finished_key(code), player_id, step, delta, settings.redis_room_ttl_seconds,
+    )
+    return {"status": status, "steps_count": int(steps_count), "pacing": pacing}
+
+
 async def get_leaderboard(r: redis.Redis, code: str) -> List[Dict[str, int | str]]:
     players_key = _players_key(code)
     entries = await r.zrevrange(players_key, 0, -1, withscores=True)
     leaderboard: List[Dict[str, int | str]] = []
-    for sid, score in entries:
-        username = await r.hget(_player_key(code, sid), "username")
+    for player_id, score in entries:
+        username = await r.hget(_player_key(code, player_id), "username")
+        # Ключ "sid" оставлен ради клиентов: значение — постоянный player_id
         leaderboard.append(
-            {"sid": sid, "username": username, "score": int(score or 0)}
+            {"sid": player_id, "username": username, "score": int(score or 0)}
         )
     await _touch_room(r, code)
     return leaderboard
 
 
+async def get_roster(r: redis.Redis, code: str) -> List[Dict[str, str]]:
+    """Игроки комнаты [{"sid": player_id, "username"}] в порядке входа — один вызов Lua."""
+    script = """
+    local player_ids = redis.call("ZRANGE", KEYS[1], 0, -1)
+    local result = {}
+    for _, player_id in ipairs(player_ids) do
+        result[#result + 1] = player_id
+        result[#result + 1] = redis.call("HGET", ARGV[1] .. player_id, "username") or ""
+    end
+    return result
+    """
+    flat = await r.eval(script, 1, _players_key(code), _player_key(code, ""))
+    return [{"sid": flat[i], "username": flat[i + 1]} for i in range(0, len(flat), 2)]
+
+
 async def get_top3(r: redis.Redis, code: str) -> List[Dict[str, int | str]]:
     entries = await r.zrevrange(_players_key(code), 0, 2, withscores=True)
     result: List[Dict[str, int | str]] = []
-    for idx, (sid, score) in enumerate(entries):
-        username = await r.hget(_player_key(code, sid), "username")
+    for idx, (player_id, score) in enumerate(entries):
+        username = await r.hget(_player_key(code, player_id), "username")
         result.append(
             {"place": idx + 1, "username": username, "score": int(score or 0)}
         )
@@ -127,45 +346,97 @@ async def get_top3(r: redis.Redis, code: str) -> List[Dict[str, int | str]]:
     return result
 
 
-async def get_player_place(r: redis.Redis, code: str, sid: str) -> int:
-    rank = await r.zrevrank(_players_key(code), sid)
+async def get_player_place(r: redis.Redis, code: str, player_id: str) -> int:
+    rank = await r.zrevrank(_players_key(code), player_id)
     if rank is None:
         return 0
     return int(rank) + 1
 
 
-async def get_player_score(r: redis.Redis, code: str, sid: str) -> int:
-    score = await r.zscore(_players_key(code), sid)
+async def get_player_score(r: redis.Redis, code: str, player_id: str) -> int:
+    score = await r.zscore(_players_key(code), player_id)
     return int(score or 0)
 
 
-async def mark_finished_and_check_all(r: redis.Redis, code: str, sid: str) -> bool:
+async def finish_player(r: redis.Redis, code: str, player_id: str) -> Dict[str, int | bool]:
+    """
+    Отмечает, что игрок прошёл все шаги, и за один round trip возвращает
+    его счёт, место, число игроков и признак того, что закончили все.
+    all_finished истинен ровно у одного вызова — того, что закрыл комнату.
+    """
     script = """
     local player_key = KEYS[1]
     local meta_key = KEYS[2]
     local players_key = KEYS[3]
-    if redis.call("HGET", player_key, "finished") == "1" then
-        return 0
-    end
-    redis.call("HSET", player_key, "finished", "1")
-    local finished = redis.call("HINCRBY", meta_key, "finished_count", 1)
+    local all_finished = 0
     local total = redis.call("ZCARD", players_key)
-    if total > 0 and finished >= total then
-        return 1
+    if redis.call("HGET", player_key, "finished") ~= "1" then
+        redis.call("HSET", player_key, "finished", "1")
+        local finished = redis.call("HINCRBY", meta_key, "finished_count", 1)
+        if total > 0 and finished >= total then
+            all_finished = 1
+        end
     end
-    return 0
+    local score = redis.call("ZSCORE", players_key, ARGV[1]) or "0"
+    local rank = redis.call("ZREVRANK", players_key, ARGV[1])
+    redis.call("EXPIRE", meta_key, ARGV[2])
+    redis.call("EXPIRE", players_key, ARGV[2])
+    return {all_finished, score, rank and rank + 1 or 0, total}
     """
-    result = await r.eval(script, 3, _player_key(code, sid), _meta_key(code), _players_key(code))
-    await _touch_room(r, code)
-    return bool(result)
+    all_finished, score, place, total = await r.eval(
+        script, 3, _player_key(code, player_id), _meta_key(code), _players_key(code),
+        player_id, settings.redis_room_ttl_seconds,
+    )
+    return {
+        "all_finished": bool(all_finished),
+        "score": int(float(score)),
+        "place": int(place),
+        "total_players": int(total),
+    }
 
 
-async def finish_once(r: redis.Redis, code: str) -> bool:
-    key = _finished_key(code)
-    created = await r.setnx(key, "1")
-    if created:
-        await r.expire(key, settings.redis_room_ttl_seconds)
-    return bool(created)
+async def finalize_room(r: redis.Redis, code: str) -> Dict | None:
+    """
+    Атомарно снимает итоговый рейтинг комнаты и удаляет её ключи.
+    Возвращает {"game_id", "world_id", "ranking"} с игроками по местам
+    (player_id и последний sid игрока) или None, если комнату уже закрыли (второй вызов не получит рейтинг повторно).
+    """
+    script = """
+    local players_key = KEYS[2]
+    local entries = redis.call("ZREVRANGE", players_key, 0, -1, "WITHSCORES")
+    if #entries == 0 then
+        return false
+    end
+    local meta = redis.call("HMGET", KEYS[1], "game_id", "world_id")
+    local result = {meta[1] or "", meta[2] or ""}
+    for i = 1, #entries, 2 do
+        local player_key = ARGV[1] .. entries[i]
+        local fields = redis.call("HMGET", player_key, "username", "sid")
+        result[#result + 1] = entries[i]
+        result[#result + 1] = entries[i + 1]
+        result[#result + 1] = fields[1] or ""
+        result[#result + 1] = fields[2] or ""
+        redis.call("DEL", player_key)
+    end
+    redis.call("DEL", KEYS[1], players_key, KEYS[3], KEYS[4], KEYS[5])
+    return result
+    """
+    flat = await r.eval(
+        script, 5, _meta_key(code), _players_key(code), _finished_key(code), _answered_key(code), _steps_key(code),
+        _player_key(code, ""),
+    )
+    if not flat:
+        return None
+    game_id, world_id, players = flat[0], flat[1], flat[2:]
+    return {
+        "game_id": game_id or None,
+        "world_id": int(world_id) if world_id else None,
+        "ranking": [
+            {"player_id": players[i], "sid": players[i + 3] or None, "username": players[i + 2],
+             "score": int(float(players[i + 1])), "place": i // 4 + 1}
+            for i in range(0, len(players), 4)
+        ],
+    }
 
 
 async def are_all_finished(r: redis.Redis, code: str) -> bool:
@@ -180,8 +451,127 @@ async def are_all_finished(r: redis.Redis, code: str) -> bool:
 
 async def cleanup_room(r: redis.Redis, code: str) -> None:
     players_key = _players_key(code)
-    sids = await r.zrange(players_key, 0, -1)
-    keys = [_meta_key(code), players_key, _finished_key(code)]
-    keys.extend([_player_key(code, sid) for sid in sids])
+    player_ids = await r.zrange(players_key, 0, -1)
+    keys = [_meta_key(code), players_key, _finished_key(code), _answered_key(code), _steps_key(code)]
+    keys.extend([_player_key(code, player_id) for player_id in player_ids])
     if keys:
         await r.delete(*keys)
+
+
+async def set_host(r: redis.Redis, code: str, host_id: int, sid: str) -> None:
+    """Запоминает в meta владельца комнаты и sid его текущего соединения."""
+    await r.hset(_meta_key(code), mapping={"host_id": str(host_id), "host_sid": sid})
+
+
+async def begin_host_grace(r: redis.Redis, code: str, sid: str, deadline: float) -> int:
+    """
+    Хост с этим sid отключился: комната ждёт его до deadline.
+    1 — отсрочка назначена; 0 — хост уже вернулся с другим sid, ничего делать
+    не нужно; -1 — комнаты в Redis уже нет, закрывать её можно сразу.
+    """
+    script = """
+    if redis.call("EXISTS", KEYS[1]) == 0 then
+        return -1
+    end
+    local host_sid = redis.call("HGET", KEYS[1], "host_sid")
+    if host_sid and host_sid ~= ARGV[1] then
+        return 0
+    end
+    redis.call("ZADD", KEYS[2], ARGV[2], ARGV[3])
+    return 1
+    """
+    return int(await r.eval(script, 2, _meta_key(code), HOST_GRACE, sid, deadline, code))
+
+
+async def rejoin_host(r: redis.Redis, code: str, host_id: int, sid: str) -> Dict | None:
+    """
+    Возвращает комнату хосту на новом sid и отменяет отсрочку закрытия.
+    None — комнаты нет или она принадлежит другому пользователю.
+    """
+    script = """
+    local meta_key = KEYS[1]
+    if redis.call("HGET", meta_key, "host_id") ~= ARGV[1] then
+        return false
+    end
+    local previous = redis.call("HGET", meta_key, "host_sid") or ""
+    redis.call("HSET", meta_key, "host_sid", ARGV[2])
+    redis.call("ZREM", KEYS[2], ARGV[3])
+    local meta = redis.call("HMGET", meta_key, "started", "steps_count", "world_id", "pacing", "current_step")
+    return {previous, meta[1] or "0", meta[2] or "0", meta[3] or "", meta[4] or "all", meta[5] or "0"}
+    """
+    result = await r.eval(script, 2, _meta_key(code), HOST_GRACE, str(host_id), sid, code)
+    if not result:
+        return None
+    await _touch_room(r, code)
+    previous_sid, started, steps_count, world_id, pacing, current_step = result
+    return {
+        "previous_sid": previous_sid or None,
+        "started": started == "1",
+        "steps_count": int(steps_count or 0),
+        "world_id": int(world_id) if world_id else None,
+        "pacing": pacing,
+        "current_step": int(current_step),
+    }
+
+
+async def claim_expired_hosts(r: redis.Redis, now: float, limit: int) -> List[str]:
+    """
+    Забирает комнаты, чей хост не вернулся до срока. ZREM внутри скрипта
+    гарантирует, что каждую комнату закроет ровно один процесс.
+    """
+    script = """
+    local codes = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+    for i, code in ipairs(codes) do
+        redis.call("ZREM", KEYS[1], code)
+    end
+    return codes
+    """
+    return list(await r.eval(script, 1, HOST_GRACE, now, limit))
+
+
+async def rooms_alive(r: redis.Redis, codes: List[str]) -> set[str]:
+    """Коды комнат, у которых ещё есть ключ meta (один round trip на пачку)."""
+    if not codes:
+        return set()
+    async with r.pipeline(transaction=False) as pipe:
+        for code in codes:
+            pipe.exists(_meta_key(code))
+        found = await pipe.execute()
+    return {code for code, exists in zip(codes, found) if exists}
+
+
+async def touch_rooms(r: redis.Redis, codes: List[str]) -> None:
+    """Продлевает TTL комнат, хост которых ещё подключён, но давно ничего не делал."""
+    if not codes:
+        return
+    ttl = settings.redis_room_ttl_seconds
+    async with r.pipeline(transaction=False) as pipe:
+        for code in codes:
+            pipe.expire(_meta_key(code), ttl)
+            pipe.expire(_players_key(code), ttl)
+            pipe.expire(_finished_key(code), ttl)
+            pipe.expire(_answered_key(code), ttl)
+            pipe.expire(_steps_key(code), ttl)
+        await pipe.execute()
+
+
+async def reap_orphan_players(r: redis.Redis, cursor: int, count: int) -> tuple[int, int]:
+    """
+    Один шаг SCAN по ключам игроков: удаляет room:{code}:player:{player_id},
+    у которых больше нет room:{code}:meta. У ключей игроков нет TTL, и когда
+    meta с рейтингом истекают, сами они остались бы навсегда.
+    Возвращает (следующий курсор, сколько ключей удалено); курсор 0 — обход завершён.
+    """
+    script = """
+    local deleted = 0
+    for i, player_key in ipairs(KEYS) do
+        local code = string.match(player_key, "^room:(.-):player:")
+        if code and redis.call("EXISTS", "room:" .. code .. ":meta") == 0 then
+            deleted = deleted + redis.call("DEL", player_key)
+        end
+    end
+    return deleted
+    """
+    cursor, keys = await r.scan(cursor, match=ROOM_PLAYER.format(code="*", player_id="*"), count=count)
+    deleted = await r.eval(script, len(keys), *keys) if keys else 0
+    return int(cursor), int(deleted)
@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta
 from typing import Any, Optional
 import logging
+import secrets
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Depends, HTTPException, status, WebSocketException
+from fastapi import Depends, HTTPException, status, WebSocketException, Header
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
@@ -31,14 +32,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
-        logger.error(f"Ошибка при проверке пароля: {e}")
+        logger.error("Ошибка при проверке пароля: %s", e)
         return False
 
 def get_password_hash(password: str) -> str:
     try:
         return pwd_context.hash(password)
     except Exception as e:
-        logger.error(f"Ошибка при хешировании пароля: {e}")
+        logger.error("Ошибка при хешировании пароля: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при обработке пароля"
@@ -82,8 +83,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get
     return user
 
 
-async def get_current_user_ws(token: str, db: Session) -> User:
-    """Упрощенная проверка токена для WebSocket"""
+def get_current_user_ws(token: str, db: Session) -> User:
+    """Упрощенная проверка токена для WebSocket; синхронная — вызывается в пуле потоков"""
     if not token:
         logger.error("WebSocket auth: Token is missing")
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
@@ -99,14 +100,14 @@ async def get_current_user_ws(token: str, db: Session) -> User:
 
         user = db.query(User).filter(User.email == email).first()
         if not user:
-            logger.error(f"WebSocket auth: User not found (email: {email})")
+            logger.error("WebSocket auth: User not found (email: %s)", email)
             raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
 
-        logger.debug(f"WebSocket auth success for user: {email}")
+        logger.debug("WebSocket auth success for user: %s", email)
         return user
 
     except JWTError as e:
-        logger.error(f"WebSocket auth JWT error: {str(e)}")
+        logger.error("WebSocket auth JWT error: %s", e)
         raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
 
 
@@ -128,4 +129,12 @@ async def get_current_user_optional(
         user = db.query(User).filter(User.email == email).first()
         return user
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Пускает только запросы с заголовком X-Admin-Token, равным ADMIN_TOKEN."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
@@ -0,0 +1,30 @@
+"""
+Нормализация и разбиение предложений на токены для игры «собери предложение».
+
+Предложение разбивается один раз — при сохранении мира, токены лежат
+в sentences.tokens. Правила:
+
+- Unicode NFC: «й», «ә», «ө», набранные составными символами, совпадают
+  с готовыми;
+- нижний регистр с поправкой на латиницу татарского: «İ» даёт «i», а не
+  «i» с комбинируемой точкой, как у str.lower();
+- знаки препинания отбрасываются, дефис и апостроф внутри слова
+  сохраняются («кое-что», «ma’nä»); числа остаются токенами.
+
+Модуль не зависит от настроек и базы: его импортирует и миграция,
+заполняющая токены существующих предложений.
+"""
+import re
+import unicodedata
+
+_WORD = re.compile(r"\w+(?:[-'’ʼ]\w+)*")
+_LOWER_FIXES = str.maketrans({"İ": "i"})
+
+
+def normalize(text: str | None) -> str:
+    return unicodedata.normalize("NFC", text or "").translate(_LOWER_FIXES).lower()
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Токены предложения в том виде, в каком ученик собирает и отправляет их."""
+    return _WORD.findall(normalize(text))
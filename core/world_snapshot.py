@@ -0,0 +1,283 @@
+"""
+Неизменяемые снимки содержимого мира.
+
+Слова, переводы и предложения мира нужны почти каждому игровому пути
+(GET /worlds/{id}, генерация шагов, старт игры, проверка ответа), и
+раньше каждый раз читались из PostgreSQL через ленивые связи. Снимок —
+всё содержимое одной версии мира в компактном виде:
+
+- строки (слова, переводы, токены предложений) интернированы в одну
+  таблицу, колонки слов хранят индексы в ней;
+- токены предложений (sentences.tokens, core/tokenizer) лежат рядом
+  с текстом, а для проверки ответа заранее собраны в кортежи — проверка
+  «собери предложение» сводится к одному сравнению.
+
+Версия — worlds.content_version; маршруты, меняющие мир, увеличивают её
+и публикуют в Redis (world:{id}:version). Чтение: GET версии, затем LRU
+процесса по (world_id, version), затем блоб world:{id}:snapshot:{version}
+в Redis, и только если его нет — одна выборка из базы. Снимок версии
+не меняется, поэтому его не нужно инвалидировать: новая версия — новый ключ.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+import orjson
+from redis import asyncio as redis
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import Counter
+from core.tokenizer import tokenize
+from db.models import Sentence, Word, World
+
+logger = logging.getLogger(__name__)
+
+WORLD_SNAPSHOT_READS = Counter("world_snapshot_reads_total", "Чтения снимков мира по источнику", ["source"])
+
+VERSION_KEY = "world:{world_id}:version"
+SNAPSHOT_KEY = "world:{world_id}:snapshot:{version}"
+
+# Версию можно только увеличить: читатель, собравший снимок по старой
+# версии из базы, не откатит ключ после того, как мир уже изменили
+_PUBLISH_VERSION_SCRIPT = """
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+if tonumber(ARGV[1]) >= current then
+    redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+end
+return 1
+"""
+
+# Увеличивается при изменении раскладки блоба или правил токенизации
+_FORMAT = 2
+
+
+def _version_key(world_id: int) -> str:
+    return VERSION_KEY.format(world_id=world_id)
+
+
+def _snapshot_key(world_id: int, version: int) -> str:
+    return SNAPSHOT_KEY.format(world_id=world_id, version=version)
+
+
+class WorldSnapshot:
+    __slots__ = (
+        "world_id", "version", "title", "description", "image", "is_public", "author_id",
+        "strings", "word_ids", "word_text", "word_translation", "sentence_ids", "sentence_text",
+        "sentence_tokens", "_word_pos", "_sentence_pos", "_sentence_answers",
+    )
+
+    def __init__(self, world_id: int, version: int, meta: dict, strings: tuple[str, ...],
+                 word_ids: tuple[int, ...], word_text: tuple[int, ...], word_translation: tuple[int, ...],
+                 sentence_ids: tuple[int, ...], sentence_text: tuple[int, ...],
+                 sentence_tokens: tuple[tuple[int, ...], ...]):
+        self.world_id = world_id
+        self.version = version
+        self.title = meta.get("title")
+        self.description = meta.get("description")
+        self.image = meta.get("image")
+        self.is_public = bool(meta.get("is_public"))
+        self.author_id = meta.get("author_id")
+        self.strings = strings
+        self.word_ids = word_ids
+        self.word_text = word_text
+        self.word_translation = word_translation
+        self.sentence_ids = sentence_ids
+        self.sentence_text = sentence_text
+        self.sentence_tokens = sentence_tokens
+        self._word_pos = {word_id: pos for pos, word_id in enumerate(word_ids)}
+        self._sentence_pos = {sentence_id: pos for pos, sentence_id in enumerate(sentence_ids)}
+        self._sentence_answers = {
+            sentence_id: tuple(strings[token] for token in tokens)
+            for sentence_id, tokens in zip(sentence_ids, sentence_tokens)
+        }
+
+    # --- чтение ---
+
+    def words(self) -> list[tuple[int, str, str]]:
+        """(id, слово, перевод) в порядке id."""
+        strings = self.strings
+        return [
+            (word_id, strings[word], strings[translation])
+            for word_id, word, translation in zip(self.word_ids, self.word_text, self.word_translation)
+        ]
+
+    def translations(self) -> list[str]:
+        return [self.strings[pos] for pos in self.word_translation]
+
+    def word(self, word_id: int) -> tuple[str, str] | None:
+        pos = self._word_pos.get(word_id)
+        if pos is None:
+            return None
+        return self.strings[self.word_text[pos]], self.strings[self.word_translation[pos]]
+
+    def sentences(self) -> list[tuple[int, str]]:
+        return [(sentence_id, self.strings[text]) for sentence_id, text in zip(self.sentence_ids, self.sentence_text)]
+
+    def sentence(self, sentence_id: int) -> str | None:
+        pos = self._sentence_pos.get(sentence_id)
+        return None if pos is None else self.strings[self.sentence_text[pos]]
+
+    def sentence_words(self, sentence_id: int) -> tuple[str, ...] | None:
+        """Токены предложения — ровно то, что ученик должен собрать."""
+        return self._sentence_answers.get(sentence_id)
+
+    # --- упаковка ---
+
+    def pack(self) -> str:
+        return orjson.dumps([
+            _FORMAT, self.world_id, self.version,
+            {"title": self.title, "description": self.description, "image": self.image,
+             "is_public": self.is_public, "author_id": self.author_id},
+            self.strings, self.word_ids, self.word_text, self.word_translation,
+            self.sentence_ids, self.sentence_text, self.sentence_tokens,
+        ]).decode()
+
+    @classmethod
+    def unpack(cls, blob: str | bytes) -> "WorldSnapshot | None":
+        data = orjson.loads(blob)
+        if data[0] != _FORMAT:
+            return None  # блоб от другой версии кода: соберём заново
+        (_, world_id, version, meta, strings, word_ids, word_text, word_translation,
+         sentence_ids, sentence_text, sentence_tokens) = data
+        return cls(
+            world_id, version, meta, tuple(strings), tuple(word_ids), tuple(word_text), tuple(word_translation),
+            tuple(sentence_ids), tuple(sentence_text), tuple(tuple(tokens) for tokens in sentence_tokens),
+        )
+
+    @classmethod
+    def build(cls, world: dict, words: list[tuple[int, str, str]],
+              sentences: list[tuple[int, str, list[str] | None]]) -> "WorldSnapshot":
+        table: dict[str, int] = {}
+
+        def intern(value: str | None) -> int:
+            value = value or ""
+            pos = table.get(value)
+            if pos is None:
+                pos = table[value] = len(table)
+            return pos
+
+        word_ids, word_text, word_translation = [], [], []
+        for word_id, word, translation in words:
+            word_ids.append(word_id)
+            word_text.append(intern(word))
+            word_translation.append(intern(translation))
+        sentence_ids, sentence_text, sentence_tokens = [], [], []
+        for sentence_id, sentence, tokens in sentences:
+            sentence_ids.append(sentence_id)
+            sentence_text.append(intern(sentence))
+            # Предложения, сохранённые до появления sentences.tokens, разбиваем здесь
+            tokens = tokenize(sentence) if tokens is None else tokens
+            sentence_tokens.append(tuple(intern(token) for token in tokens))
+        return cls(
+            world["id"], world["content_version"], world, tuple(table), tuple(word_ids), tuple(word_text),
+            tuple(word_translation), tuple(sentence_ids), tuple(sentence_text), tuple(sentence_tokens),
+        )
+
+
+_cache: OrderedDict[tuple[int, int], WorldSnapshot] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _remember(snapshot: WorldSnapshot) -> None:
+    key = (snapshot.world_id, snapshot.version)
+    with _cache_lock:
+        # Снимки прежних версий мира больше не понадобятся
+        for stale in [cached for cached in _cache if cached[0] == snapshot.world_id and cached != key]:
+            del _cache[stale]
+        _cache[key] = snapshot
+        _cache.move_to_end(key)
+        while len(_cache) > settings.world_snapshot_cache_size:
+            _cache.popitem(last=False)
+
+
+def _cached(world_id: int, version: int) -> WorldSnapshot | None:
+    with _cache_lock:
+        snapshot = _cache.get((world_id, version))
+        if snapshot is not None:
+            _cache.move_to_end((world_id, version))
+        return snapshot
+
+
+def load(db: Session, world_id: int) -> WorldSnapshot | None:
+    """Собирает снимок текущей версии мира из базы (None, если мира нет)."""
+    world = db.execute(
+        select(World.id, World.content_version, World.title, World.description, World.image,
+               World.is_public, World.author_id).where(World.id == world_id)
+    ).mappings().first()
+    if world is None:
+        return None
+    cached = _cached(world_id, world["content_version"])
+    if cached is not None:
+        WORLD_SNAPSHOT_READS.labels("local").inc()
+        return cached
+    words = db.execute(
+        select(Word.id, Word.word, Word.translation).where(Word.world_id == world_id).order_by(Word.id)
+    ).all()
+    sentences = db.execute(
+        select(Sentence.id, Sentence.sentence, Sentence.tokens)
+        .where(Sentence.world_id == world_id).order_by(Sentence.id)
+    ).all()
+    snapshot = WorldSnapshot.build(dict(world), [tuple(row) for row in words], [tuple(row) for row in sentences])
+    WORLD_SNAPSHOT_READS.labels("db").inc()
+    _remember(snapshot)
+    return snapshot
+
+
+async def cached_snapshot(r: redis.Redis, world_id: int) -> WorldSnapshot | None:
+    """Снимок текущей версии мира из LRU процесса или Redis; None — его надо собрать через load."""
+    version = await r.get(_version_key(world_id))
+    if version is None:
+        return None
+    version = int(version)
+    snapshot = _cached(world_id, version)
+    if snapshot is not None:
+        WORLD_SNAPSHOT_READS.labels("local").inc()
+        return snapshot
+    blob = await r.get(_snapshot_key(world_id, version))
+    if blob is None:
+        return None
+    snapshot = WorldSnapshot.unpack(blob)
+    if snapshot is not None:
+        WORLD_SNAPSHOT_READS.labels("redis").inc()
+        _remember(snapshot)
+    return snapshot
+
+
+async def share(r: redis.Redis, snapshot: WorldSnapshot) -> None:
+    """Кладёт собранный из базы снимок в Redis для остальных процессов."""
+    ttl = settings.world_snapshot_ttl_seconds
+    await r.set(_snapshot_key(snapshot.world_id, snapshot.version), snapshot.pack(), ex=ttl)
+    await r.eval(_PUBLISH_VERSION_SCRIPT, 1, _version_key(snapshot.world_id), snapshot.version, ttl)
+
+
+async def get_snapshot(r: redis.Redis, db: Session, world_id: int) -> WorldSnapshot | None:
+    """Снимок текущей версии мира: LRU процесса, затем Redis, затем база."""
+    snapshot = await cached_snapshot(r, world_id)
+    if snapshot is None:
+        snapshot = load(db, world_id)
+        if snapshot is not None:
+            await share(r, snapshot)
+    return snapshot
+
+
+async def publish_version(r: redis.Redis, world_id: int, version: int) -> None:
+    """
+    Сообщает всем процессам новую версию мира после commit изменения;
+    снимок соберёт первый читатель.
+    """
+    try:
+        await r.eval(_PUBLISH_VERSION_SCRIPT, 1, _version_key(world_id), version,
+                     settings.world_snapshot_ttl_seconds)
+    except Exception as e:
+        # Изменение уже в базе; старый снимок проживёт не дольше TTL ключа версии
+        logger.error("Не удалось опубликовать версию %s мира %s: %s", version, world_id, e)
+
+
+async def forget(r: redis.Redis, world_id: int) -> None:
+    """Удалённый мир: без ключа версии читатели пойдут в базу и получат None."""
+    try:
+        await r.delete(_version_key(world_id))
+    except Exception as e:
+        logger.error("Не удалось удалить версию мира %s: %s", world_id, e)
@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column, Integer, String, Text, Boolean, ForeignKey,
-    Enum, JSON, DateTime, Identity
+    Enum, JSON, DateTime, Identity, Index, Float, UniqueConstraint,
+    delete, func, select
 )
 from sqlalchemy.orm import declarative_base, relationship
 import uuid
@@ -28,10 +29,12 @@ class World(Base):
     id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
     title = Column(String(255), nullable=False)
     description = Column(Text)
-    author_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'))
-    is_public = Column(Boolean, default=True)
+    author_id = Column(Integer, ForeignKey('users.id', ondelete='SET NULL'), index=True)
+    is_public = Column(Boolean, default=True, index=True)
     created_at = Column(DateTime,  default=lambda: datetime.now(timezone.utc))
     image = Column(String(255), nullable=True)
+    # Растёт при каждом изменении слов и предложений; по нему сбрасываются кэши содержимого
+    content_version = Column(Integer, nullable=False, default=1, server_default='1')
     author = relationship('User', back_populates='worlds')
     words = relationship('Word', back_populates='world')
     sentences = relationship('Sentence', back_populates='world')
@@ -43,7 +46,7 @@ class Word(Base):
     id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
     word = Column(String(255), nullable=False)
     translation = Column(String(255), nullable=False)
-    world_id = Column(Integer, ForeignKey('worlds.id', ondelete='CASCADE'), nullable=False)
+    world_id = Column(Integer, ForeignKey('worlds.id', ondelete='CASCADE'), nullable=False, index=True)
 
     world = relationship('World', back_populates='words')
 
@@ -52,7 +55,9 @@ class Sentence(Base):
     __tablename__ = 'sentences'
     id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
     sentence = Column(Text, nullable=False)
-    world_id = Column(Integer, ForeignKey('worlds.id', ondelete='CASCADE'), nullable=False)
+    # Нормализованные токены (core/tokenizer), считаются при сохранении мира
+    tokens = Column(JSON)
+    world_id = Column(Integer, ForeignKey('worlds.id', ondelete='CASCADE'), nullable=False, index=True)
 
     world = relationship('World', back_populates='sentences')
 
@@ -68,6 +73,9 @@ class AdventureSession(Base):
 
     world_id = Column(Integer, ForeignKey('worlds.id'))
     host_id = Column(Integer, ForeignKey('users.id'))
+    # По возрасту сборщик брошенных сессий отличает их от только что созданных
+    created_at = Column(DateTime, nullable=False, index=True,
+                        default=lambda: datetime.now(timezone.utc), server_default=func.now())
 
     world = relationship('World', back_populates='sessions')
     host = relationship('User', back_populates='hosted_sessions')
@@ -97,10 +105,36 @@ class AdventureSession(Base):
                 db.rollback()
         raise ValueError("Не удалось создать сессию (попробуйте снова)")
 
+    @classmethod
+    def delete_many(cls, db, codes: list[str]) -> dict[str, int]:
+        """
+        Удаляет сессии вместе с шагами, вариантами и шагами сборки предложений
+        (без commit). Внешние ключи шагов без ON DELETE, поэтому дочерние строки
+        удаляются явно, от листьев к корню. Возвращает число удалённых строк по таблицам.
+        """
+        if not codes:
+            return {}
+        step_ids = select(AdventureStep.id).where(AdventureStep.session_id.in_(codes))
+        deleted = {}
+        for name, statement in (
+            ("quiz_options", delete(QuizOption).where(QuizOption.quiz_step_id.in_(step_ids))),
+            ("quiz_steps", delete(QuizStep).where(QuizStep.id.in_(step_ids))),
+            ("word_order_steps", delete(WordOrderStep).where(WordOrderStep.id.in_(step_ids))),
+            ("adventure_steps", delete(AdventureStep).where(AdventureStep.session_id.in_(codes))),
+            ("adventure_sessions", delete(cls).where(cls.join_code.in_(codes))),
+        ):
+            result = db.execute(statement.execution_options(synchronize_session=False))
+            deleted[name] = result.rowcount
+        return deleted
+
 
 
 class AdventureStep(Base):
     __tablename__ = 'adventure_steps'
+    # check_answer ищет шаг по (session_id, step_number), game_start — все шаги сессии
+    __table_args__ = (
+        Index('ix_adventure_steps_session_id_step_number', 'session_id', 'step_number'),
+    )
     id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
     session_id = Column(String(4), ForeignKey('adventure_sessions.join_code'), nullable=False)
     step_number = Column(Integer, nullable=False)
@@ -114,11 +148,17 @@ class QuizStep(Base):
     __tablename__ = 'quiz_steps'
     id = Column(Integer, ForeignKey('adventure_steps.id'), primary_key=True)
     question = Column(Text)
+    # Слово, по которому задан вопрос, — для аналитики по словам мира
+    word_id = Column(Integer, ForeignKey('words.id', ondelete='SET NULL'), nullable=True)
     options = relationship('QuizOption', back_populates='quiz_step')
     step = relationship("AdventureStep", back_populates="quiz_step")
 
 class QuizOption(Base):
     __tablename__ = 'quiz_options'
+    # Поиск правильного варианта: quiz_step_id = ? AND is_correct = true
+    __table_args__ = (
+        Index('ix_quiz_options_quiz_step_id_is_correct', 'quiz_step_id', 'is_correct'),
+    )
     id = Column(Integer, primary_key=True)
     quiz_step_id = Column(Integer, ForeignKey('quiz_steps.id'))
     text = Column(String(255))
@@ -134,3 +174,62 @@ class WordOrderStep(Base):
 
     sentence = relationship('Sentence')
     step = relationship("AdventureStep", back_populates="word_order_step")
+
+
+# Итоги игр пишет фоновый писатель из Redis Stream (core/results_log.py).
+# Коды комнат переиспользуются, поэтому игру определяет game_id, а не join_code;
+# внешних ключей нет: мир или сессию могут удалить раньше, чем дойдёт запись.
+# Уникальные ключи делают повторную доставку из стрима безопасной.
+
+class AnswerLog(Base):
+    __tablename__ = 'answer_log'
+    __table_args__ = (
+        UniqueConstraint('game_id', 'player_id', 'step_number', name='uq_answer_log_game_player_step'),
+    )
+    id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
+    game_id = Column(String(32), nullable=False)
+    world_id = Column(Integer, index=True)
+    join_code = Column(String(4))
+    player_id = Column(String(64), nullable=False)
+    step_number = Column(Integer, nullable=False)
+    # Что проверял шаг: 'word' (викторина) или 'sentence' (сбор предложения)
+    item_type = Column(String(16))
+    item_id = Column(Integer)
+    is_correct = Column(Boolean, nullable=False)
+    score = Column(Integer, nullable=False)
+    time_spent = Column(Float)
+    answered_at = Column(DateTime, nullable=False)
+
+
+class GameResult(Base):
+    __tablename__ = 'game_results'
+    __table_args__ = (
+        UniqueConstraint('game_id', 'player_id', name='uq_game_results_game_player'),
+    )
+    id = Column(Integer, Identity(start=1, increment=1), primary_key=True)
+    game_id = Column(String(32), nullable=False)
+    world_id = Column(Integer, index=True)
+    join_code = Column(String(4))
+    player_id = Column(String(64), nullable=False)
+    username = Column(String(255))
+    score = Column(Integer, nullable=False)
+    place = Column(Integer, nullable=False)
+    total_players = Column(Integer, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+
+
+class WorldItemStats(Base):
+    """
+    Накопленная статистика ответов по слову или предложению мира.
+    Хранятся суммы: писатель результатов прибавляет к ним каждую новую
+    пачку ответов, а точность и среднее время считаются при чтении.
+    """
+    __tablename__ = 'world_item_stats'
+    world_id = Column(Integer, primary_key=True)
+    item_type = Column(String(16), primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    time_sum = Column(Float, nullable=False, default=0.0)
+    time_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
@@ -1,14 +1,95 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 
+from core import request_stats
 from core.config import settings
+from core.metrics import Gauge, Histogram
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+DB_POOL_WAITING = Gauge("db_pool_waiting", "Запросы, ожидающие соединение из пула PostgreSQL")
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Время ожидания соединения из пула PostgreSQL")
+DB_POOL_WAITING.set(0)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Время выполнения SQL-выражений", ["operation"])
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который считает ожидающих свободного соединения и время его получения."""
+
+    def _do_get(self):
+        # Ждёт только тот, кому не досталось ни свободного соединения, ни места под новое
+        blocked = self._pool.qsize() == 0 and -1 < self._max_overflow <= self._overflow
+        if blocked:
+            DB_POOL_WAITING.inc()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if blocked:
+                DB_POOL_WAITING.dec()
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def _engine_options() -> dict:
+    if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+        return {}
+    if settings.db_pgbouncer_mode:
+        # psycopg2 не использует server-side prepared statements,
+        # так что для transaction pooling достаточно не держать свой пул
+        return {"poolclass": NullPool, "pool_pre_ping": settings.db_pool_pre_ping}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options())
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else "UNKNOWN"
+    DB_QUERY_SECONDS.labels(operation).observe(elapsed)
+    request_stats.record_db(elapsed)
+
+
+def _pool_stats() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        ("size",): pool.size(),
+        ("checked_out",): pool.checkedout(),
+        ("overflow",): max(pool.overflow(), 0),
+        ("idle",): pool.checkedin(),
+    }
+
+
+Gauge("db_pool_connections", "Соединения пула PostgreSQL по состоянию", ["state"], fn=_pool_stats)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def dialect_insert(model):
+    """INSERT с поддержкой ON CONFLICT для текущей базы (PostgreSQL или SQLite)."""
+    dialect = sqlite if engine.dialect.name == "sqlite" else postgresql
+    return dialect.insert(model)
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +97,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,36 +1,76 @@
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
+import time
 import socketio
-from fastapi.responses import JSONResponse
-from api.endpoints import worlds, game, auth, adventures
+from fastapi.responses import ORJSONResponse
+from api.endpoints import worlds, game, auth, adventures, metrics, admin
 from api.sockets.server import sio
 import api.sockets.events
+from api.sockets import host_grace, session_gc
 
 
+from core.config import settings
 from core.consts import ORIGINS
 from core.errors import register_exception_handlers
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+from core import request_stats
+from core import loop_monitor
+from core import results_log
+from core.metrics import Histogram
+from core import profiling
+from core.logging_setup import setup_logging
+
+# Настройка логирования: запись в stdout идёт из отдельного потока
+setup_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.loop_monitor_enabled:
+        for route in app.routes:
+            if isinstance(route, APIRoute):
+                loop_monitor.register_handler(route.endpoint, f"{','.join(sorted(route.methods))} {route.path}")
+        for event, handler in sio.handlers.get("/", {}).items():
+            loop_monitor.register_handler(handler, f"sio:{event}")
+        loop_monitor.monitor.start()
+    if settings.results_writer_enabled:
+        results_log.writer.start()
+    if settings.session_gc_enabled:
+        session_gc.collector.start()
+    if settings.host_grace_seconds > 0:
+        host_grace.reaper.start()
+    yield
+    if settings.host_grace_seconds > 0:
+        await host_grace.reaper.stop()
+    if settings.session_gc_enabled:
+        await session_gc.collector.stop()
+    if settings.results_writer_enabled:
+        await results_log.writer.stop()
+    if settings.loop_monitor_enabled:
+        await loop_monitor.monitor.stop()
+
+
 # Создаем FastAPI приложение
 fastapi_app = FastAPI(
     title="Language Learning App API",
-    description="API для обучающего приложения по языкам"
+    description="API для обучающего приложения по языкам",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Регистрируем обработчики ошибок
 register_exception_handlers(fastapi_app)
 
+# Профилирование подключается первым, то есть самым внутренним middleware:
+# так эндпоинт выполняется в той же задаче и попадает в стек сэмплов
+if profiling.enabled:
+    fastapi_app.add_middleware(profiling.ProfilingMiddleware)
+
 
 fastapi_app.add_middleware(
     CORSMiddleware,
@@ -39,24 +79,52 @@ fastapi_app.add_middleware(
     # allow_origin_regex=r"https?://192\.168\.(\d+)\.(\d+)(:\d+)?",  # Поддержка локальной сети
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Type", "X-CSRFToken", "Authorization"],
+    expose_headers=["Content-Type", "X-CSRFToken", "Authorization", "Server-Timing"],
     max_age=86400,  # 1 день кеширования префлайт запросов
 )
 
 @fastapi_app.get("/")
 async def root():
-    return JSONResponse({"success": True, "message": "Server is running"})
+    return ORJSONResponse({"success": True, "message": "Server is running"})
 
 # Middleware для логирования запросов
 @fastapi_app.middleware("http")
 async def log_requests(request, call_next):
-    logger.debug(f"Входящий запрос: {request.method} {request.url}")
-    # Маскируем Authorization
-    headers = dict(request.headers)
-    if 'authorization' in headers:
-        headers['authorization'] = '***'
-    logger.debug(f"Заголовки: {headers}")
+    # Заголовки копируются, только если DEBUG действительно включён
+    if logger.isEnabledFor(logging.DEBUG):
+        headers = dict(request.headers)
+        # Маскируем Authorization
+        if 'authorization' in headers:
+            headers['authorization'] = '***'
+        logger.debug("Входящий запрос: %s %s, заголовки: %s", request.method, request.url, headers)
+    response = await call_next(request)
+    return response
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запросов", ["method", "route", "status"]
+)
+
+
+# Middleware для метрик и Server-Timing: шаблон маршрута вместо URL, чтобы не плодить метки
+@fastapi_app.middleware("http")
+async def record_metrics(request, call_next):
+    started = time.perf_counter()
+    stats = request_stats.begin()
     response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else "unmatched"
+    HTTP_REQUEST_SECONDS.labels(request.method, route_path, str(response.status_code)).observe(elapsed)
+    response.headers["Server-Timing"] = stats.server_timing(elapsed)
+
+    if elapsed * 1000 >= settings.slow_request_ms or stats.db_count >= settings.slow_request_queries:
+        logger.warning(
+            "Медленный запрос %s %s: %.1f мс, SQL: %d за %.1f мс, Redis: %d за %.1f мс",
+            request.method, route_path, elapsed * 1000,
+            stats.db_count, stats.db_time * 1000, stats.redis_count, stats.redis_time * 1000,
+        )
     return response
 
 # Подключаем эндпоинты
@@ -64,6 +132,8 @@ fastapi_app.include_router(worlds.router, prefix="/worlds", tags=["worlds"])
 fastapi_app.include_router(game.router, prefix="/game", tags=["game"])
 fastapi_app.include_router(auth.router, prefix="/auth", tags=["auth"])
 fastapi_app.include_router(adventures.router, prefix="/adventures", tags=["adventures"])
+fastapi_app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+fastapi_app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 
 
@@ -83,5 +153,6 @@ if __name__ == "__main__":
         app, 
         host="0.0.0.0", 
         port=8000,
-        log_level="info"
+        # Логгеры uvicorn пишут через общую очередь, а не своими обработчиками
+        log_config=None,
     )
\ No newline at end of file
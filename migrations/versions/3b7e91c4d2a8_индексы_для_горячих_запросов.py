@@ -0,0 +1,44 @@
+"""индексы для горячих запросов
+
+Revision ID: 3b7e91c4d2a8
+Revises: 0457ba896b44
+Create Date: 2026-10-19 10:12:41.204517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e91c4d2a8'
+down_revision = '0457ba896b44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_words_world_id', 'words', ['world_id'], unique=False)
+    op.create_index('ix_sentences_world_id', 'sentences', ['world_id'], unique=False)
+    op.create_index('ix_worlds_is_public', 'worlds', ['is_public'], unique=False)
+    op.create_index('ix_worlds_author_id', 'worlds', ['author_id'], unique=False)
+    op.create_index(
+        'ix_adventure_steps_session_id_step_number',
+        'adventure_steps',
+        ['session_id', 'step_number'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_quiz_options_quiz_step_id_is_correct',
+        'quiz_options',
+        ['quiz_step_id', 'is_correct'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quiz_options_quiz_step_id_is_correct', table_name='quiz_options')
+    op.drop_index('ix_adventure_steps_session_id_step_number', table_name='adventure_steps')
+    op.drop_index('ix_worlds_author_id', table_name='worlds')
+    op.drop_index('ix_worlds_is_public', table_name='worlds')
+    op.drop_index('ix_sentences_world_id', table_name='sentences')
+    op.drop_index('ix_words_world_id', table_name='words')
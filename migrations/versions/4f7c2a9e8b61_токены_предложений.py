@@ -0,0 +1,49 @@
+"""токены предложений
+
+Revision ID: 4f7c2a9e8b61
+Revises: e91a4c6d2f37
+Create Date: 2026-10-19 16:12:40.227914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from core.tokenizer import tokenize
+
+
+# revision identifiers, used by Alembic.
+revision = '4f7c2a9e8b61'
+down_revision = 'e91a4c6d2f37'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.add_column('sentences', sa.Column('tokens', sa.JSON(), nullable=True))
+
+    # Токены существующих предложений — пачками по id, без загрузки всей таблицы
+    sentences = sa.table(
+        'sentences', sa.column('id', sa.Integer), sa.column('sentence', sa.Text), sa.column('tokens', sa.JSON)
+    )
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(sentences.c.id, sentences.c.sentence)
+            .where(sentences.c.id > last_id)
+            .order_by(sentences.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            sentences.update().where(sentences.c.id == sa.bindparam('sentence_id')).values(tokens=sa.bindparam('tokens')),
+            [{'sentence_id': row.id, 'tokens': tokenize(row.sentence)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    op.drop_column('sentences', 'tokens')
@@ -0,0 +1,58 @@
+"""журнал ответов и итоги игр
+
+Revision ID: 7d1f0c9a5e23
+Revises: 3b7e91c4d2a8
+Create Date: 2026-10-19 11:32:08.417360
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1f0c9a5e23'
+down_revision = '3b7e91c4d2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'answer_log',
+        sa.Column('id', sa.Integer(), sa.Identity(always=False, start=1, increment=1), nullable=False),
+        sa.Column('game_id', sa.String(length=32), nullable=False),
+        sa.Column('world_id', sa.Integer(), nullable=True),
+        sa.Column('join_code', sa.String(length=4), nullable=True),
+        sa.Column('player_id', sa.String(length=64), nullable=False),
+        sa.Column('step_number', sa.Integer(), nullable=False),
+        sa.Column('is_correct', sa.Boolean(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False),
+        sa.Column('time_spent', sa.Float(), nullable=True),
+        sa.Column('answered_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('game_id', 'player_id', 'step_number', name='uq_answer_log_game_player_step'),
+    )
+    op.create_index('ix_answer_log_world_id', 'answer_log', ['world_id'], unique=False)
+    op.create_table(
+        'game_results',
+        sa.Column('id', sa.Integer(), sa.Identity(always=False, start=1, increment=1), nullable=False),
+        sa.Column('game_id', sa.String(length=32), nullable=False),
+        sa.Column('world_id', sa.Integer(), nullable=True),
+        sa.Column('join_code', sa.String(length=4), nullable=True),
+        sa.Column('player_id', sa.String(length=64), nullable=False),
+        sa.Column('username', sa.String(length=255), nullable=True),
+        sa.Column('score', sa.Integer(), nullable=False),
+        sa.Column('place', sa.Integer(), nullable=False),
+        sa.Column('total_players', sa.Integer(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('game_id', 'player_id', name='uq_game_results_game_player'),
+    )
+    op.create_index('ix_game_results_world_id', 'game_results', ['world_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_game_results_world_id', table_name='game_results')
+    op.drop_table('game_results')
+    op.drop_index('ix_answer_log_world_id', table_name='answer_log')
+    op.drop_table('answer_log')
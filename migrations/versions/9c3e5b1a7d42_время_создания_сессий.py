@@ -0,0 +1,28 @@
+"""время создания сессий
+
+Revision ID: 9c3e5b1a7d42
+Revises: 4f7c2a9e8b61
+Create Date: 2026-10-19 18:05:41.602117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5b1a7d42'
+down_revision = '4f7c2a9e8b61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Существующие сессии получают время миграции: сборщик тронет их не раньше
+    # чем через session_gc_min_age_seconds
+    op.add_column('adventure_sessions', sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+    op.create_index('ix_adventure_sessions_created_at', 'adventure_sessions', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_adventure_sessions_created_at', table_name='adventure_sessions')
+    op.drop_column('adventure_sessions', 'created_at')
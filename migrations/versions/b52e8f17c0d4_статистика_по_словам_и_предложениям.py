@@ -0,0 +1,45 @@
+"""статистика по словам и предложениям
+
+Revision ID: b52e8f17c0d4
+Revises: 7d1f0c9a5e23
+Create Date: 2026-10-19 12:04:51.902118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b52e8f17c0d4'
+down_revision = '7d1f0c9a5e23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('quiz_steps', sa.Column('word_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'quiz_steps_word_id_fkey', 'quiz_steps', 'words', ['word_id'], ['id'], ondelete='SET NULL'
+    )
+    op.add_column('answer_log', sa.Column('item_type', sa.String(length=16), nullable=True))
+    op.add_column('answer_log', sa.Column('item_id', sa.Integer(), nullable=True))
+    op.create_table(
+        'world_item_stats',
+        sa.Column('world_id', sa.Integer(), nullable=False),
+        sa.Column('item_type', sa.String(length=16), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('correct', sa.Integer(), nullable=False),
+        sa.Column('time_sum', sa.Float(), nullable=False),
+        sa.Column('time_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('world_id', 'item_type', 'item_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('world_item_stats')
+    op.drop_column('answer_log', 'item_id')
+    op.drop_column('answer_log', 'item_type')
+    op.drop_constraint('quiz_steps_word_id_fkey', 'quiz_steps', type_='foreignkey')
+    op.drop_column('quiz_steps', 'word_id')
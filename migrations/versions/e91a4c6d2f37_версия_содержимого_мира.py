@@ -0,0 +1,24 @@
+"""версия содержимого мира
+
+Revision ID: e91a4c6d2f37
+Revises: b52e8f17c0d4
+Create Date: 2026-10-19 14:37:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91a4c6d2f37'
+down_revision = 'b52e8f17c0d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('worlds', sa.Column('content_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('worlds', 'content_version')
@@ -15,7 +15,8 @@ CREATE TABLE worlds (
     author_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
     is_public BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMPTZ DEFAULT NOW(),
-    image VARCHAR(255)
+    image VARCHAR(255),
+    content_version INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE words (
@@ -28,13 +29,15 @@ CREATE TABLE words (
 CREATE TABLE sentences (
     id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     sentence TEXT NOT NULL,
+    tokens JSON,
     world_id INTEGER NOT NULL REFERENCES worlds(id) ON DELETE CASCADE
 );
 
 CREATE TABLE adventure_sessions (
     join_code VARCHAR(4) PRIMARY KEY,
     world_id INTEGER REFERENCES worlds(id),
-    host_id INTEGER REFERENCES users(id)
+    host_id INTEGER REFERENCES users(id),
+    created_at TIMESTAMP NOT NULL DEFAULT now()
 );
 
 CREATE TABLE adventure_steps (
@@ -45,7 +48,8 @@ CREATE TABLE adventure_steps (
 
 CREATE TABLE quiz_steps (
     id INTEGER PRIMARY KEY REFERENCES adventure_steps(id),
-    question TEXT
+    question TEXT,
+    word_id INTEGER REFERENCES words(id) ON DELETE SET NULL
 );
 
 CREATE TABLE quiz_options (
@@ -59,3 +63,58 @@ CREATE TABLE word_order_steps (
     id INTEGER PRIMARY KEY REFERENCES adventure_steps(id),
     sentence_id INTEGER REFERENCES sentences(id)
 );
+
+-- Индексы для горячих запросов (events.py, worlds.py)
+CREATE INDEX ix_words_world_id ON words (world_id);
+CREATE INDEX ix_sentences_world_id ON sentences (world_id);
+CREATE INDEX ix_worlds_is_public ON worlds (is_public);
+CREATE INDEX ix_worlds_author_id ON worlds (author_id);
+CREATE INDEX ix_adventure_sessions_created_at ON adventure_sessions (created_at);
+CREATE INDEX ix_adventure_steps_session_id_step_number ON adventure_steps (session_id, step_number);
+CREATE INDEX ix_quiz_options_quiz_step_id_is_correct ON quiz_options (quiz_step_id, is_correct);
+
+-- Журнал ответов и итоги игр (пишет core/results_log.py из Redis Stream)
+CREATE TABLE answer_log (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    game_id VARCHAR(32) NOT NULL,
+    world_id INTEGER,
+    join_code VARCHAR(4),
+    player_id VARCHAR(64) NOT NULL,
+    step_number INTEGER NOT NULL,
+    item_type VARCHAR(16),
+    item_id INTEGER,
+    is_correct BOOLEAN NOT NULL,
+    score INTEGER NOT NULL,
+    time_spent DOUBLE PRECISION,
+    answered_at TIMESTAMP NOT NULL,
+    CONSTRAINT uq_answer_log_game_player_step UNIQUE (game_id, player_id, step_number)
+);
+CREATE INDEX ix_answer_log_world_id ON answer_log (world_id);
+
+CREATE TABLE game_results (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    game_id VARCHAR(32) NOT NULL,
+    world_id INTEGER,
+    join_code VARCHAR(4),
+    player_id VARCHAR(64) NOT NULL,
+    username VARCHAR(255),
+    score INTEGER NOT NULL,
+    place INTEGER NOT NULL,
+    total_players INTEGER NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    CONSTRAINT uq_game_results_game_player UNIQUE (game_id, player_id)
+);
+CREATE INDEX ix_game_results_world_id ON game_results (world_id);
+
+-- Накопленная статистика по словам и предложениям мира (core/analytics.py)
+CREATE TABLE world_item_stats (
+    world_id INTEGER NOT NULL,
+    item_type VARCHAR(16) NOT NULL,
+    item_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    time_sum DOUBLE PRECISION NOT NULL,
+    time_count INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (world_id, item_type, item_id)
+);